@@ -0,0 +1,90 @@
+"""
+Benchmark: filtro con UPPER(col) = UPPER(?) vs. col IN (?, ?) con los
+nombres canónicos del resolvedor (nombres.py).
+
+Uso:
+    python benchmark_nombres.py
+    python benchmark_nombres.py --repeticiones 20 --distrito "breña" --establecimiento "c.s. surquillo"
+
+Usa las mismas credenciales del .env que app.py.
+"""
+import argparse
+import statistics
+import time
+
+import nombres
+from database import conexion
+
+# (base de datos, tabla, columna, tipo de valor)
+CASOS = [
+    ("EPI_TABLAS_MAESTRO_2025", "NOTIWEB_2025", "distrito", "distrito"),
+    ("EPI_TABLAS_MAESTRO_2025", "NOTIWEB_2025", "ESTABLECIMIENTO", "establecimiento"),
+    ("EPI_TABLAS_MAESTRO_2025", "POBLACION_2026_DIRIS_LIMA_CENTRO", "DISTRITO", "distrito"),
+    ("EPI_BD_EDAS", "REPORTE_EDA_2025", "[UBIGEO.1.distrito]", "distrito"),
+    ("EPI_BD_TUBERCULOSIS", "TB_BD_SIGTB", "[Distrito EESS]", "distrito"),
+    ("EPI_BD_VIOLENCIA_FAMILIAR", "VF_COMPLETO", "distrito_Agredido", "distrito"),
+]
+
+
+def medir(base_datos, sql, params, repeticiones):
+    tiempos = []
+    with conexion(base_datos) as conn:
+        if conn is None:
+            raise ConnectionError(f"No se pudo conectar a {base_datos}")
+        cursor = conn.cursor()
+
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            cursor.execute(sql, params)
+            total = cursor.fetchone()[0]
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    return total, statistics.median(tiempos), min(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--distrito", default=" breña ")
+    parser.add_argument("--establecimiento", default="c.s. surquillo")
+    args = parser.parse_args()
+
+    valores = {"distrito": args.distrito, "establecimiento": args.establecimiento}
+
+    print(f"{'tabla.columna':60} {'antes (ms)':>12} {'después (ms)':>13} {'filas':>8}")
+    print("-" * 96)
+
+    for base_datos, tabla, columna, tipo in CASOS:
+        valor = valores[tipo]
+        nombre = f"{tabla}.{columna}"
+
+        try:
+            antes = medir(
+                base_datos,
+                f"SELECT COUNT(*) FROM {tabla} WHERE UPPER(LTRIM(RTRIM({columna}))) = UPPER(LTRIM(RTRIM(?)))",
+                [valor],
+                args.repeticiones,
+            )
+
+            inicio = time.perf_counter()
+            filtro, params = nombres.condicion_igual(base_datos, tabla, columna, valor)
+            carga_ms = (time.perf_counter() - inicio) * 1000
+
+            despues = medir(
+                base_datos, f"SELECT COUNT(*) FROM {tabla} WHERE {filtro}", params, args.repeticiones
+            )
+        except Exception as e:
+            print(f"{nombre:60} ❌ {e}")
+            continue
+
+        aviso = "" if antes[0] == despues[0] else f"  ⚠️ filas distintas ({antes[0]})"
+        print(
+            f"{nombre:60} {antes[1]:12.2f} {despues[1]:13.2f} {despues[0]:8}"
+            f"   carga de nombres: {carga_ms:.1f} ms{aviso}"
+        )
+
+    print("\nMediana de", args.repeticiones, "repeticiones por consulta.")
+
+
+if __name__ == "__main__":
+    main()
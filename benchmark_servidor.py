@@ -0,0 +1,179 @@
+"""
+Benchmark de carga: peticiones por segundo y latencias del backend con
+varias conexiones keep-alive en paralelo.
+
+Uso:
+    python benchmark_servidor.py                                  # contra el servidor que ya está corriendo
+    python benchmark_servidor.py --url http://10.0.0.20:5001 --concurrencia 64 --duracion 20
+    python benchmark_servidor.py --ruta "/api/geo/distritos?zoom=12" --ruta /api/geo
+    python benchmark_servidor.py --comparar                       # levanta app.py y servidor.py y los compara
+
+Con --comparar se arranca cada servidor en --puerto (desarrollo: app.py con
+Werkzeug; waitress; gunicorn si no es Windows), se calienta y se mide con la
+misma carga. Usa el mismo .env que app.py.
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+RUTAS = [
+    "/api/geo",
+    "/api/geo/distritos?zoom=12",
+    "/api/ubicacion?lat=-12.0464&lng=-77.0428",
+]
+
+SERVIDORES = [
+    ("desarrollo (app.py)", ["app.py"], {"FLASK_DEBUG": "0"}),
+    ("waitress", ["servidor.py"], {"SERVIDOR_MOTOR": "waitress"}),
+    ("gunicorn", ["servidor.py"], {"SERVIDOR_MOTOR": "gunicorn"}),
+]
+
+
+def _cliente(url, rutas, hilos, duracion):
+    """Un proceso cliente: `hilos` conexiones keep-alive durante `duracion` seg."""
+    partes = urlsplit(url)
+    fin = time.perf_counter() + duracion
+    latencias, errores = [], [0]
+    lock = threading.Lock()
+
+    def trabajar(desfase):
+        conn = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=30)
+        propias, fallidas, i = [], 0, desfase
+        while time.perf_counter() < fin:
+            ruta = rutas[i % len(rutas)]
+            i += 1
+            inicio = time.perf_counter()
+            try:
+                conn.request("GET", ruta)
+                respuesta = conn.getresponse()
+                respuesta.read()
+                if respuesta.status >= 500:
+                    fallidas += 1
+                    continue
+                propias.append(time.perf_counter() - inicio)
+            except (OSError, http.client.HTTPException):
+                fallidas += 1
+                conn.close()
+                conn = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=30)
+        conn.close()
+        with lock:
+            latencias.extend(propias)
+            errores[0] += fallidas
+
+    trabajadores = [threading.Thread(target=trabajar, args=(i,)) for i in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    return latencias, errores[0]
+
+
+def medir(url, rutas, concurrencia, duracion, procesos):
+    # Varios procesos cliente: un solo proceso Python no alcanza a saturar al servidor
+    procesos = max(1, min(procesos, concurrencia))
+    hilos = [concurrencia // procesos + (1 if i < concurrencia % procesos else 0) for i in range(procesos)]
+
+    with ProcessPoolExecutor(max_workers=procesos) as executor:
+        futuros = [executor.submit(_cliente, url, rutas, h, duracion) for h in hilos]
+        resultados = [f.result() for f in futuros]
+
+    latencias = sorted(l for lat, _ in resultados for l in lat)
+    errores = sum(e for _, e in resultados)
+
+    def percentil(p):
+        return latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000 if latencias else float("nan")
+
+    return {
+        "peticiones": len(latencias),
+        "por_segundo": len(latencias) / duracion,
+        "p50": statistics.median(latencias) * 1000 if latencias else float("nan"),
+        "p95": percentil(0.95),
+        "p99": percentil(0.99),
+        "errores": errores,
+    }
+
+
+def esperar_listo(url, ruta, limite=90):
+    partes = urlsplit(url)
+    fin = time.time() + limite
+    while time.time() < fin:
+        conn = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=5)
+        try:
+            conn.request("GET", ruta)
+            if conn.getresponse().status < 500:
+                return True
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            conn.close()
+        # Caído o respondiendo 5xx: esperar antes de reintentar
+        time.sleep(0.5)
+    return False
+
+
+def imprimir(nombre, r):
+    print(
+        f"{nombre:24} {r['por_segundo']:>10.0f} {r['p50']:>9.1f} {r['p95']:>9.1f} "
+        f"{r['p99']:>9.1f} {r['errores']:>8}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5001")
+    parser.add_argument("--ruta", action="append", help="ruta a pedir (se puede repetir)")
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--duracion", type=float, default=10)
+    parser.add_argument("--calentamiento", type=float, default=2)
+    parser.add_argument("--procesos", type=int, default=min(os.cpu_count() or 1, 4), help="procesos cliente")
+    parser.add_argument("--comparar", action="store_true")
+    parser.add_argument("--puerto", type=int, default=5099, help="puerto para --comparar")
+    args = parser.parse_args()
+    rutas = args.ruta or RUTAS
+
+    print(f"Rutas: {', '.join(rutas)}")
+    print(f"{args.concurrencia} conexiones, {args.duracion:g} s\n")
+    print(f"{'servidor':24} {'pet./s':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'errores':>8}")
+    print("-" * 74)
+
+    if not args.comparar:
+        medir(args.url, rutas, args.concurrencia, args.calentamiento, args.procesos)
+        imprimir(args.url, medir(args.url, rutas, args.concurrencia, args.duracion, args.procesos))
+        return
+
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    url = f"http://127.0.0.1:{args.puerto}"
+    for nombre, argumentos, entorno in SERVIDORES:
+        if entorno.get("SERVIDOR_MOTOR") == "gunicorn" and os.name == "nt":
+            continue
+
+        proceso = subprocess.Popen(
+            [sys.executable, *argumentos],
+            cwd=directorio,
+            env={**os.environ, **entorno, "SERVIDOR_HOST": "127.0.0.1", "SERVIDOR_PUERTO": str(args.puerto)},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            if not esperar_listo(url, rutas[0]):
+                print(f"{nombre:24} no respondió")
+                continue
+            medir(url, rutas, args.concurrencia, args.calentamiento, args.procesos)
+            imprimir(nombre, medir(url, rutas, args.concurrencia, args.duracion, args.procesos))
+        finally:
+            proceso.terminate()
+            try:
+                proceso.wait(timeout=40)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+
+
+if __name__ == "__main__":
+    main()
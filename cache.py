@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import database
+
+# ============================================================
+# 🧠 CACHÉ EN MEMORIA CON TTL + LRU
+# ============================================================
+# Las tablas de vigilancia cambian pocas veces al día: los agregados
+# por distrito / establecimiento se guardan en memoria por un tiempo
+# que depende de la tabla de origen.
+#
+# Los valores vencidos no se borran al leerlos: quedan (hasta que el LRU
+# los desaloje) como último resultado bueno para servir mientras la base
+# de datos esté caída o saturada (ver CacheTTL.respaldo).
+
+CACHE_MAX_ENTRADAS = int(os.getenv('CACHE_MAX_ENTRADAS', '2000'))
+CACHE_TTL_DEFAULT = float(os.getenv('CACHE_TTL_DEFAULT', '600'))
+
+# Segundos de vida por tabla de origen
+TTL_POR_TABLA = {
+    "NOTIWEB_2025": 600,
+    "REPORTE_EDA_2025": 1800,
+    "REPORTE_FEBRILES_2025": 1800,
+    "REPORTE_IRA_2025": 1800,
+    "TB_BD_SIGTB": 3600,
+    "TIA_TOTAL": 3600,
+    "TB_TIA_EESS_MINSA": 3600,
+    "Depresion": 3600,
+    "VF_COMPLETO": 3600,
+    "REPORTE_DIABETES": 3600,
+    "REPORTE_CANCER_ADULTO": 3600,
+    "REPORTE_CANCER_INFANTIL": 3600,
+    "BD_RENAL": 3600,
+    "REPORTE_ACCIDENTES_TRANSITO": 3600,
+    "MM_REPORTE_2024": 3600,
+    "MME_REPORTE_2024": 3600,
+    "MNP_REPORTE_2024": 3600,
+}
+
+
+def ttl_para_tablas(tablas):
+    """TTL de un resultado que combina varias tablas: el menor de todos."""
+    return min([TTL_POR_TABLA.get(t, CACHE_TTL_DEFAULT) for t in tablas] or [CACHE_TTL_DEFAULT])
+
+
+class CacheTTL:
+    def __init__(self, max_entradas: int = CACHE_MAX_ENTRADAS, max_bytes: int = None, tamano=None):
+        """
+        Con max_bytes (y tamano(valor) → bytes) también se desaloja por
+        tamaño total, no solo por cantidad de entradas.
+        """
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._tamano = tamano or (lambda valor: 0)
+        self._datos = OrderedDict()     # clave -> (vence, tablas, valor)
+        self._bytes = {}                # clave -> tamaño (solo con max_bytes)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirados = 0
+        self.desalojados = 0
+        self.respaldos = 0
+
+    def obtener(self, clave):
+        """Devuelve (True, valor) si hay un valor vigente, (False, None) si no."""
+        with self._lock:
+            item = self._datos.get(clave)
+            if item is None:
+                self.misses += 1
+                return False, None
+
+            vence, _, valor = item
+            if vence < time.monotonic():
+                self.expirados += 1
+                self.misses += 1
+                return False, None
+
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return True, valor
+
+    def _quitar_bytes(self, clave):
+        self._total_bytes -= self._bytes.pop(clave, 0)
+
+    def guardar(self, clave, valor, ttl, tablas=()):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + ttl, tuple(tablas), valor)
+            self._datos.move_to_end(clave)
+            if self.max_bytes is not None:
+                self._quitar_bytes(clave)
+                self._bytes[clave] = self._tamano(valor)
+                self._total_bytes += self._bytes[clave]
+
+            while len(self._datos) > self.max_entradas or (
+                self.max_bytes is not None and self._total_bytes > self.max_bytes and len(self._datos) > 1
+            ):
+                desalojada, _ = self._datos.popitem(last=False)
+                self._quitar_bytes(desalojada)
+                self.desalojados += 1
+
+    def respaldo(self, clave, error):
+        """
+        Se llama desde el except de una consulta: si la base no está
+        disponible devuelve el último valor guardado (aunque esté vencido);
+        si no hay o el error es otro, relanza el error.
+        """
+        if not database.es_no_disponible(error):
+            raise error
+        with self._lock:
+            item = self._datos.get(clave)
+            if item is None:
+                raise error
+            self.respaldos += 1
+        if not isinstance(error, database.CircuitoAbierto):
+            # Con el circuito abierto sería una línea por petición: basta el contador
+            print(f"🛟 Sirviendo último resultado bueno de {clave}: {error}")
+        return item[2]
+
+    def invalidar_tabla(self, tabla):
+        with self._lock:
+            claves = [c for c, (_, tablas, _) in self._datos.items() if tabla in tablas]
+            for c in claves:
+                del self._datos[c]
+                self._quitar_bytes(c)
+        return len(claves)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes.clear()
+            self._total_bytes = 0
+
+    def estado(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            estado = {
+                "entradas": len(self._datos),
+                "max_entradas": self.max_entradas,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / consultas, 4) if consultas else 0,
+                "expirados": self.expirados,
+                "desalojados": self.desalojados,
+                "respaldos": self.respaldos,
+            }
+            if self.max_bytes is not None:
+                estado["bytes"] = self._total_bytes
+                estado["max_bytes"] = self.max_bytes
+            return estado
+
+
+# Caché compartida de agregados (conteos por distrito / establecimiento)
+agregados = CacheTTL()
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import cache
+import nombres
+from database import conexion
+
+# ============================================================
+# 💾 CACHÉ EN DISCO DE LIBROS EXCEL EXPORTADOS
+# ============================================================
+# Un libro ya generado se guarda con un nombre derivado de:
+#   entidad + lista ordenada de diagnósticos + versión de las tablas.
+# Si alguna tabla de origen cambia, cambia la versión y la entrada vieja
+# de la misma entidad/diagnósticos se borra. El tamaño total tiene tope
+# y se desaloja lo menos usado (la fecha del archivo se renueva en cada acierto).
+
+EXPORT_CACHE_DIR = os.getenv(
+    'EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), "sistema_mapas_cache_excel")
+)
+EXPORT_CACHE_MAX_BYTES = int(os.getenv('EXPORT_CACHE_MAX_BYTES', str(500 * 1024 * 1024)))
+EXPORT_CACHE_VERSION_TTL = float(os.getenv('EXPORT_CACHE_VERSION_TTL', '60'))   # seg. que se reutiliza la versión de una tabla
+
+_lock = threading.Lock()
+_versiones = cache.CacheTTL(max_entradas=200)
+_stats = {"hits": 0, "misses": 0, "guardados": 0, "desalojados": 0, "invalidados": 0}
+
+
+# ============================================================
+# 🔖 VERSIÓN DE LAS TABLAS DE ORIGEN
+# ============================================================
+SQL_VERSION_TABLA = """
+    SELECT
+        (SELECT SUM(p.rows) FROM sys.partitions p
+          WHERE p.object_id = OBJECT_ID(?) AND p.index_id IN (0, 1)),
+        (SELECT MAX(u.last_user_update) FROM sys.dm_db_index_usage_stats u
+          WHERE u.database_id = DB_ID() AND u.object_id = OBJECT_ID(?))
+"""
+
+# Sin permiso VIEW DATABASE STATE solo se puede usar la cantidad de filas
+SQL_VERSION_TABLA_SOLO_FILAS = """
+    SELECT SUM(p.rows) FROM sys.partitions p
+     WHERE p.object_id = OBJECT_ID(?) AND p.index_id IN (0, 1)
+"""
+
+
+def _version_tabla(base_datos, tabla):
+    encontrado, version = _versiones.obtener((base_datos, tabla))
+    if encontrado:
+        return version
+
+    with conexion(base_datos) as conn:
+        if conn is None:
+            return None
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute(SQL_VERSION_TABLA, (tabla, tabla))
+            filas, modificada = cursor.fetchone()
+            version = f"{filas}|{modificada}"
+        except Exception:
+            try:
+                cursor.execute(SQL_VERSION_TABLA_SOLO_FILAS, (tabla,))
+                version = f"{cursor.fetchone()[0]}|"
+            except Exception as e:
+                print(f"⚠️ Sin versión para {base_datos}.{tabla}: {e}")
+                return None
+
+    _versiones.guardar((base_datos, tabla), version, EXPORT_CACHE_VERSION_TTL)
+    return version
+
+
+def clave(nivel, valor, diagnosticos, tablas):
+    """
+    Clave de la exportación o None si no se puede versionar alguna tabla
+    (en ese caso el libro no se guarda en caché). `diagnosticos` ya viene
+    resuelto (ver exportacion.clave_cache): "EDAS" y "edas" son lo mismo.
+    """
+    versiones = []
+    for base_datos, tabla in sorted(set(tablas)):
+        version = _version_tabla(base_datos, tabla)
+        if version is None:
+            return None
+        versiones.append([base_datos, tabla, version])
+
+    entidad = json.dumps(
+        [nivel, nombres.normalizar(valor), sorted(set(diagnosticos))],
+        ensure_ascii=False,
+    )
+    base = hashlib.sha256(entidad.encode("utf-8")).hexdigest()[:32]
+    version = hashlib.sha256(json.dumps(versiones).encode("utf-8")).hexdigest()[:16]
+    return {"base": base, "version": version, "archivo": f"{base}_{version}.xlsx"}
+
+
+# ============================================================
+# 📂 ARCHIVOS
+# ============================================================
+def _ruta(nombre):
+    return os.path.join(EXPORT_CACHE_DIR, nombre)
+
+
+def _borrar(nombre):
+    try:
+        os.remove(_ruta(nombre))
+        return True
+    except OSError:
+        # En Windows no se puede borrar mientras se está enviando
+        return False
+
+
+def _entradas():
+    """[(nombre, tamaño, último uso)] de los libros en caché."""
+    entradas = []
+    try:
+        nombres = os.listdir(EXPORT_CACHE_DIR)
+    except FileNotFoundError:
+        return entradas
+
+    for nombre in nombres:
+        if not nombre.endswith(".xlsx"):
+            continue
+        try:
+            st = os.stat(_ruta(nombre))
+        except OSError:
+            continue
+        entradas.append((nombre, st.st_size, st.st_mtime))
+    return entradas
+
+
+def buscar(clave_cache):
+    """Ruta del libro en caché o None. Un acierto lo marca como recién usado."""
+    if clave_cache is None:
+        return None
+
+    ruta = _ruta(clave_cache["archivo"])
+    with _lock:
+        if not os.path.exists(ruta):
+            _stats["misses"] += 1
+            return None
+        try:
+            os.utime(ruta, None)
+        except OSError:
+            pass
+        _stats["hits"] += 1
+    return ruta
+
+
+def guardar(clave_cache, origen):
+    """Copia un libro (archivo abierto en modo binario) a la caché."""
+    if clave_cache is None:
+        return None
+
+    destino = _ruta(clave_cache["archivo"])
+    temporal = f"{destino}.{threading.get_ident()}.parcial"
+
+    try:
+        os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+        with open(temporal, "wb") as f:
+            shutil.copyfileobj(origen, f)
+        os.replace(temporal, destino)
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar el Excel en caché: {e}")
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        return None
+
+    with _lock:
+        _stats["guardados"] += 1
+        entradas = _entradas()
+
+        # Versiones anteriores de la misma entidad/diagnósticos: sus tablas cambiaron
+        for nombre, _, _ in entradas:
+            if nombre.startswith(clave_cache["base"] + "_") and nombre != clave_cache["archivo"]:
+                if _borrar(nombre):
+                    _stats["invalidados"] += 1
+
+        _desalojar(clave_cache["archivo"])
+
+    return destino
+
+
+def _desalojar(conservar):
+    """Borra los libros menos usados hasta quedar bajo el tope de bytes."""
+    entradas = sorted(_entradas(), key=lambda e: e[2])
+    total = sum(tamano for _, tamano, _ in entradas)
+
+    for nombre, tamano, _ in entradas:
+        if total <= EXPORT_CACHE_MAX_BYTES:
+            break
+        if nombre == conservar:
+            continue
+        if _borrar(nombre):
+            total -= tamano
+            _stats["desalojados"] += 1
+
+
+def limpiar():
+    with _lock:
+        for nombre, _, _ in _entradas():
+            _borrar(nombre)
+
+
+def estado():
+    with _lock:
+        entradas = _entradas()
+        return {
+            "archivos": len(entradas),
+            "bytes": sum(tamano for _, tamano, _ in entradas),
+            "max_bytes": EXPORT_CACHE_MAX_BYTES,
+            "directorio": EXPORT_CACHE_DIR,
+            **_stats,
+            "versiones": _versiones.estado(),
+        }
@@ -0,0 +1,834 @@
+import os
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+import cache
+import nombres
+import tia
+from database import consultar
+
+# ============================================================
+# 📚 CATÁLOGO DE DIAGNÓSTICOS
+# ============================================================
+# Una sola definición por diagnóstico: base de datos, tabla(s),
+# columnas de distrito / establecimiento / año, expresiones de conteo
+# y columnas con datos personales que nunca se exportan.
+# Los diagnósticos que no están en el catálogo se buscan en NOTIWEB_2025.
+
+ANIO = 2025
+MATRIZ_HILOS = int(os.getenv('MATRIZ_HILOS', '8'))      # bases consultadas a la vez por la matriz
+
+COLUMNAS_PROHIBIDAS_TBC = [
+    "Tipo de Documento", "Nro. Documento", "Nombre", "Apellidos",
+    "F. de Nacimiento", "Nacionalidad", "Pais de Origen",
+    "Pertenencia Etnica", "Otra Etnia", "Edad", "Genero",
+    "Direccion Acutal", "Departamento", "Provincia"
+]
+COLUMNAS_PROHIBIDAS_DIABETES = [
+    "apepat", "apemat", "nombres", "sexo",
+    "fecha_nac", "edad", "usuario",
+    "ubigeo_res", "SEXO_2", "dni"
+]
+COLUMNAS_PROHIBIDAS_RENAL = [
+    "nroDoc", "apellidoMaterno", "apellidoPaterno", "nombres",
+    "nombreCompleto", "fechaNacimiento", "ubigeo", "direccion"
+]
+COLUMNAS_PROHIBIDAS_NOTIWEB_2025 = [
+    "APEPAT", "APEMAT", "NOMBRES",
+    "EDAD", "TIPO_EDAD", "SEXO",
+    "DNI", "TIPO_DOC", "LATITUD", "LONGITUD", "COORDENADAS", "UBICACION",
+    "UBIGEO_DIR", "EESS_UBIGEO",
+    "DIRECCION", "DIRECCION_COMPLETA",
+    "TIPO_VIA", "NUM_PUERTA",
+    "MANZANA", "BLOCK", "INTERIOR",
+    "KILOMETRO", "LOTE", "REFERENCIA",
+    "AGRUP_RURAL", "NOMBRE_AGRUP",
+    "ETNIAPROC", "ETNIAS", "PROCEDE", "OTROPROC",
+    "USUARIO", "FECHA_MOD", "USUARIO_MOD", "LATITUD_UBIGEO", "LONGITUD_UBIGEO"
+]
+COLUMNAS_PROHIBIDAS_DEPRESION = [
+    "dni", "apepat", "apemat", "nombres", "hc",
+    "telefono", "celular", "direccion",
+    "tipo_doc", "f_nac",
+    "ubigeo", "X",
+    "idusucreo", "idusuaupdate", "idusuaupdate2",
+    "fcreo", "fupdate",
+    "fseg", "fseg2",
+    "fseg_sistema", "fseg2_sistema"
+]
+COLUMNAS_PROHIBIDAS_VIOLENCIA = [
+    "codigo", "ape_pat", "ape_mat", "nom_1", "nom_2", "ide",
+    "edad", "t_edad", "sexo",
+    "ecivil", "gins",
+    "ocupa", "distri",
+    "domi", "apem_agres", "apep_agres",
+    "nom_agres", "edadagre",
+    "sexoagre", "vinculo",
+    "queotrovin", "gradoins", "ocupacion", "usuario", "ubigeo2", "local"
+]
+COLUMNAS_PROHIBIDAS_ACCIDENTES_TRANSITO = [
+    "DNI", "AP_NM1", "AP_NM2", "NOM_LES",
+    "EDAD", "TIPO_EDAD", "SEXO",
+    "UBIGEO",
+    "HORA", "HOR_ACCID",
+    "FECH_EGRE", "FEC_ACCD", "DIA_ACCD", "MES_ACCD", "ANO_ACCD",
+    "ED_COND", "SEX_COND", "LIC_CONDUC",
+    "FECHAREGW",
+    "UBICA_LESIONADO",
+    "MOVIL", "NOMOVIL",
+    "VEHICULO", "VEHICULO_OCASIONA"
+]
+COLUMNAS_PROHIBIDAS_MUERTE_MATERNA = [
+    "APEPAT", "APEMAT", "NOMBRES", "SEXO",
+    "DNI", "HCLINICA", "ID_INDIVID",
+    "EDAD", "NACIONALIDAD",
+    "DIRECCION", "UBIGEO", "LOCALIHAB",
+    "LATITUD", "LONGITUD",
+    "CARGO", "NOMBRE_NOTIFICANTE", "USUARIO",
+    "FECHA_NOT", "HORA_NOT",
+    "FECHA_DEF", "HORA_DEF",
+    "FECHAREGW", "FECHAMOD",
+    "ELIMINADO", "FICHA"
+]
+COLUMNAS_PROHIBIDAS_MUERTE_MATERNA_EXTREMA = [
+    "PATERNO", "MATERNO", "NOMBRES",
+    "TIPO_DOCUMENTO", "NUMERO_DOCUMENTO", "HISTORIA_CLI",
+    "EDAD", "FECHA_EVENTO", "FECHA_NOTIFICACION",
+    "UBIGEO", "LATITUD", "LONGITUD", "LOCALIDAD",
+    "GRUPO_ETNICO", "ETNIA", "ESTADO_CIVIL", "NIVEL_EDUCATIVO", "NACIONALIDAD",
+    "MEDICO_TRATANTE", "MEDICO_COLEGIATURA",
+    "RESPONSABLE", "CARGO", "PROFESION", "PROFESION_OTRO",
+    "USUARIO_REG_ME", "USUARIO_MOD_ME", "USUARIO_REG_INV", "USUARIO_MOD_INV",
+    "FECHA_INGRESO_EESS", "HORA_INGRESO_EESS",
+    "FECHA_INGRESO_UCI", "HORA_INGRESO_UCI",
+    "EGRESO_UCI_FECHA", "EGRESO_UCI_HORA",
+    "EGRESO_EESS_FECHA", "EGRESO_EESS_HORA",
+    "FECHA_REG_ME", "FECHA_MOD_ME",
+    "FECHA_REG_INV", "FECHA_MOD_INV",
+    "OBSERVACIONES"
+]
+COLUMNAS_PROHIBIDAS_MUERTE_FETAL_NEONATAL = [
+    "APE_NOM", "APEPAT", "APEMAT", "NOMBRES",
+    "DNI_MADRE",
+    "SEXO", "EDADGES", "FECHA_NAC", "FECH_NAC", "HORA_NAC",
+    "UBIGEO", "UBIGEO_RES",
+    "LATITUD", "LONGITUD",
+    "USUARIO", "RESPONSABLE",
+    "FECHA_MTE", "HORA_MTE", "FECHA_MET",
+    "FECHA_REG"
+]
+
+COLUMNAS_DAA = ['DAA_C1', 'DAA_C1_4', 'DAA_C5', 'DAA_C5_11', 'DAA_C12_17', 'DAA_C18_29', 'DAA_C30_59', 'DAA_C60']
+COLUMNAS_DIS = ['DIS_C1', 'DIS_C1_4', 'DIS_C5', 'DIS_C5_11', 'DIS_C12_17', 'DIS_C18_29', 'DIS_C30_59', 'DIS_C60']
+COLUMNAS_FEBRILES = ['feb_m1', 'feb_1_4', 'feb_5_9', 'feb_10_19', 'feb_20_59', 'feb_m60']
+
+
+def _suma(columnas):
+    return " + ".join([f"COALESCE(SUM([{c}]),0)" for c in columnas])
+
+
+# Cada fuente es una tabla; "conteos" es una lista de
+# (tipo_dx, expresión SQL, campo plano en la respuesta o None).
+CATALOGO = {
+    "EDAS": {
+        "etiqueta": "EDAS",
+        "alias": ["Enfermedades diarreicas agudas", "EDAS", "EDA"],
+        "base_datos": "EPI_BD_EDAS",
+        "fuentes": [{
+            "tabla": "REPORTE_EDA_2025",
+            "campo_distrito": "[UBIGEO.1.distrito]",
+            "campo_establecimiento": "[EESS.ESTABLECIMIENTO]",
+            "campo_anio": "ano",
+            "conteos": [
+                ("DAA", _suma(COLUMNAS_DAA), "daa"),
+                ("DIS", _suma(COLUMNAS_DIS), "dis"),
+            ],
+        }],
+    },
+    "FEBRILES": {
+        "etiqueta": "Febriles",
+        "alias": ["Febriles"],
+        "base_datos": "EPI_BD_FEBRILES",
+        "clave_detalle": "grupo_edad",
+        "fuentes": [{
+            "tabla": "REPORTE_FEBRILES_2025",
+            "campo_distrito": "[UBIGEO.1.distrito]",
+            "campo_establecimiento": "[EESS.ESTABLECIMIENTO]",
+            "campo_anio": "ano",
+            "filtro": "[UBIGEO.1.subregion] = 'DIRIS LIMA CENTRO'",
+            "conteos": [(col, _suma([col]), None) for col in COLUMNAS_FEBRILES],
+        }],
+    },
+    "IRAS": {
+        "etiqueta": "IRAS",
+        "alias": ["Infecciones respiratorias agudas", "IRA", "IRAS"],
+        "base_datos": "EPI_BD_IRAS",
+        "fuentes": [{
+            "tabla": "REPORTE_IRA_2025",
+            "campo_distrito": "[UBIGEO.1.distrito]",
+            "campo_establecimiento": "[EESS.ESTABLECIMIENTO]",
+            "campo_anio": "ano",
+            "conteos": [
+                ("IRA NO NEUMONIA", _suma(["IRA_M2", "IRA_2_11", "IRA_1_4A"]), "ira_no_neumonia"),
+                ("SOB / ASMA", _suma(["SOB_2A", "SOB_2_4A"]), "sob_asma"),
+                ("NEUMONIA GRAVE", _suma(["NGR_M2", "NGR_2_11", "NGR_1_4A"]), "neumonia_grave"),
+                ("NEUMONIA", _suma(["NEU_2_11", "NEU_1_4A", "NEU_5_9A", "NEU_10_19", "NEU_20_59", "NEU_60A"]), "neumonia"),
+            ],
+        }],
+    },
+    "TBC TIA": {
+        "etiqueta": "TBC TIA",
+        "alias": ["TBC TIA", "TBC", "TIA"],
+        "base_datos": "EPI_BD_TUBERCULOSIS",
+        "sin_detalle": True,
+        "fuentes": [{
+            "tabla": "TIA_TOTAL",
+            "campo_distrito": "Distrito",
+            "campo_establecimiento": "Distrito_EESS",
+            "campo_anio": None,
+            "conteos": [("casos", "COALESCE(SUM(casos),0)", None)],
+            "tia": tia.TASA_SQL,
+        }],
+    },
+    "TBC TIA EESS": {
+        "etiqueta": "TBC TIA",
+        "alias": ["TBC TIA EESS"],
+        "base_datos": "EPI_BD_TUBERCULOSIS",
+        "sin_detalle": True,
+        "fuentes": [{
+            "tabla": "TB_TIA_EESS_MINSA",
+            "campo_distrito": "Distrito",
+            "campo_establecimiento": "Distrito_EESS",
+            "campo_anio": None,
+            "conteos": [("casos", "COALESCE(SUM(casos),0)", None)],
+            "tia": tia.TASA_SQL,
+        }],
+    },
+    "TBC PULMONAR": {
+        "etiqueta": "TBC PULMONAR",
+        "alias": ["TBC pulmonar"],
+        "base_datos": "EPI_BD_TUBERCULOSIS",
+        "sin_detalle": True,
+        "columnas_prohibidas": COLUMNAS_PROHIBIDAS_TBC,
+        "fuentes": [{
+            "tabla": "TB_BD_SIGTB",
+            "campo_distrito": "[Distrito EESS]",
+            "campo_establecimiento": "[Establecimiento de Salud]",
+            "campo_anio": None,
+            "conteos": [("TBC PULMONAR", "COUNT(*)", None)],
+        }],
+    },
+    "DEPRESION": {
+        "etiqueta": "Depresion",
+        "alias": ["Depresion"],
+        "base_datos": "EPI_DB_SALUD_MENTAL",
+        "columnas_prohibidas": COLUMNAS_PROHIBIDAS_DEPRESION,
+        "fuentes": [{
+            "tabla": "Depresion",
+            "campo_distrito": "Distrito",
+            "campo_establecimiento": "[nom_eess]",
+            "campo_anio": "[Año]",
+            "conteos": [("DEPRESION", "COUNT(*)", None)],
+        }],
+    },
+    "VIOLENCIA": {
+        "etiqueta": "Violencia",
+        "alias": ["Violencia familiar", "Violencia"],
+        "base_datos": "EPI_BD_VIOLENCIA_FAMILIAR",
+        "columnas_prohibidas": COLUMNAS_PROHIBIDAS_VIOLENCIA,
+        "fuentes": [{
+            "tabla": "VF_COMPLETO",
+            "campo_distrito": "distrito_Agredido",
+            "campo_establecimiento": "[estab_s]",
+            "campo_anio": "[ano]",
+            "conteos": [("Violencia", "COUNT(*)", None)],
+        }],
+    },
+    "DIABETES": {
+        "etiqueta": "Diabetes",
+        "alias": ["Diabetes"],
+        "base_datos": "EPI_BD_DIABETES",
+        "columnas_prohibidas": COLUMNAS_PROHIBIDAS_DIABETES,
+        "fuentes": [{
+            "tabla": "REPORTE_DIABETES",
+            "campo_distrito": "distrito",
+            "campo_establecimiento": "[ESTABLECIMIENTO]",
+            "campo_anio": "[ano]",
+            "conteos": [("Diabetes", "COUNT(*)", None)],
+        }],
+    },
+    "CANCER": {
+        "etiqueta": "Cancer",
+        "alias": ["Cáncer", "Cancer total"],
+        "base_datos": "EPI_BD_ENFERMEDADES_NO_TRANSMISIBLES",
+        "fuentes": [
+            {
+                "nombre": "CANCER_ADULTO",
+                "tabla": "REPORTE_CANCER_ADULTO",
+                "campo_distrito": "Distrito",
+                "campo_establecimiento": "[Establecimiento]",
+                "campo_anio": "[Año]",
+                "conteos": [("CANCER ADULTO", "COUNT(*)", None)],
+            },
+            {
+                "nombre": "CANCER_INFANTIL",
+                "tabla": "REPORTE_CANCER_INFANTIL",
+                "campo_distrito": "Distrito",
+                "campo_establecimiento": "[Establecimiento]",
+                "campo_anio": "[Año]",
+                "conteos": [("CANCER INFANTIL", "COUNT(*)", None)],
+            },
+        ],
+    },
+    "RENAL": {
+        "etiqueta": "renal",
+        "alias": ["Renal"],
+        "base_datos": "EPI_BD_RENAL",
+        "columnas_prohibidas": COLUMNAS_PROHIBIDAS_RENAL,
+        "fuentes": [{
+            "tabla": "BD_RENAL",
+            "campo_distrito": "distrito",
+            "campo_establecimiento": "[establecimiento]",
+            "campo_anio": "[año]",
+            "conteos": [("Renal", "COUNT(*)", None)],
+        }],
+    },
+    "TRANSITO": {
+        "etiqueta": "Transito",
+        "alias": ["Accidente transito", "Accidentes de transito", "Transito"],
+        "base_datos": "EPI_BD_ACCIDENTES_TRANSITO",
+        "columnas_prohibidas": COLUMNAS_PROHIBIDAS_ACCIDENTES_TRANSITO,
+        "fuentes": [{
+            "tabla": "REPORTE_ACCIDENTES_TRANSITO",
+            "campo_distrito": "DISTRITO",
+            "campo_establecimiento": "[ESTABLECIMIENTO]",
+            "campo_anio": "[ANO]",
+            "conteos": [("Transito", "COUNT(*)", None)],
+        }],
+    },
+    "MUERTE MATERNA": {
+        "etiqueta": "mortalidad_materna",
+        "alias": ["Muerte materna", "Materna"],
+        "base_datos": "EPI_BD_VIGILANCIA_EPIDEMIOLOGICA_DE_MORTALIDAD",
+        "sin_tildes": True,
+        "columnas_prohibidas": COLUMNAS_PROHIBIDAS_MUERTE_MATERNA,
+        "fuentes": [{
+            "tabla": "MM_REPORTE_2024",
+            "campo_distrito": "nom_ubigeo",
+            "campo_establecimiento": "[establecimiento]",
+            "campo_anio": "[ano]",
+            "conteos": [("mortalidad_materna", "COUNT(*)", None)],
+        }],
+    },
+    "MUERTE MATERNA EXTREMA": {
+        "etiqueta": "mortalidad_materna_extrema",
+        "alias": ["Muerte materna extrema", "Materna extrema"],
+        "base_datos": "EPI_BD_VIGILANCIA_EPIDEMIOLOGICA_DE_MORTALIDAD",
+        "columnas_prohibidas": COLUMNAS_PROHIBIDAS_MUERTE_MATERNA_EXTREMA,
+        "fuentes": [{
+            "tabla": "MME_REPORTE_2024",
+            "campo_distrito": "distrito",
+            "campo_establecimiento": "[nom_eess]",
+            "campo_anio": "[anio_not]",
+            "conteos": [("mortalidad_materna", "COUNT(*)", None)],
+        }],
+    },
+    "MUERTE FETAL NEONATAL": {
+        "etiqueta": "mortalidad_neonatal_perinatal",
+        "alias": ["Muerte fetal neonatal", "Fetal neonatal"],
+        "base_datos": "EPI_BD_VIGILANCIA_EPIDEMIOLOGICA_DE_MORTALIDAD",
+        "columnas_prohibidas": COLUMNAS_PROHIBIDAS_MUERTE_FETAL_NEONATAL,
+        "fuentes": [{
+            "tabla": "MNP_REPORTE_2024",
+            "campo_distrito": "distrito",
+            "campo_establecimiento": "[establecimiento.x]",
+            "campo_anio": "[anio]",
+            "conteos": [("mortalidad_neonatal_perinatal", "COUNT(*)", None)],
+        }],
+    },
+}
+
+# Diagnósticos generales: se filtran por la columna DIAGNOSTICO
+NOTIWEB = {
+    "etiqueta": None,
+    "alias": [],
+    "base_datos": "EPI_TABLAS_MAESTRO_2025",
+    "columnas_prohibidas": COLUMNAS_PROHIBIDAS_NOTIWEB_2025,
+    "fuentes": [{
+        "tabla": "NOTIWEB_2025",
+        "campo_distrito": "[distrito]",
+        "campo_establecimiento": "[ESTABLECIMIENTO]",
+        "campo_anio": None,
+        "campo_diagnostico": "[DIAGNOSTICO]",
+        "campo_detalle": "[TIPO_DX]",
+        "filtro": "[subregion] = 'DIRIS LIMA CENTRO'",
+        "conteos": [("total", "COUNT(*)", None)],
+    }],
+}
+
+# Población por nivel → (base de datos, tabla, columna de la entidad)
+TABLAS_POBLACION = {
+    "distrito": ("EPI_TABLAS_MAESTRO_2025", "POBLACION_2026_DIRIS_LIMA_CENTRO", "DISTRITO"),
+    "establecimiento": ("EPI_TABLAS_MAESTRO_2025", "POBLACION_2026_RIS_EESS_DLC", "ESTABLECIMIENTOS"),
+}
+
+for _clave, _entrada in CATALOGO.items():
+    _entrada["clave"] = _clave
+NOTIWEB["clave"] = "NOTIWEB"
+
+
+# ============================================================
+# 🔎 RESOLUCIÓN DE ALIAS
+# ============================================================
+def normalizar_clave(texto):
+    """'diagnostico-TBC-Pulmonar', 'TBC PULMONAR' y 'tbc pulmonar' → 'TBCPULMONAR'"""
+    texto = unicodedata.normalize("NFKD", str(texto))
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).upper().strip()
+    if texto.startswith("DIAGNOSTICO"):
+        texto = texto[len("DIAGNOSTICO"):]
+    return "".join(c for c in texto if c.isalnum())
+
+
+ALIAS = {}
+for _entrada in CATALOGO.values():
+    for _alias in [_entrada["clave"], *_entrada["alias"]]:
+        ALIAS[normalizar_clave(_alias)] = _entrada
+
+
+def resolver(enfermedad):
+    """
+    Devuelve (entrada del catálogo, diagnóstico NOTIWEB o None).
+    Todo lo que no sea un alias conocido es un diagnóstico NOTIWEB.
+    """
+    entrada = ALIAS.get(normalizar_clave(enfermedad))
+    if entrada is not None:
+        return entrada, None
+    return NOTIWEB, enfermedad.strip()
+
+
+# ============================================================
+# ⚙️ MOTOR DE CONSULTAS
+# ============================================================
+CAMPOS_NIVEL = {
+    "distrito": "campo_distrito",
+    "establecimiento": "campo_establecimiento",
+}
+
+
+def _clave_entidad(entrada, fuente, nivel):
+    campo = f"UPPER(LTRIM(RTRIM({fuente[CAMPOS_NIVEL[nivel]]})))"
+    if entrada.get("sin_tildes"):
+        campo += " COLLATE Latin1_General_CI_AI"
+    return campo
+
+
+def _condiciones(entrada, fuente, nivel, valor, diagnostico, con_filtro=True):
+    condiciones, params = [], []
+
+    if valor is not None:
+        # Grafías reales de la columna: col IN (?, ?) en lugar de UPPER(LTRIM(RTRIM(col)))
+        sql, valores = nombres.condicion_igual(
+            entrada["base_datos"], fuente["tabla"], fuente[CAMPOS_NIVEL[nivel]], valor,
+            respaldo=f"{_clave_entidad(entrada, fuente, nivel)} = UPPER(LTRIM(RTRIM(?)))",
+        )
+        condiciones.append(sql)
+        params += valores
+    else:
+        condiciones.append(f"{fuente[CAMPOS_NIVEL[nivel]]} IS NOT NULL")
+
+    if fuente.get("campo_anio"):
+        condiciones.append(f"{fuente['campo_anio']} = {ANIO}")
+
+    # El filtro de subregión solo se aplicaba a los conteos por distrito (un
+    # establecimiento ya pertenece a la DIRIS); se mantiene así para no
+    # cambiar las cifras por establecimiento
+    if con_filtro and nivel == "distrito" and fuente.get("filtro"):
+        condiciones.append(fuente["filtro"])
+
+    if diagnostico is not None:
+        sql, valores = nombres.condicion_igual(
+            entrada["base_datos"], fuente["tabla"], fuente["campo_diagnostico"], diagnostico
+        )
+        condiciones.append(sql)
+        params += valores
+
+    return " AND ".join(condiciones), params
+
+
+def _resultado_vacio(entrada):
+    resultado = {"total": 0, "detalle": [], "TIA_100k": None}
+    clave_detalle = entrada.get("clave_detalle", "tipo_dx")
+
+    for fuente in entrada["fuentes"]:
+        if fuente.get("tia"):
+            resultado["TIA_100k"] = 0
+        if fuente.get("campo_detalle"):
+            continue
+        for tipo, _, plano in fuente["conteos"]:
+            if plano:
+                resultado[plano] = 0
+            if not entrada.get("sin_detalle"):
+                resultado["detalle"].append({clave_detalle: tipo, "cantidad": 0})
+
+    return resultado
+
+
+def _acumular(resultado, entrada, fuente, valores, tipo_detalle=None):
+    clave_detalle = entrada.get("clave_detalle", "tipo_dx")
+    conteos = fuente["conteos"]
+
+    for (tipo, _, plano), valor in zip(conteos, valores):
+        cantidad = int(valor) if valor else 0
+        resultado["total"] += cantidad
+
+        if tipo_detalle is not None:
+            # Varias grafías de la misma entidad suman en el mismo tipo
+            item = next((d for d in resultado["detalle"] if d["tipo_dx"] == tipo_detalle), None)
+            if item is None:
+                resultado["detalle"].append({"tipo_dx": tipo_detalle, "cantidad": cantidad})
+            else:
+                item["cantidad"] += cantidad
+            continue
+
+        if plano:
+            resultado[plano] += cantidad
+        if not entrada.get("sin_detalle"):
+            for item in resultado["detalle"]:
+                if item[clave_detalle] == tipo:
+                    item["cantidad"] += cantidad
+
+    if fuente.get("tia"):
+        tia = valores[len(conteos)]
+        if tia is not None:
+            resultado["TIA_100k"] = float(tia)
+
+
+# (nivel, ENTIDAD normalizada) → grafía con la que la devolvió la base, para
+# mostrarla cuando la capa del mapa no tiene esa entidad
+_grafias = {}
+
+
+def grafia(nivel, entidad):
+    """Nombre guardado en la base para una ENTIDAD normalizada (la misma clave si no se vio)."""
+    return _grafias.get((nivel, entidad), entidad)
+
+
+def _clave_cache(entrada, nivel, valor, diagnostico):
+    # Misma normalización que usa el resolvedor de nombres canónicos
+    return (
+        entrada["clave"],
+        nivel,
+        nombres.normalizar(valor) if valor is not None else None,
+        nombres.normalizar(diagnostico) if diagnostico is not None else None,
+    )
+
+
+def consultar_conteos(entrada, nivel, valor=None, diagnostico=None):
+    """
+    Conteos agrupados, servidos desde la caché en memoria mientras sigan vigentes
+    (o vencidos, si la base no está disponible).
+    Con valor → {valor: resultado}; sin valor → {ENTIDAD: resultado} para todas,
+    con ENTIDAD normalizada (nombres.normalizar) para cruzarla con otras fuentes;
+    para responder, grafia() o el nombre de la capa del mapa.
+    """
+    snapshot = _snapshot_tia(entrada)
+    if snapshot is not None:
+        return _conteos_snapshot(entrada, snapshot, nivel, valor)
+
+    clave = _clave_cache(entrada, nivel, valor, diagnostico)
+    encontrado, resultados = cache.agregados.obtener(clave)
+    if encontrado:
+        return resultados
+
+    try:
+        resultados = _consultar_conteos_bd(entrada, nivel, valor, diagnostico)
+    except Exception as e:
+        return cache.agregados.respaldo(clave, e)
+
+    tablas = [fuente["tabla"] for fuente in entrada["fuentes"]]
+    cache.agregados.guardar(clave, resultados, cache.ttl_para_tablas(tablas), tablas)
+    return resultados
+
+
+def _snapshot_tia(entrada):
+    """Snapshot en memoria (tia.py) de las entradas TBC TIA, o None."""
+    if len(entrada["fuentes"]) != 1:
+        return None
+    return tia.SNAPSHOTS.get(entrada["fuentes"][0]["tabla"])
+
+
+def _conteos_snapshot(entrada, snapshot, nivel, valor):
+    """Mismo resultado que _consultar_conteos_bd, sin ir a la base."""
+    fuente = entrada["fuentes"][0]
+    agrupado = snapshot.agrupado(nivel)
+    if valor is not None:
+        encontrado = agrupado.get(nombres.normalizar(valor))
+        agrupado = {valor: encontrado} if encontrado else {}
+
+    else:
+        for entidad, nombre in snapshot.grafias(nivel).items():
+            _grafias.setdefault((nivel, entidad), nombre)
+
+    resultados = {}
+    for entidad, (casos, tia_100k) in agrupado.items():
+        resultados[entidad] = _resultado_vacio(entrada)
+        _acumular(resultados[entidad], entrada, fuente, [casos, tia_100k])
+    return resultados
+
+
+def _consultar_conteos_bd(entrada, nivel, valor, diagnostico):
+    """Ejecuta una consulta agrupada por fuente."""
+    resultados = {}
+
+    # Los filtros se arman antes de pedir la conexión: el resolvedor de
+    # nombres puede necesitar su propia conexión a la misma base
+    consultas = []
+    for fuente in entrada["fuentes"]:
+        clave = _clave_entidad(entrada, fuente, nivel)
+        where, params = _condiciones(entrada, fuente, nivel, valor, diagnostico)
+
+        columnas = [clave]
+        agrupar = [clave]
+        if fuente.get("campo_detalle"):
+            columnas.append(fuente["campo_detalle"])
+            agrupar.append(fuente["campo_detalle"])
+        columnas += [expr for _, expr, _ in fuente["conteos"]]
+        if fuente.get("tia"):
+            columnas.append(fuente["tia"])
+
+        sql = f"""
+            SELECT {", ".join(columnas)}
+            FROM {fuente['tabla']}
+            WHERE {where}
+            GROUP BY {", ".join(agrupar)}
+        """
+        consultas.append((fuente, sql, params))
+
+    # consultar(): si otro usuario pide lo mismo a la vez, se ejecuta una sola vez
+    for fuente, sql, params in consultas:
+        _, filas = consultar(entrada["base_datos"], sql, params)
+
+        for row in filas:
+            if valor is None and not row[0]:
+                continue
+            # Clave normalizada: con COLLATE ..._AI el GROUP BY puede devolver
+            # "BRENA" o "BREÑA" para el mismo distrito
+            entidad = valor if valor is not None else nombres.normalizar(row[0])
+            if valor is None:
+                _grafias.setdefault((nivel, entidad), row[0])
+            if entidad not in resultados:
+                resultados[entidad] = _resultado_vacio(entrada)
+
+            if fuente.get("campo_detalle"):
+                _acumular(resultados[entidad], entrada, fuente, row[2:], tipo_detalle=row[1])
+            else:
+                _acumular(resultados[entidad], entrada, fuente, row[1:])
+
+    for resultado in resultados.values():
+        if any(f.get("campo_detalle") for f in entrada["fuentes"]):
+            resultado["detalle"].sort(key=lambda d: d["cantidad"], reverse=True)
+
+    return resultados
+
+
+def contar(enfermedad, nivel, valor):
+    """Casos de un diagnóstico en un distrito o establecimiento."""
+    entrada, diagnostico = resolver(enfermedad)
+    resultados = consultar_conteos(entrada, nivel, valor, diagnostico)
+    # Con caché, la clave puede venir con otra grafía del mismo distrito
+    resultado = next(iter(resultados.values()), None)
+    return entrada, resultado or _resultado_vacio(entrada)
+
+
+def contar_todos(enfermedad, nivel):
+    """Casos de un diagnóstico para todos los distritos o establecimientos."""
+    entrada, diagnostico = resolver(enfermedad)
+    return consultar_conteos(entrada, nivel, None, diagnostico)
+
+
+# ============================================================
+# 🧮 VARIOS DIAGNÓSTICOS EN UNA CONSULTA POR BASE
+# ============================================================
+# Para la matriz diagnóstico × distrito: todas las tablas de una misma base
+# van en un solo SELECT ... UNION ALL (un GROUP BY por tabla) y todos los
+# diagnósticos NOTIWEB en un único GROUP BY entidad, DIAGNOSTICO. Las bases
+# se consultan en paralelo.
+
+_executor_matriz = ThreadPoolExecutor(max_workers=MATRIZ_HILOS, thread_name_prefix="matriz")
+
+
+def _select_totales(entrada, fuente, nivel, indice):
+    """SELECT indice, entidad, NULL, casos de una tabla del catálogo agrupada por entidad."""
+    clave = _clave_entidad(entrada, fuente, nivel)
+    where, params = _condiciones(entrada, fuente, nivel, None, None)
+    casos = " + ".join(f"({expr})" for _, expr, _ in fuente["conteos"])
+    return f"""
+        SELECT {indice}, {clave}, NULL, {casos}
+        FROM {fuente['tabla']}
+        WHERE {where}
+        GROUP BY {clave}
+    """, params
+
+
+def _select_notiweb(diagnosticos, nivel):
+    """SELECT -1, entidad, DIAGNOSTICO, COUNT(*) de NOTIWEB para todos los diagnósticos juntos."""
+    entrada = NOTIWEB
+    fuente = entrada["fuentes"][0]
+    campo = fuente["campo_diagnostico"]
+    clave = _clave_entidad(entrada, fuente, nivel)
+    where, params = _condiciones(entrada, fuente, nivel, None, None)
+
+    # Grafías reales de los diagnósticos conocidos; los que no están en el
+    # índice (o si no se pudo cargar) vienen normalizados y se comparan sin
+    # distinguir mayúsculas ni tildes
+    grafias, sin_indice = [], []
+    for dx in diagnosticos:
+        try:
+            encontradas = nombres.variantes(entrada["base_datos"], fuente["tabla"], campo, dx)
+        except Exception as e:
+            print(f"⚠️ Sin nombres canónicos para {fuente['tabla']}.{campo}: {e}")
+            encontradas = []
+        if encontradas:
+            grafias += encontradas
+        else:
+            sin_indice.append(dx)
+
+    filtros = []
+    if grafias:
+        filtros.append(f"{campo} IN ({', '.join('?' for _ in grafias)})")
+    if sin_indice:
+        marcas = ", ".join("?" for _ in sin_indice)
+        filtros.append(f"LTRIM(RTRIM({campo})) COLLATE Latin1_General_CI_AI IN ({marcas})")
+
+    return f"""
+        SELECT -1, {clave}, {campo}, {fuente['conteos'][0][1]}
+        FROM {fuente['tabla']}
+        WHERE {where} AND ({" OR ".join(filtros)})
+        GROUP BY {clave}, {campo}
+    """, params + grafias + sin_indice
+
+
+def _totales_base(base_datos, entradas, diagnosticos, nivel):
+    """
+    {clave: {ENTIDAD normalizada: casos}} de una base, donde clave es la clave
+    del catálogo o ("NOTIWEB", diagnóstico normalizado).
+    """
+    clave = ("MATRIZ", nivel, base_datos, tuple(e["clave"] for e in entradas), tuple(diagnosticos))
+    encontrado, totales = cache.agregados.obtener(clave)
+    if encontrado:
+        return totales
+
+    selects, params, tablas = [], [], []
+    for indice, entrada in enumerate(entradas):
+        for fuente in entrada["fuentes"]:
+            sql, valores = _select_totales(entrada, fuente, nivel, indice)
+            selects.append(sql)
+            params += valores
+            tablas.append(fuente["tabla"])
+    if diagnosticos:
+        sql, valores = _select_notiweb(diagnosticos, nivel)
+        selects.append(sql)
+        params += valores
+        tablas.append(NOTIWEB["fuentes"][0]["tabla"])
+
+    try:
+        _, filas = consultar(base_datos, "\nUNION ALL\n".join(selects), params)
+    except Exception as e:
+        return cache.agregados.respaldo(clave, e)
+
+    totales = {e["clave"]: {} for e in entradas}
+    totales.update({("NOTIWEB", dx): {} for dx in diagnosticos})
+    for indice, entidad, diagnostico, casos in filas:
+        if not entidad:
+            continue
+        destino = totales.get(entradas[indice]["clave"] if indice >= 0 else ("NOTIWEB", nombres.normalizar(diagnostico)))
+        if destino is None:
+            continue
+        entidad = nombres.normalizar(entidad)
+        destino[entidad] = destino.get(entidad, 0) + (int(casos) if casos else 0)
+
+    cache.agregados.guardar(clave, totales, cache.ttl_para_tablas(tablas), tablas)
+    return totales
+
+
+def contar_varios(enfermedades, nivel="distrito"):
+    """
+    {enfermedad: {ENTIDAD normalizada: casos}} para varios diagnósticos a la vez,
+    con una sola consulta por base de datos (en paralelo entre bases).
+    """
+    por_base = {}       # base -> (entradas del catálogo, diagnósticos NOTIWEB normalizados)
+    origen = {}         # enfermedad -> clave en el resultado de _totales_base
+    for enfermedad in enfermedades:
+        entrada, diagnostico = resolver(enfermedad)
+        entradas, diagnosticos = por_base.setdefault(entrada["base_datos"], ([], []))
+        if diagnostico is None:
+            if entrada not in entradas:
+                entradas.append(entrada)
+            origen[enfermedad] = (entrada["base_datos"], entrada["clave"])
+        else:
+            normalizado = nombres.normalizar(diagnostico)
+            if normalizado not in diagnosticos:
+                diagnosticos.append(normalizado)
+            origen[enfermedad] = (entrada["base_datos"], ("NOTIWEB", normalizado))
+
+    # Orden estable: la misma combinación de diagnósticos reutiliza la caché
+    futuros = {
+        base: _executor_matriz.submit(
+            _totales_base, base,
+            sorted(entradas, key=lambda e: e["clave"]), sorted(diagnosticos), nivel,
+        )
+        for base, (entradas, diagnosticos) in por_base.items()
+    }
+    totales = {base: futuro.result() for base, futuro in futuros.items()}
+    return {enfermedad: totales[base][clave] for enfermedad, (base, clave) in origen.items()}
+
+
+# ============================================================
+# 📤 EXPORTACIÓN
+# ============================================================
+def indices_permitidos(columnas, entrada):
+    """Posiciones de las columnas que se pueden exportar (sin datos personales)."""
+    prohibidas = {c.upper() for c in entrada.get("columnas_prohibidas", [])}
+    return [i for i, c in enumerate(columnas) if str(c).upper() not in prohibidas]
+
+
+def hojas_diagnostico(dx, nivel, valor):
+    """
+    Hojas a exportar para un diagnóstico: una consulta SELECT * por tabla.
+    Cada hoja es un dict con nombre, etiqueta, entrada, base_datos, sql y params.
+    """
+    entrada, diagnostico = resolver(dx)
+    hojas = []
+
+    for fuente in entrada["fuentes"]:
+        where, params = _condiciones(entrada, fuente, nivel, valor, diagnostico, con_filtro=False)
+        sufijo = fuente.get("nombre") if len(entrada["fuentes"]) > 1 else None
+
+        hojas.append({
+            "nombre": f"{dx}_{sufijo}" if sufijo else dx,
+            "etiqueta": sufijo or dx,
+            "entrada": entrada,
+            "base_datos": entrada["base_datos"],
+            "sql": f"""
+                SELECT *
+                FROM {fuente['tabla']}
+                WHERE {where}
+            """,
+            "params": params,
+        })
+
+    return hojas
+
+
+def nombre_hoja_unico(nombre, existentes):
+    for c in '[]:*?/\\':
+        nombre = nombre.replace(c, "_")
+    nombre = nombre[:31]
+
+    original = nombre
+    contador = 1
+    while nombre in existentes:
+        nombre = f"{original}_{contador}"[:31]
+        contador += 1
+
+    return nombre
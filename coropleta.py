@@ -0,0 +1,154 @@
+import hashlib
+import json
+
+import cache
+import catalogo
+import geodatos
+import nombres
+from database import consultar
+
+# ============================================================
+# 🎨 COROPLETA DE DISTRITOS ARMADA EN EL SERVIDOR
+# ============================================================
+# Un solo pedido devuelve el GeoJSON de distritos con casos, TIA, población,
+# tasa por 100 mil y la clase de color ya calculada, más los cortes de la
+# leyenda. Las clases replican la escala del mapa (App.tsx):
+#   TBC TIA → cortes fijos 25 / 50 / 75 sobre TIA_100k
+#   resto   → cuartos del rango [mín, máx] de los casos > 0 (si todos
+#             valen lo mismo, una sola clase: "clase_unica" en la leyenda)
+
+COLORES = ["#9a9a9aff", "#2eff1bff", "#fff134ff", "#fa9b15ff", "#f21a0aff"]
+ETIQUETAS = ["Sin casos", "Bajo", "Medio-Bajo", "Medio-Alto", "Alto"]
+CORTES_TIA = [25, 50, 75]
+CLAVES_TIA = ("TBC TIA", "TBC TIA EESS")
+
+
+def poblacion_por(nivel):
+    """{DISTRITO o ESTABLECIMIENTO normalizado: población total} (en caché como los demás agregados)."""
+    base_datos, tabla, columna = catalogo.TABLAS_POBLACION[nivel]
+    clave = ("POBLACION", nivel)
+    encontrado, poblacion = cache.agregados.obtener(clave)
+    if encontrado:
+        return poblacion
+
+    try:
+        _, filas = consultar(base_datos, f"""
+            SELECT [{columna}], SUM([MASCULINO] + [FEMENINO])
+            FROM [{tabla}]
+            GROUP BY [{columna}]
+        """)
+    except Exception as e:
+        return cache.agregados.respaldo(clave, e)
+
+    poblacion = {}
+    for nombre, total in filas:
+        clave_nombre = nombres.normalizar(nombre)
+        poblacion[clave_nombre] = poblacion.get(clave_nombre, 0) + (total or 0)
+
+    cache.agregados.guardar(clave, poblacion, cache.ttl_para_tablas([tabla]), [tabla])
+    return poblacion
+
+
+def cortes_clases(valores, es_tia):
+    """
+    Cortes entre clases. Sin cortes, toda unidad con casos queda en la
+    clase 1 (todas las unidades con casos tienen el mismo valor).
+    """
+    if es_tia:
+        return list(CORTES_TIA)
+
+    positivos = [v for v in valores if v and v > 0]
+    if not positivos:
+        return []
+
+    minimo, maximo = min(positivos), max(positivos)
+    if minimo == maximo:
+        return []
+    return [round(minimo + q * (maximo - minimo), 4) for q in (0.25, 0.5, 0.75)]
+
+
+def clase_de(valor, cortes):
+    if not valor or valor <= 0:
+        return 0
+    return 1 + sum(1 for corte in cortes if valor > corte)
+
+
+def propiedades_distritos(enfermedad):
+    """
+    Propiedades calculadas por distrito y cortes de la leyenda:
+    ({clave de distrito: {...}}, {"campo", "cortes", "colores", "etiquetas"}).
+    """
+    entrada, _ = catalogo.resolver(enfermedad)
+    conteos = catalogo.contar_todos(enfermedad, "distrito")
+    poblacion = poblacion_por("distrito")
+
+    por_distrito = {}
+    for distrito, resultado in conteos.items():
+        por_distrito[nombres.normalizar(distrito)] = resultado
+
+    es_tia = entrada.get("clave") in CLAVES_TIA
+    campo = "TIA_100k" if es_tia else "casos"
+
+    calculadas = {}
+    for feature in geodatos.DISTRITOS.features:
+        resultado = por_distrito.get(feature["clave"], {})
+        casos = resultado.get("total", 0) or 0
+        habitantes = poblacion.get(feature["clave"])
+
+        calculadas[feature["clave"]] = {
+            "casos": casos,
+            "TIA_100k": resultado.get("TIA_100k"),
+            "poblacion": habitantes,
+            "tasa_100k": round(casos * 100000 / habitantes, 2) if habitantes else None,
+        }
+
+    valores = [p[campo] for p in calculadas.values()]
+    cortes = cortes_clases(valores, es_tia)
+
+    for p in calculadas.values():
+        p["clase"] = clase_de(p[campo], cortes)
+        p["color"] = COLORES[p["clase"]]
+
+    leyenda = {
+        "campo": campo, "cortes": cortes, "colores": COLORES, "etiquetas": ETIQUETAS,
+        # Todas las unidades con casos tienen el mismo valor: una sola clase (1)
+        "clase_unica": not cortes and any(v and v > 0 for v in valores),
+    }
+    return calculadas, leyenda
+
+
+def generar(enfermedad, zoom=None):
+    """
+    Devuelve (etag, armar) donde armar() produce el cuerpo JSON con la
+    geometría simplificada para el zoom (ver geodatos.CapaGeo.nivel).
+    El ETag depende de la versión de la geometría y de las propiedades
+    calculadas, así un repintado sin cambios se responde con 304 sin
+    serializar nada.
+    """
+    capa = geodatos.DISTRITOS
+    if not capa.disponible:
+        raise RuntimeError(f"Capa de distritos no disponible: {capa.error}")
+
+    nivel = capa.nivel(zoom)
+    calculadas, leyenda = propiedades_distritos(enfermedad)
+    entrada, diagnostico = catalogo.resolver(enfermedad)
+    etiqueta = diagnostico or entrada.get("etiqueta")
+
+    firma = json.dumps([nivel["etag"], etiqueta, leyenda, calculadas], sort_keys=True, default=str)
+    etag = hashlib.sha256(firma.encode("utf-8")).hexdigest()[:32]
+
+    def armar():
+        partes = []
+        for feature, geometria in zip(capa.features, nivel["geometrias"]):
+            propiedades = {**feature["propiedades"], **calculadas[feature["clave"]]}
+            partes.append(
+                '{"type":"Feature","properties":'
+                + json.dumps(propiedades, ensure_ascii=False, default=str)
+                + ',"geometry":' + geometria + "}"
+            )
+
+        cabecera = {**capa.cabecera, "enfermedad": etiqueta, "leyenda": leyenda}
+        cabecera_json = json.dumps(cabecera, ensure_ascii=False, default=str)
+        return cabecera_json[:-1] + ',"features":[' + ",".join(partes) + "]}"
+
+    return etag, armar
@@ -0,0 +1,187 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import espacial
+import geodatos
+import nombres
+
+# ============================================================
+# 🔀 CRUCE DISTRITO ↔ JURISDICCIÓN EESS (ÁREAS DE INTERSECCIÓN)
+# ============================================================
+# Área en común de cada jurisdicción EESS con cada distrito, calculada una
+# vez y guardada en disco (el nombre del archivo lleva la versión de las
+# dos capas, así se recalcula solo si cambia algún GeoJSON).
+#
+# Cálculo por líneas de barrido: las capas se pasan a metros (proyección
+# local equirectangular, error < 0,1 % en Lima) y se cortan con rectas
+# horizontales cada CROSSWALK_PASO_M metros. Cada polígono queda como
+# intervalos en cada recta (exactos en x) y el área de una intersección es
+# la suma de los solapes de intervalos × paso. No necesita recortar
+# polígonos, así los bordes que coinciden entre capas no dan problemas.
+
+CROSSWALK_DIR = os.getenv('CROSSWALK_DIR', os.path.join(tempfile.gettempdir(), "sistema_mapas_geo"))
+CROSSWALK_PASO_M = float(os.getenv('CROSSWALK_PASO_M', '5'))
+
+METROS_POR_GRADO_LAT = 110574
+METROS_POR_GRADO_LON_ECUADOR = 111320
+
+_lock = threading.Lock()
+_cruce = None
+
+
+class _Barrido:
+    """Intervalos de un polígono (todas sus partes) en las rectas k0..k1."""
+
+    def __init__(self, anillos, proyectar, y0, paso):
+        lados = []
+        for anillo in anillos:
+            puntos = [proyectar(x, y) for x, y in anillo]
+            for (x1, y1), (x2, y2) in zip(puntos, puntos[1:] + puntos[:1]):
+                if y1 != y2:
+                    lados.append((x1, y1, x2, y2))
+        lados = np.array(lados, dtype=float).reshape(-1, 4)
+
+        ys = np.concatenate([lados[:, 1], lados[:, 3]])
+        self.k0 = int(math.floor((ys.min() - y0) / paso))
+        k1 = int(math.ceil((ys.max() - y0) / paso))
+        rectas = y0 + (np.arange(self.k0, k1 + 1) + 0.5) * paso
+
+        bloques = []
+        filas = max(1, espacial.ELEMENTOS_POR_BLOQUE // max(1, len(lados)))
+        ax, ay, bx, by = lados.T
+        for i in range(0, len(rectas), filas):
+            y = rectas[i:i + filas, None]
+            cruza = (ay > y) != (by > y)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x = np.where(cruza, ax + (y - ay) * (bx - ax) / (by - ay), np.inf)
+            bloques.append(np.sort(x, axis=1))
+
+        cortes = np.concatenate(bloques)
+        ancho = int(np.isfinite(cortes).sum(axis=1).max()) if len(cortes) else 0
+        ancho += ancho % 2
+        cortes = cortes[:, :ancho]
+        cortes[~np.isfinite(cortes)] = np.nan
+
+        self.inicios = cortes[:, 0::2]
+        self.fines = cortes[:, 1::2]
+        self.k1 = self.k0 + len(cortes) - 1
+        self.area = float(np.nansum(self.fines - self.inicios)) * paso
+
+    def interseccion(self, otro, paso):
+        k0, k1 = max(self.k0, otro.k0), min(self.k1, otro.k1)
+        if k0 > k1:
+            return 0.0
+
+        a = slice(k0 - self.k0, k1 - self.k0 + 1)
+        b = slice(k0 - otro.k0, k1 - otro.k0 + 1)
+        solape = (
+            np.minimum(self.fines[a][:, :, None], otro.fines[b][:, None, :])
+            - np.maximum(self.inicios[a][:, :, None], otro.inicios[b][:, None, :])
+        )
+        return float(np.clip(np.nan_to_num(solape), 0, None).sum()) * paso
+
+
+def calcular(paso=CROSSWALK_PASO_M):
+    distritos, eess = espacial.DISTRITOS, espacial.EESS
+    x0 = min(distritos.bbox[0], eess.bbox[0])
+    y0 = min(distritos.bbox[1], eess.bbox[1])
+    lat_media = (max(distritos.bbox[3], eess.bbox[3]) + y0) / 2
+    metros_lon = METROS_POR_GRADO_LON_ECUADOR * math.cos(math.radians(lat_media))
+
+    def proyectar(lon, lat):
+        return (lon - x0) * metros_lon, (lat - y0) * METROS_POR_GRADO_LAT
+
+    def barridos(indice):
+        por_feature = {}
+        for i, feature in enumerate(indice.capa.features):
+            anillos = [a for poligono in espacial.anillos_de(feature["geometria"]) for a in poligono if len(a) >= 3]
+            if anillos:
+                por_feature[feature["nombre"]] = _Barrido(anillos, proyectar, 0.0, paso)
+        return por_feature
+
+    inicio = time.time()
+    b_distritos, b_eess = barridos(distritos), barridos(eess)
+
+    intersecciones = []
+    for distrito, bd in b_distritos.items():
+        for establecimiento, be in b_eess.items():
+            area = bd.interseccion(be, paso)
+            if area <= 0:
+                continue
+            intersecciones.append({
+                "distrito": distrito,
+                "establecimiento": establecimiento,
+                "area_m2": round(area, 1),
+                "fraccion_distrito": round(area / bd.area, 6) if bd.area else 0,
+                "fraccion_establecimiento": round(area / be.area, 6) if be.area else 0,
+            })
+
+    print(f"🔀 Cruce distrito/EESS: {len(intersecciones)} intersecciones en {time.time() - inicio:.1f} s")
+    return {
+        "versiones": {"distritos": distritos.capa.version, "eess": eess.capa.version},
+        "paso_m": paso,
+        "areas_m2": {
+            "distrito": {n: round(b.area, 1) for n, b in b_distritos.items()},
+            "establecimiento": {n: round(b.area, 1) for n, b in b_eess.items()},
+        },
+        "intersecciones": intersecciones,
+    }
+
+
+def _ruta():
+    return os.path.join(
+        CROSSWALK_DIR,
+        f"crosswalk_{geodatos.DISTRITOS.version}_{geodatos.EESS.version}_{CROSSWALK_PASO_M:g}m.json",
+    )
+
+
+def obtener():
+    """Cruce guardado en disco, o calculado (y guardado) si todavía no existe."""
+    global _cruce
+    with _lock:
+        if _cruce is not None:
+            return _cruce
+
+        ruta = _ruta()
+        if os.path.exists(ruta):
+            with open(ruta, encoding="utf-8") as f:
+                _cruce = json.load(f)
+            return _cruce
+
+        cruce = calcular()
+        os.makedirs(CROSSWALK_DIR, exist_ok=True)
+        temporal = ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(cruce, f, ensure_ascii=False)
+        os.replace(temporal, ruta)
+
+        _cruce = cruce
+        return _cruce
+
+
+OTRO_NIVEL = {"distrito": "establecimiento", "establecimiento": "distrito"}
+
+
+def repartir(valores, origen):
+    """
+    Reparte valores del nivel `origen` ({nombre: valor}) al otro nivel en
+    proporción al área: cada unidad de origen aporta valor × (área en común
+    / área de la unidad). Devuelve {nombre destino: valor estimado}.
+    """
+    destino = OTRO_NIVEL[origen]
+    por_nombre = {nombres.normalizar(k): v for k, v in valores.items()}
+
+    resultado = {}
+    for fila in obtener()["intersecciones"]:
+        valor = por_nombre.get(nombres.normalizar(fila[origen]))
+        if not valor:
+            continue
+        resultado[fila[destino]] = resultado.get(fila[destino], 0) + valor * fila[f"fraccion_{origen}"]
+
+    return {nombre: round(valor, 2) for nombre, valor in resultado.items()}
@@ -1,7 +1,14 @@
 import pyodbc
 import os
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
+import vuelo_unico
+
 load_dotenv()
 
 
@@ -10,24 +17,610 @@ DRIVER = '{ODBC Driver 18 for SQL Server}'
 USER = os.getenv('DB_USER')
 PASSWORD = os.getenv('DB_PASSWORD')
 
-def connect(db_name: str):
+# ============================================================
+# ⚙️ CONFIGURACIÓN DEL POOL DE CONEXIONES
+# ============================================================
+POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))                        # conexiones por base de datos
+POOL_IDLE_TIMEOUT = float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300'))   # seg. ociosa antes de cerrarla
+POOL_PING_AFTER = float(os.getenv('DB_POOL_PING_AFTER', '30'))        # seg. ociosa antes de validar con SELECT 1
+POOL_WAIT_TIMEOUT = float(os.getenv('DB_POOL_WAIT_TIMEOUT', '15'))    # seg. esperando una conexión libre
+POOL_MAX_LEASE = float(os.getenv('DB_POOL_MAX_LEASE', '600'))         # seg. sin consultas, más el timeout de consulta, antes de reclamar el cupo
+
+# ============================================================
+# 🚧 COMPARTIMENTOS POR BASE DE DATOS (BULKHEADS)
+# ============================================================
+# Las 11 bases están en el mismo SQL Server: una consulta lenta de TB o
+# mortalidad no debe ocupar todos los hilos del servidor. Cada base tiene
+# un cupo de consultas simultáneas (DB_LIMITE, o DB_LIMITE_<BASE> para una
+# en particular); si no se consigue cupo en DB_ESPERA_CUPO seg. se lanza
+# BaseDatosSaturada (el endpoint responde 503) en vez de hacer cola.
+# Cada consulta tiene además un tiempo máximo (DB_TIMEOUT_CONSULTA, o
+# DB_TIMEOUT_CONSULTA_<BASE>) aplicado a los cursores de la conexión.
+# Los cupos son por proceso (cada worker de servidor.py tiene los suyos).
+LIMITE_POR_BD = int(os.getenv('DB_LIMITE', '4'))                      # consultas simultáneas por base
+ESPERA_CUPO = float(os.getenv('DB_ESPERA_CUPO', '2'))                 # seg. esperando cupo antes del 503
+TIMEOUT_CONSULTA = int(os.getenv('DB_TIMEOUT_CONSULTA', '30'))        # seg. por consulta (0 = sin límite)
+
+CODIGOS_TIMEOUT = ("HYT00", "HYT01")
+
+# ============================================================
+# ⚡ CORTACIRCUITOS POR BASE DE DATOS
+# ============================================================
+# Si el SQL Server no responde, cada conexión nueva esperaría el timeout
+# de login completo. Tras DB_CIRCUITO_FALLOS fallos seguidos al conectar,
+# el circuito de la base se abre: las peticiones se rechazan al instante
+# (CircuitoAbierto → 503, o el último resultado bueno de la caché). Pasado
+# el enfriamiento se deja pasar una sonda (semiabierto): si conecta, el
+# circuito se cierra; si no, vuelve a abrirse con el doble de espera.
+TIMEOUT_CONEXION = int(os.getenv('DB_TIMEOUT_CONEXION', '5'))                   # seg. de login ODBC
+CIRCUITO_FALLOS = int(os.getenv('DB_CIRCUITO_FALLOS', '3'))                    # fallos seguidos para abrir
+CIRCUITO_ENFRIAMIENTO = float(os.getenv('DB_CIRCUITO_ENFRIAMIENTO', '10'))     # seg. abierto antes de probar
+CIRCUITO_ENFRIAMIENTO_MAX = float(os.getenv('DB_CIRCUITO_ENFRIAMIENTO_MAX', '120'))
+CIRCUITO_SONDAS = int(os.getenv('DB_CIRCUITO_SONDAS', '1'))                    # sondas por ventana semiabierta
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+
+def _por_base(variable, db_name, defecto):
+    return int(os.getenv(f"{variable}_{db_name}", str(defecto)))
+
+
+class BaseDatosSaturada(Exception):
+    """No hubo cupo en la base a tiempo: el cliente debe reintentar más tarde."""
+
+    def __init__(self, db_name, limite, espera):
+        super().__init__(
+            f"Base de datos {db_name} saturada ({limite} consultas en curso, "
+            f"sin cupo tras {espera:g} s). Intente nuevamente."
+        )
+        self.db_name = db_name
+
+
+class CircuitoAbierto(Exception):
+    """La base falló varias veces seguidas al conectar: se rechaza sin intentar."""
+
+    def __init__(self, db_name, reintento):
+        super().__init__(
+            f"Base de datos {db_name} no disponible (circuito abierto, "
+            f"próximo intento en {reintento:.0f} s)"
+        )
+        self.db_name = db_name
+        self.reintento = reintento
+
+
+def es_timeout(error):
+    """True si el error es una consulta cancelada por tiempo (SQLSTATE HYT00/HYT01)."""
+    return isinstance(error, pyodbc.Error) and bool(error.args) and error.args[0] in CODIGOS_TIMEOUT
+
+
+def es_no_disponible(error):
+    """Base saturada, caída o consulta vencida: el cliente puede reintentar (503)."""
+    return (
+        isinstance(error, (BaseDatosSaturada, CircuitoAbierto, ConnectionError))
+        or es_timeout(error)
+        or (isinstance(error, pyodbc.Error) and bool(error.args) and str(error.args[0]).startswith("08"))
+    )
+
+
+class Circuito:
+    """Cortacircuitos de las conexiones nuevas a una base."""
+
+    def __init__(self, db_name: str):
+        self.db_name = db_name
+        self.estado = CERRADO
+        self._fallos = 0
+        self._enfriamiento = CIRCUITO_ENFRIAMIENTO
+        self._reintento = 0.0
+        self._sondas = 0
+        self._lock = threading.Lock()
+        self.ultimo_error = None
+        self.stats = {"aperturas": 0, "rechazos": 0, "sondas": 0, "fallos": 0}
+
+    def permitir(self):
+        """True si la petición va como sonda; lanza CircuitoAbierto si se rechaza."""
+        with self._lock:
+            if self.estado == CERRADO:
+                return False
+
+            ahora = time.monotonic()
+            if ahora >= self._reintento:
+                # Nueva ventana: si la sonda anterior nunca respondió se prueba otra
+                if self.estado == ABIERTO:
+                    print(f"⚡ Circuito {self.db_name}: semiabierto, probando conexión")
+                self.estado = SEMIABIERTO
+                self._sondas = 0
+                self._reintento = ahora + self._enfriamiento
+
+            if self.estado == SEMIABIERTO and self._sondas < CIRCUITO_SONDAS:
+                self._sondas += 1
+                self.stats["sondas"] += 1
+                return True
+
+            self.stats["rechazos"] += 1
+            raise CircuitoAbierto(self.db_name, self._reintento - ahora)
+
+    def exito(self):
+        with self._lock:
+            self._fallos = 0
+            if self.estado != CERRADO:
+                print(f"✅ Circuito {self.db_name}: cerrado, la base responde")
+                self.estado = CERRADO
+                self._enfriamiento = CIRCUITO_ENFRIAMIENTO
+
+    def fallo(self, error, sonda):
+        """Registra un fallo al conectar. True si el circuito se acaba de abrir."""
+        with self._lock:
+            self._fallos += 1
+            self.stats["fallos"] += 1
+            self.ultimo_error = str(error)
+
+            if sonda:
+                self._enfriamiento = min(self._enfriamiento * 2, CIRCUITO_ENFRIAMIENTO_MAX)
+            elif not (self.estado == CERRADO and self._fallos >= CIRCUITO_FALLOS):
+                return False
+
+            self.estado = ABIERTO
+            self._reintento = time.monotonic() + self._enfriamiento
+            self.stats["aperturas"] += 1
+            print(f"⚡ Circuito {self.db_name}: abierto por {self._enfriamiento:g} s ({error})")
+            return True
+
+    def a_dict(self):
+        with self._lock:
+            return {
+                "estado": self.estado,
+                "fallos_seguidos": self._fallos,
+                "reintento_en_s": round(max(0.0, self._reintento - time.monotonic()), 1)
+                if self.estado != CERRADO else None,
+                "ultimo_error": self.ultimo_error,
+                **self.stats,
+            }
+
+
+class Compartimento:
+    """Semáforo con métricas: cupos en uso, cola de espera, rechazos y tiempo lleno."""
+
+    def __init__(self, db_name: str, limite: int):
+        self.db_name = db_name
+        self.limite = limite
+        self._en_uso = 0
+        self._esperando = 0
+        self._lleno_desde = None
+        self._cond = threading.Condition()
+        self.stats = {
+            "obtenidos": 0, "rechazados": 0, "consultas_vencidas": 0,
+            "pico_en_uso": 0, "pico_esperando": 0,
+            "espera_total_ms": 0.0, "espera_max_ms": 0.0, "tiempo_lleno_s": 0.0,
+        }
+
+    def tomar(self, espera: float):
+        inicio = time.monotonic()
+        limite = inicio + espera
+
+        with self._cond:
+            self._esperando += 1
+            self.stats["pico_esperando"] = max(self.stats["pico_esperando"], self._esperando)
+            try:
+                while self._en_uso >= self.limite:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self.stats["rechazados"] += 1
+                        raise BaseDatosSaturada(self.db_name, self.limite, espera)
+                    self._cond.wait(restante)
+            finally:
+                self._esperando -= 1
+
+            self._en_uso += 1
+            if self._en_uso == self.limite:
+                self._lleno_desde = time.monotonic()
+
+            esperado = (time.monotonic() - inicio) * 1000
+            self.stats["obtenidos"] += 1
+            self.stats["pico_en_uso"] = max(self.stats["pico_en_uso"], self._en_uso)
+            self.stats["espera_total_ms"] += esperado
+            self.stats["espera_max_ms"] = max(self.stats["espera_max_ms"], esperado)
+
+    def liberar(self):
+        with self._cond:
+            if self._lleno_desde is not None:
+                self.stats["tiempo_lleno_s"] += time.monotonic() - self._lleno_desde
+                self._lleno_desde = None
+            self._en_uso -= 1
+            self._cond.notify()
+
+    def contar_vencida(self):
+        with self._cond:
+            self.stats["consultas_vencidas"] += 1
+
+    def estado(self):
+        with self._cond:
+            tiempo_lleno = self.stats["tiempo_lleno_s"]
+            if self._lleno_desde is not None:
+                tiempo_lleno += time.monotonic() - self._lleno_desde
+            obtenidos = self.stats["obtenidos"]
+            return {
+                "limite": self.limite,
+                "en_uso": self._en_uso,
+                "esperando": self._esperando,
+                "saturacion": round(self._en_uso / self.limite, 3) if self.limite else 0,
+                **self.stats,
+                "espera_media_ms": round(self.stats["espera_total_ms"] / obtenidos, 2) if obtenidos else 0,
+                "espera_total_ms": round(self.stats["espera_total_ms"], 1),
+                "espera_max_ms": round(self.stats["espera_max_ms"], 1),
+                "tiempo_lleno_s": round(tiempo_lleno, 2),
+            }
+
+
+def _cadena_conexion(db_name: str):
+    if not USER:
+        return (
+            f"DRIVER={DRIVER};SERVER={SERVER};DATABASE={db_name};"
+            "Trusted_Connection=yes;TrustServerCertificate=yes;"
+        )
+    return (
+        f"DRIVER={DRIVER};SERVER={SERVER};DATABASE={db_name};"
+        f"UID={USER};PWD={PASSWORD};TrustServerCertificate=yes;"
+    )
+
+
+class ConexionPool:
+    """
+    Conexión prestada por el pool. Se usa igual que una conexión pyodbc,
+    pero close() (o salir del bloque with) la devuelve al pool.
+    Si el handler nunca la cierra, se devuelve sola al ser recolectada.
+    """
+
+    def __init__(self, pool, raw, token):
+        self._raw = raw
+        self._pool = pool
+        self._token = token
+        self._finalizer = weakref.finalize(self, pool._devolver, raw, token)
+
+    def cursor(self):
+        if not self._finalizer.alive:
+            raise RuntimeError("La conexión ya fue devuelta al pool")
+        return CursorMedido(self._raw.cursor(), self._pool.compartimento, self._renovar)
+
+    def _renovar(self):
+        self._pool._renovar(self._token)
+
+    def close(self):
+        self._finalizer()
+
+    @property
+    def closed(self):
+        return not self._finalizer.alive
+
+    def __getattr__(self, nombre):
+        if not self._finalizer.alive:
+            raise RuntimeError("La conexión ya fue devuelta al pool")
+        return getattr(self._raw, nombre)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class CursorMedido:
+    """
+    Cursor pyodbc que cuenta las consultas canceladas por tiempo. Cada
+    execute renueva el préstamo: una conexión en uso no se reclama.
+    """
+
+    __slots__ = ("_raw", "_compartimento", "_renovar")
+
+    def __init__(self, raw, compartimento, renovar):
+        self._raw = raw
+        self._compartimento = compartimento
+        self._renovar = renovar
+
+    def execute(self, *args):
+        self._renovar()
+        try:
+            self._raw.execute(*args)
+        except pyodbc.Error as e:
+            if es_timeout(e):
+                self._compartimento.contar_vencida()
+            raise
+        return self
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __getattr__(self, nombre):
+        return getattr(self._raw, nombre)
+
+
+class PoolBaseDatos:
+    """
+    Pool de conexiones para una base de datos (LIFO, con límite de tamaño).
+    Cada préstamo ocupa además un cupo del compartimento de la base.
+    """
+
+    def __init__(self, db_name: str, max_size: int = POOL_MAX):
+        self.db_name = db_name
+        self.circuito = Circuito(db_name)
+        self.compartimento = Compartimento(db_name, _por_base("DB_LIMITE", db_name, LIMITE_POR_BD))
+        self.timeout_consulta = _por_base("DB_TIMEOUT_CONSULTA", db_name, TIMEOUT_CONSULTA)
+        # El compartimento ya limita la concurrencia: el pool no agrega otra espera
+        self.max_size = max(max_size, self.compartimento.limite)
+        self._libres = deque()          # (raw, instante en que quedó libre)
+        self._prestadas = {}            # token -> (raw, último uso, seg. antes de reclamarla)
+        self._abriendo = 0
+        self._siguiente_token = 0
+        self._cond = threading.Condition()
+        self.stats = {
+            "creadas": 0, "reutilizadas": 0, "descartadas": 0,
+            "reclamadas": 0, "esperas_agotadas": 0,
+        }
+
+    # ---------------- internos ----------------
+    def _total(self):
+        return len(self._libres) + len(self._prestadas) + self._abriendo
+
+    def _cerrar(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _purgar_ociosas(self, ahora):
+        # Las más antiguas quedan a la izquierda (LIFO por la derecha)
+        while self._libres and ahora - self._libres[0][1] > POOL_IDLE_TIMEOUT:
+            raw, _ = self._libres.popleft()
+            self.stats["descartadas"] += 1
+            self._cerrar(raw)
+
+    def _reclamar_prestamos_vencidos(self, ahora):
+        # Conexiones que un handler nunca devolvió: liberar su cupo. El plazo
+        # siempre supera el timeout de consulta del préstamo, así una consulta
+        # larga legítima (exportaciones) no pierde su cupo a mitad de camino.
+        vencidas = [
+            token for token, (_, desde, plazo) in self._prestadas.items()
+            if ahora - desde > plazo
+        ]
+        for token in vencidas:
+            del self._prestadas[token]
+            self.stats["reclamadas"] += 1
+            self.compartimento.liberar()
+
+    def _prestar(self, raw, timeout_consulta):
+        token = self._siguiente_token
+        self._siguiente_token += 1
+        # timeout_consulta 0 = sin límite: el préstamo tampoco se reclama
+        plazo = POOL_MAX_LEASE + timeout_consulta if timeout_consulta else float("inf")
+        self._prestadas[token] = (raw, time.monotonic(), plazo)
+        raw.timeout = timeout_consulta
+        return ConexionPool(self, raw, token)
+
+    def _renovar(self, token):
+        with self._cond:
+            prestamo = self._prestadas.get(token)
+            if prestamo is not None:
+                self._prestadas[token] = (prestamo[0], time.monotonic(), prestamo[2])
+
+    def _esta_viva(self, raw):
+        try:
+            cursor = raw.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _devolver(self, raw, token):
+        with self._cond:
+            vigente = self._prestadas.pop(token, None) is not None
+
+        if not vigente:
+            # Su cupo ya fue reclamado: no vuelve al pool
+            self._cerrar(raw)
+            return
+
+        self.compartimento.liberar()
+
+        try:
+            raw.rollback()
+            sana = True
+        except Exception:
+            sana = False
+
+        with self._cond:
+            if sana:
+                self._libres.append((raw, time.monotonic()))
+            else:
+                self.stats["descartadas"] += 1
+            self._cond.notify()
+
+        if not sana:
+            self._cerrar(raw)
+
+    # ---------------- API ----------------
+    def obtener(self, espera: float = ESPERA_CUPO, timeout_consulta: int = None):
+        """
+        Conexión prestada. Espera cupo hasta `espera` seg. (si no, lanza
+        BaseDatosSaturada); timeout_consulta reemplaza el de la base.
+        Con el circuito abierto lanza CircuitoAbierto sin esperar nada.
+        """
+        sonda = self.circuito.permitir()
+        self.compartimento.tomar(espera)
+        try:
+            if timeout_consulta is None:
+                timeout_consulta = self.timeout_consulta
+            return self._obtener(POOL_WAIT_TIMEOUT, timeout_consulta, sonda)
+        except BaseException:
+            self.compartimento.liberar()
+            raise
+
+    def _obtener(self, timeout, timeout_consulta, sonda=False):
+        limite = time.monotonic() + timeout
+
+        while True:
+            candidata = None
+            with self._cond:
+                while True:
+                    ahora = time.monotonic()
+                    self._purgar_ociosas(ahora)
+                    self._reclamar_prestamos_vencidos(ahora)
+
+                    # La sonda del circuito siempre prueba una conexión nueva
+                    if self._libres and not sonda:
+                        candidata = self._libres.pop()
+                        break
+
+                    if self._total() < self.max_size:
+                        self._abriendo += 1
+                        break
+
+                    restante = limite - ahora
+                    if restante <= 0:
+                        self.stats["esperas_agotadas"] += 1
+                        raise TimeoutError(
+                            f"Pool de {self.db_name} agotado ({self.max_size} conexiones en uso)"
+                        )
+                    self._cond.wait(restante)
+
+            # ---- Reutilizar una conexión libre ----
+            if candidata is not None:
+                raw, libre_desde = candidata
+                if time.monotonic() - libre_desde > POOL_PING_AFTER and not self._esta_viva(raw):
+                    self._cerrar(raw)
+                    with self._cond:
+                        self.stats["descartadas"] += 1
+                    continue
+                with self._cond:
+                    self.stats["reutilizadas"] += 1
+                    return self._prestar(raw, timeout_consulta)
+
+            # ---- Abrir una conexión nueva (fuera del lock) ----
+            try:
+                raw = pyodbc.connect(_cadena_conexion(self.db_name), timeout=TIMEOUT_CONEXION)
+            except Exception as e:
+                with self._cond:
+                    self._abriendo -= 1
+                    self._cond.notify()
+                if self.circuito.fallo(e, sonda):
+                    # Las conexiones libres quedaron del otro lado de la caída
+                    self.cerrar_todas()
+                raise
+
+            self.circuito.exito()
+            with self._cond:
+                self._abriendo -= 1
+                self.stats["creadas"] += 1
+                return self._prestar(raw, timeout_consulta)
+
+    def cerrar_todas(self):
+        with self._cond:
+            libres = [raw for raw, _ in self._libres]
+            self._libres.clear()
+        for raw in libres:
+            self._cerrar(raw)
+
+    def estado(self):
+        with self._cond:
+            pool = {
+                "max": self.max_size,
+                "libres": len(self._libres),
+                "en_uso": len(self._prestadas),
+                **self.stats,
+            }
+        return {
+            "pool": pool,
+            "circuito": self.circuito.a_dict(),
+            "compartimento": self.compartimento.estado(),
+            "timeout_consulta_s": self.timeout_consulta,
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_name: str):
+    pool = _pools.get(db_name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(db_name, PoolBaseDatos(db_name))
+    return pool
+
+
+def estado_pools():
+    return {nombre: pool.estado() for nombre, pool in list(_pools.items())}
+
+
+def cerrar_pools():
+    for pool in list(_pools.values()):
+        pool.cerrar_todas()
+
+
+def connect(db_name: str, espera: float = ESPERA_CUPO, timeout_consulta: int = None):
+    """
+    Conexión prestada, o None si no se pudo conectar. La saturación y el
+    circuito abierto sí se lanzan (503).
+    """
     try:
-        if not USER:
-            conn_str = (
-                f"DRIVER={DRIVER};SERVER={SERVER};DATABASE={db_name};"
-                "Trusted_Connection=yes;TrustServerCertificate=yes;"
-            )
-        else:
-            conn_str = (
-                f"DRIVER={DRIVER};SERVER={SERVER};DATABASE={db_name};"
-                f"UID={USER};PWD={PASSWORD};TrustServerCertificate=yes;"
-            )
-        
-        return pyodbc.connect(conn_str)
+        return get_pool(db_name).obtener(espera, timeout_consulta)
+    except BaseDatosSaturada as e:
+        print(f"🚧 {e}")
+        raise
+    except CircuitoAbierto:
+        # Sin log: durante una caída serían cientos de líneas por minuto
+        raise
     except Exception as e:
         print(f"❌ Error de conexión a {db_name}: {e}")
         return None
 
+
+@contextmanager
+def conexion(db_name: str, espera: float = ESPERA_CUPO, timeout_consulta: int = None):
+    """
+    Uso:
+        with conexion("EPI_BD_EDAS") as conn:
+            ...
+    La conexión vuelve al pool al salir del bloque (conn es None si falló).
+    """
+    conn = connect(db_name, espera, timeout_consulta)
+    try:
+        yield conn
+    finally:
+        if conn is not None:
+            conn.close()
+
+def _consultar(db_name, sql, params, espera, timeout_consulta):
+    with conexion(db_name, espera, timeout_consulta) as conn:
+        if conn is None:
+            raise ConnectionError(f"No se pudo conectar a {db_name}")
+
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        columnas = [d[0] for d in cursor.description]
+        filas = cursor.fetchall()
+        cursor.close()
+
+    return columnas, filas
+
+
+def consultar(db_name: str, sql: str, params=(), espera: float = ESPERA_CUPO, timeout_consulta: int = None):
+    """
+    (columnas, filas) de una consulta de solo lectura. Las llamadas idénticas
+    simultáneas (misma base, SQL normalizado y parámetros) comparten una sola
+    ejecución: las filas se comparten entre hilos y no se deben modificar.
+    """
+    params = tuple(params)
+    clave = (db_name, vuelo_unico.normalizar_sql(sql), params)
+    return vuelo_unico.consultas.hacer(
+        clave,
+        lambda: _consultar(db_name, sql, params, espera, timeout_consulta),
+        grupo=db_name,
+    )
+
 # 🔴 NUEVA CONEXIÓN PARA EDAS
 def get_edas_connection():
     return connect("EPI_BD_EDAS")
@@ -0,0 +1,179 @@
+import os
+
+import numpy as np
+
+import geodatos
+
+# ============================================================
+# 📍 ÍNDICE ESPACIAL PARA UBICAR PUNTOS (DISTRITO / EESS)
+# ============================================================
+# Se arma una vez sobre las capas cargadas en geodatos:
+#   1. rejilla uniforme sobre la extensión de la capa: cada celda guarda
+#      los polígonos cuyo rectángulo (bbox) la toca;
+#   2. por polígono, los lados repartidos en franjas horizontales, así la
+#      prueba exacta (par-impar, con huecos) solo recorre los lados de la
+#      franja donde cae el punto.
+# Una búsqueda típica revisa 1-2 candidatos y unas decenas de lados.
+#
+# Para lotes (buscar_lote) la misma prueba se hace con NumPy: filtro por
+# bbox de cada polígono y luego todos los puntos candidatos contra bloques
+# de lados a la vez.
+
+GEO_CELDAS = int(os.getenv('GEO_CELDAS', '64'))
+LADOS_POR_FRANJA = 8
+ELEMENTOS_POR_BLOQUE = 1_000_000    # puntos × lados por operación NumPy
+
+
+class _Poligono:
+    __slots__ = ("feature", "bbox", "y0", "alto_franja", "franjas", "lados")
+
+    def __init__(self, feature, anillos):
+        self.feature = feature
+
+        lados = []
+        for anillo in anillos:
+            for (x1, y1), (x2, y2) in zip(anillo, anillo[1:] + anillo[:1]):
+                if y1 != y2:
+                    lados.append((x1, y1, x2, y2))
+
+        xs = [p[0] for anillo in anillos for p in anillo]
+        ys = [p[1] for anillo in anillos for p in anillo]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+
+        n = max(1, len(lados) // LADOS_POR_FRANJA)
+        self.y0 = self.bbox[1]
+        self.alto_franja = (self.bbox[3] - self.bbox[1]) / n or 1
+        self.franjas = [[] for _ in range(n)]
+        for lado in lados:
+            a = self._franja(min(lado[1], lado[3]))
+            b = self._franja(max(lado[1], lado[3]))
+            for i in range(a, b + 1):
+                self.franjas[i].append(lado)
+
+        self.lados = np.array(lados, dtype=float).reshape(-1, 4)
+
+    def _franja(self, y):
+        return min(len(self.franjas) - 1, max(0, int((y - self.y0) / self.alto_franja)))
+
+    def contiene(self, x, y):
+        x0, y0, x1, y1 = self.bbox
+        if x < x0 or x > x1 or y < y0 or y > y1:
+            return False
+
+        dentro = False
+        for ax, ay, bx, by in self.franjas[self._franja(y)]:
+            if (ay > y) != (by > y) and x < ax + (y - ay) * (bx - ax) / (by - ay):
+                dentro = not dentro
+        return dentro
+
+    def contiene_lote(self, x, y):
+        """Máscara booleana: qué puntos (arrays x, y) caen dentro del polígono."""
+        dentro = np.zeros(len(x), dtype=bool)
+        if not len(x) or not len(self.lados):
+            return dentro
+
+        x, y = x[:, None], y[:, None]
+        paso = max(1, ELEMENTOS_POR_BLOQUE // len(x))
+        for i in range(0, len(self.lados), paso):
+            ax, ay, bx, by = self.lados[i:i + paso].T
+            cruza = ((ay > y) != (by > y)) & (x < ax + (y - ay) * (bx - ax) / (by - ay))
+            dentro ^= (np.count_nonzero(cruza, axis=1) % 2).astype(bool)
+        return dentro
+
+
+def anillos_de(geometria):
+    """[[anillos de un polígono como listas de (x, y) sin cierre]] de la geometría."""
+    if not geometria:
+        return []
+    poligonos = [geometria["coordinates"]] if geometria["type"] == "Polygon" else geometria["coordinates"]
+    return [
+        [[(c[0], c[1]) for c in anillo[:-1] if anillo] for anillo in poligono]
+        for poligono in poligonos
+    ]
+
+
+class IndiceEspacial:
+    def __init__(self, capa, celdas=GEO_CELDAS):
+        self.capa = capa
+        self.poligonos = [
+            _Poligono(i, anillos)
+            for i, feature in enumerate(capa.features)
+            for anillos in anillos_de(feature["geometria"])
+            if anillos and len(anillos[0]) >= 3
+        ]
+        self.celdas = celdas
+        self.rejilla = {}
+
+        if not self.poligonos:
+            self.bbox = None
+            return
+
+        self.bbox = (
+            min(p.bbox[0] for p in self.poligonos), min(p.bbox[1] for p in self.poligonos),
+            max(p.bbox[2] for p in self.poligonos), max(p.bbox[3] for p in self.poligonos),
+        )
+        self.ancho = (self.bbox[2] - self.bbox[0]) / celdas or 1
+        self.alto = (self.bbox[3] - self.bbox[1]) / celdas or 1
+
+        for poligono in self.poligonos:
+            cx0, cy0 = self._celda(poligono.bbox[0], poligono.bbox[1])
+            cx1, cy1 = self._celda(poligono.bbox[2], poligono.bbox[3])
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    self.rejilla.setdefault((cx, cy), []).append(poligono)
+
+    def _celda(self, x, y):
+        cx = min(self.celdas - 1, max(0, int((x - self.bbox[0]) / self.ancho)))
+        cy = min(self.celdas - 1, max(0, int((y - self.bbox[1]) / self.alto)))
+        return cx, cy
+
+    def buscar(self, lon, lat):
+        """Índice de la feature que contiene el punto, o None."""
+        if self.bbox is None:
+            return None
+        if not (self.bbox[0] <= lon <= self.bbox[2] and self.bbox[1] <= lat <= self.bbox[3]):
+            return None
+
+        for poligono in self.rejilla.get(self._celda(lon, lat), ()):
+            if poligono.contiene(lon, lat):
+                return poligono.feature
+        return None
+
+    def buscar_lote(self, lons, lats):
+        """Índice de feature de cada punto (-1 si ninguna). NaN nunca cae dentro."""
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        resultado = np.full(len(lons), -1, dtype=np.int64)
+
+        for poligono in self.poligonos:
+            x0, y0, x1, y1 = poligono.bbox
+            candidatos = np.flatnonzero(
+                (resultado < 0) & (lons >= x0) & (lons <= x1) & (lats >= y0) & (lats <= y1)
+            )
+            if candidatos.size:
+                dentro = poligono.contiene_lote(lons[candidatos], lats[candidatos])
+                resultado[candidatos[dentro]] = poligono.feature
+
+        return resultado
+
+    def nombres_lote(self, lons, lats):
+        """Nombre de la feature de cada punto ("" si ninguna)."""
+        nombres = np.array([f["nombre"] or "" for f in self.capa.features] + [""], dtype=object)
+        # -1 toma el último elemento: el "" agregado al final
+        return nombres[self.buscar_lote(lons, lats)]
+
+    def nombre(self, lon, lat):
+        indice = self.buscar(lon, lat)
+        return None if indice is None else self.capa.features[indice]["nombre"]
+
+
+DISTRITOS = IndiceEspacial(geodatos.DISTRITOS)
+EESS = IndiceEspacial(geodatos.EESS)
+
+
+def ubicar(lat, lng):
+    """{"distrito": nombre o None, "establecimiento": nombre o None}"""
+    return {
+        "distrito": DISTRITOS.nombre(lng, lat),
+        "establecimiento": EESS.nombre(lng, lat),
+    }
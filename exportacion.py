@@ -0,0 +1,462 @@
+import datetime
+import math
+import numbers
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import send_file
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+import pandas as pd
+
+import cache_exportaciones
+import catalogo
+import nombres
+import vuelo_unico
+from database import conexion, es_no_disponible
+
+# ============================================================
+# 📤 EXPORTACIÓN EXCEL EN STREAMING (MEMORIA CONSTANTE)
+# ============================================================
+# Las filas se leen del cursor por bloques y se escriben en un libro
+# openpyxl "write_only" (cada hoja va a un archivo temporal). El .xlsx
+# final se arma en un archivo temporal y se envía al cliente por partes.
+
+TAM_BLOQUE = int(os.getenv('EXPORT_TAM_BLOQUE', '2000'))               # filas por fetchmany
+SPOOL_MAX_BYTES = int(os.getenv('EXPORT_SPOOL_MAX_BYTES', str(8 * 1024 * 1024)))
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '8'))                 # hojas descargándose a la vez
+EXPORT_POR_BD = int(os.getenv('EXPORT_POR_BD', '2'))                   # consultas simultáneas por base
+HOJA_SPOOL_BYTES = int(os.getenv('EXPORT_HOJA_SPOOL_BYTES', str(1024 * 1024)))
+# Las exportaciones corren en segundo plano: esperan cupo en la base en vez
+# de fallar con 503, y sus SELECT * tienen más tiempo que las consultas del mapa
+EXPORT_ESPERA_CUPO = float(os.getenv('EXPORT_ESPERA_CUPO', '120'))
+EXPORT_TIMEOUT_CONSULTA = int(os.getenv('EXPORT_TIMEOUT_CONSULTA', '600'))
+
+MIMETYPE_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+_TIPOS_FECHA = (datetime.datetime, datetime.date, datetime.time, datetime.timedelta)
+
+
+def _celda(valor):
+    """Convierte un valor de pyodbc / pandas a algo que openpyxl pueda escribir."""
+    if valor is None or isinstance(valor, _TIPOS_FECHA):
+        return valor
+    if isinstance(valor, numbers.Number):
+        # NULL leído por pandas llega como NaN: celda vacía
+        if isinstance(valor, float) and math.isnan(valor):
+            return None
+        return valor
+    if isinstance(valor, (bytes, bytearray)):
+        return valor.hex()
+    return ILLEGAL_CHARACTERS_RE.sub("", str(valor))
+
+
+def leer_en_bloques(base_datos, sql, params, entrada=None):
+    """
+    Generador: primero entrega las columnas [(nombre, tipo, precisión, escala)]
+    y luego bloques de filas (listas de tuplas), ya sin las columnas
+    prohibidas del diagnóstico.
+    """
+    with conexion(base_datos, EXPORT_ESPERA_CUPO, EXPORT_TIMEOUT_CONSULTA) as conn:
+        if conn is None:
+            raise ConnectionError(f"No se pudo conectar a {base_datos}")
+
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+
+        columnas = [(d[0], d[1], d[4], d[5]) for d in cursor.description]
+        nombres = [c[0] for c in columnas]
+        indices = catalogo.indices_permitidos(nombres, entrada) if entrada else list(range(len(columnas)))
+        yield [columnas[i] for i in indices]
+
+        while True:
+            filas = cursor.fetchmany(TAM_BLOQUE)
+            if not filas:
+                break
+            yield [tuple(fila[i] for i in indices) for fila in filas]
+
+        cursor.close()
+
+
+# ============================================================
+# ⚡ DESCARGA PARALELA DE HOJAS
+# ============================================================
+# Cada hoja se consulta en un hilo del pool (con tope por base de datos)
+# y sus bloques se guardan en un archivo temporal propio. El libro se
+# escribe después en el orden pedido, leyendo esos archivos.
+
+_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="exportacion")
+_semaforos = {}
+_semaforos_lock = threading.Lock()
+
+
+def _semaforo(base_datos):
+    with _semaforos_lock:
+        if base_datos not in _semaforos:
+            _semaforos[base_datos] = threading.BoundedSemaphore(EXPORT_POR_BD)
+        return _semaforos[base_datos]
+
+
+def _descargar_hoja(hoja):
+    """Ejecuta la consulta de una hoja y vuelca sus bloques a un archivo temporal."""
+    archivo = tempfile.SpooledTemporaryFile(max_size=HOJA_SPOOL_BYTES)
+    try:
+        with _semaforo(hoja["base_datos"]):
+            bloques = leer_en_bloques(hoja["base_datos"], hoja["sql"], hoja["params"], hoja["entrada"])
+            try:
+                columnas = next(bloques)
+                for bloque in bloques:
+                    pickle.dump(bloque, archivo, pickle.HIGHEST_PROTOCOL)
+            finally:
+                bloques.close()
+    except Exception:
+        archivo.close()
+        raise
+
+    archivo.seek(0)
+    return columnas, archivo
+
+
+def _bloques_descargados(futuro):
+    """Mismo formato que leer_en_bloques(), pero desde una descarga en curso."""
+    columnas, archivo = futuro.result()
+    try:
+        yield columnas
+        while True:
+            try:
+                yield pickle.load(archivo)
+            except EOFError:
+                break
+    finally:
+        archivo.close()
+
+
+def _descartar_descarga(futuro):
+    if not futuro.cancelled() and futuro.exception() is None:
+        futuro.result()[1].close()
+
+
+class DescargasDiagnosticos:
+    """Hojas de varios diagnósticos descargándose en paralelo, en el orden pedido."""
+
+    def __init__(self, diagnosticos, nivel, valor):
+        self.valor = valor
+        self.hojas = [h for dx in diagnosticos for h in catalogo.hojas_diagnostico(dx, nivel, valor)]
+        self.futuros = [_executor.submit(_descargar_hoja, h) for h in self.hojas]
+        self._consumidas = 0
+
+    def __iter__(self):
+        """Entrega (hoja, bloques) en orden; cada una espera solo a su propia consulta."""
+        for hoja, futuro in zip(self.hojas, self.futuros):
+            self._consumidas += 1
+            yield hoja, _bloques_descargados(futuro)
+
+    def cancelar(self):
+        """Libera las descargas que no se llegaron a escribir."""
+        for futuro in self.futuros[self._consumidas:]:
+            if not futuro.cancel():
+                futuro.add_done_callback(_descartar_descarga)
+
+
+def filas_hoja(nombre, bloques, mensaje_vacio, mensaje_error):
+    """
+    Filas de una hoja (encabezado primero) a partir de leer_en_bloques().
+    Si no hay filas entrega una hoja "Mensaje"; si la consulta falla, una
+    hoja "Error" (o una última fila con el error si ya había datos).
+    """
+    hay_datos = False
+
+    try:
+        columnas = next(bloques)
+        primer_bloque = next(bloques, None)
+
+        if primer_bloque is None:
+            yield ["Mensaje"]
+            yield [mensaje_vacio]
+            return
+
+        yield [c[0] for c in columnas]
+        hay_datos = True
+
+        bloque = primer_bloque
+        while bloque is not None:
+            yield from bloque
+            bloque = next(bloques, None)
+
+    except Exception as e:
+        print(f"❌ Error en hoja {nombre}: {str(e)}")
+        if not hay_datos:
+            yield ["Error"]
+        yield [f"{mensaje_error}: {str(e)}"]
+
+    finally:
+        bloques.close()
+
+
+class LibroStreaming:
+    """Libro Excel en modo write_only: las hojas se escriben fila a fila."""
+
+    def __init__(self):
+        self.libro = Workbook(write_only=True)
+
+    @property
+    def hojas(self):
+        return self.libro.sheetnames
+
+    def escribir_hoja(self, nombre, bloques, mensaje_vacio, mensaje_error):
+        """Escribe una hoja desde un generador de leer_en_bloques(). Devuelve las filas sin el encabezado."""
+        hoja = self.libro.create_sheet(catalogo.nombre_hoja_unico(nombre, self.hojas))
+        filas_escritas = -1     # el encabezado no cuenta
+
+        for fila in filas_hoja(nombre, bloques, mensaje_vacio, mensaje_error):
+            hoja.append([_celda(v) for v in fila])
+            filas_escritas += 1
+
+        return filas_escritas
+
+    def escribir_dataframe(self, nombre, df):
+        hoja = self.libro.create_sheet(catalogo.nombre_hoja_unico(nombre, self.hojas))
+        hoja.append([_celda(c) for c in df.columns])
+        for fila in df.itertuples(index=False, name=None):
+            hoja.append([_celda(v) for v in fila])
+
+    def escribir_descargas(self, descargas, progreso=None):
+        try:
+            for h, bloques in descargas:
+                print(f"📄 Hoja {h['entrada']['clave']}: {h['nombre']}")
+                filas = self.escribir_hoja(
+                    h["nombre"],
+                    bloques,
+                    f"Sin registros de {h['etiqueta']} en {descargas.valor}",
+                    f"Error al obtener datos de {h['etiqueta']}",
+                )
+                print(f"✅ Hoja {h['nombre']}: {filas} registros")
+                if progreso:
+                    progreso()
+        finally:
+            descargas.cancelar()
+
+    def guardar_temporal(self):
+        """Guarda el libro en un archivo temporal (en memoria si es chico) listo para leer."""
+        archivo = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        try:
+            self.libro.save(archivo)
+        except Exception:
+            archivo.close()
+            raise
+        archivo.seek(0)
+        return archivo
+
+    def guardar_en(self, ruta):
+        """Guarda el libro en disco (se escribe aparte y se renombra al final)."""
+        temporal = f"{ruta}.parcial"
+        try:
+            self.libro.save(temporal)
+            os.replace(temporal, ruta)
+        except Exception:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+
+    def respuesta(self, nombre_archivo, clave_cache=None):
+        """
+        Respuesta Flask que envía el libro por partes desde el archivo temporal.
+        Con clave_cache, el libro además queda guardado en la caché en disco.
+        """
+        archivo = self.guardar_temporal()
+        if clave_cache:
+            cache_exportaciones.guardar(clave_cache, archivo)
+            archivo.seek(0)
+
+        archivo.seek(0, os.SEEK_END)
+        tamano = archivo.tell()
+        archivo.seek(0)
+
+        response = send_file(
+            archivo,
+            as_attachment=True,
+            download_name=nombre_archivo,
+            mimetype=MIMETYPE_XLSX,
+        )
+        response.content_length = tamano
+        return response
+
+
+# ============================================================
+# 🏗️ ARMADO COMPLETO DEL LIBRO
+# ============================================================
+class PoblacionNoEncontrada(LookupError):
+    pass
+
+
+def leer_poblacion(nivel, valor):
+    """
+    Población de la hoja POBLACION. Para un distrito es obligatoria (lanza
+    excepción); para un establecimiento se deja un mensaje en la hoja.
+    """
+    try:
+        base_datos, tabla, columna = catalogo.TABLAS_POBLACION[nivel]
+        filtro, params = nombres.condicion_igual(base_datos, tabla, columna, valor)
+
+        with conexion(base_datos, EXPORT_ESPERA_CUPO, EXPORT_TIMEOUT_CONSULTA) as conn_pob:
+            df_poblacion = pd.read_sql(f"SELECT * FROM {tabla} WHERE {filtro}", conn_pob, params=params)
+
+        if df_poblacion.empty:
+            if nivel == "distrito":
+                raise PoblacionNoEncontrada("No se encontró población")
+            df_poblacion = pd.DataFrame({
+                "Mensaje": [f"No se encontró población para el establecimiento {valor}"]
+            })
+
+    except Exception as e:
+        # Base saturada o caída: 503 en vez de un libro con la hoja de error
+        if nivel == "distrito" or es_no_disponible(e):
+            raise
+        print(f"❌ Error en población establecimiento: {str(e)}")
+        df_poblacion = pd.DataFrame({
+            "Error": [f"Error al obtener población: {str(e)}"]
+        })
+
+    return df_poblacion
+
+
+def contar_hojas(diagnosticos, nivel, valor):
+    """Total de hojas del libro: POBLACION + una por tabla de cada diagnóstico."""
+    return 1 + sum(len(catalogo.hojas_diagnostico(dx, nivel, valor)) for dx in diagnosticos)
+
+
+def construir_libro(nivel, valor, diagnosticos, progreso=None):
+    """
+    Arma el libro completo: las hojas de diagnóstico se descargan en paralelo
+    mientras se consulta la población. progreso() se llama por cada hoja escrita.
+    """
+    descargas = DescargasDiagnosticos(diagnosticos, nivel, valor)
+
+    try:
+        df_poblacion = leer_poblacion(nivel, valor)
+    except Exception:
+        descargas.cancelar()
+        raise
+
+    libro = LibroStreaming()
+    libro.escribir_dataframe("POBLACION", df_poblacion)
+    if progreso:
+        progreso()
+
+    libro.escribir_descargas(descargas, progreso)
+    return libro
+
+
+# ============================================================
+# 💾 CACHÉ DE LIBROS TERMINADOS
+# ============================================================
+def clave_cache(nivel, valor, diagnosticos):
+    """Clave en la caché en disco (incluye la versión de todas las tablas usadas)."""
+    tablas = [catalogo.TABLAS_POBLACION[nivel][:2]]
+    resueltos = []
+    for dx in diagnosticos:
+        entrada, diagnostico = catalogo.resolver(dx)
+        tablas += [(entrada["base_datos"], fuente["tabla"]) for fuente in entrada["fuentes"]]
+        # Alias y grafías del mismo diagnóstico comparten libro
+        resueltos.append(f"{entrada['clave']}|{nombres.normalizar(diagnostico) if diagnostico else ''}")
+
+    try:
+        return cache_exportaciones.clave(nivel, valor, resueltos, tablas)
+    except Exception as e:
+        print(f"⚠️ Caché de Excel no disponible: {e}")
+        return None
+
+
+class _LibroSinCache:
+    """
+    Libro que la caché en disco no aceptó: cada pedido que lo esperaba recibe
+    su propia copia y el último en copiarlo cierra el original.
+    """
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.pendientes = 1
+        self._lock = threading.Lock()
+
+    def repartir(self, receptores):
+        with self._lock:
+            self.pendientes = receptores
+
+    def copia(self):
+        copia = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        try:
+            with self._lock:
+                self.archivo.seek(0)
+                shutil.copyfileobj(self.archivo, copia)
+        except Exception:
+            copia.close()
+            raise
+        finally:
+            with self._lock:
+                self.pendientes -= 1
+                if self.pendientes <= 0:
+                    self.archivo.close()
+        copia.seek(0)
+        return copia
+
+
+def armar_en_cache(nivel, valor, diagnosticos, clave, progreso=None):
+    """
+    Arma el libro directamente en la caché en disco y devuelve su ruta. Si la
+    caché no lo aceptó (disco lleno, sin permisos), devuelve un archivo
+    temporal propio listo para leer, sin volver a armarlo. Si el mismo libro ya
+    se está armando para otro pedido, espera a ese en vez de repetir todas las
+    consultas.
+    """
+    def armar():
+        ruta = cache_exportaciones.buscar(clave)
+        if ruta:
+            return ruta
+        archivo = construir_libro(nivel, valor, diagnosticos, progreso).guardar_temporal()
+        try:
+            ruta = cache_exportaciones.guardar(clave, archivo)
+        except Exception:
+            archivo.close()
+            raise
+        if ruta:
+            archivo.close()
+            return ruta
+        return _LibroSinCache(archivo)
+
+    def repartir(armado, receptores):
+        if isinstance(armado, _LibroSinCache):
+            armado.repartir(receptores)
+
+    armado = vuelo_unico.libros.hacer(clave["archivo"], armar, grupo=nivel, al_repartir=repartir)
+    if isinstance(armado, _LibroSinCache):
+        return armado.copia()
+    return armado
+
+
+def respuesta_archivo(origen, nombre_archivo):
+    """Envía un libro ya armado: ruta en disco o archivo temporal abierto (de armar_en_cache)."""
+    if isinstance(origen, str):
+        return send_file(
+            origen,
+            as_attachment=True,
+            download_name=nombre_archivo,
+            mimetype=MIMETYPE_XLSX,
+        )
+
+    origen.seek(0, os.SEEK_END)
+    tamano = origen.tell()
+    origen.seek(0)
+
+    response = send_file(
+        origen,
+        as_attachment=True,
+        download_name=nombre_archivo,
+        mimetype=MIMETYPE_XLSX,
+    )
+    response.content_length = tamano
+    return response
@@ -0,0 +1,241 @@
+import csv
+import datetime
+import decimal
+import io
+import math
+import os
+import re
+import tempfile
+import zipfile
+
+from flask import Response
+
+import exportacion
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:     # Parquet es opcional: sin pyarrow solo hay xlsx y csv
+    pa = None
+    pq = None
+
+# ============================================================
+# 🗜️ EXPORTACIÓN EN ZIP: CSV O PARQUET POR HOJA
+# ============================================================
+# Mismas hojas que el Excel (POBLACION + una por tabla de cada diagnóstico),
+# mismas columnas prohibidas, pero sin armar un libro openpyxl:
+#   csv     → un CSV (UTF-8 con BOM) por hoja, el zip se envía mientras se escribe
+#   parquet → un .parquet por hoja (cada hoja se arma en un temporal y se agrega)
+
+FORMATOS = ("xlsx", "csv", "parquet")
+FILAS_POR_ENVIO = int(os.getenv('EXPORT_CSV_FILAS_POR_ENVIO', '5000'))    # filas CSV entre cada envío al cliente
+
+
+def parquet_disponible():
+    return pa is not None
+
+
+def _nombre_archivo(indice, nombre, extension):
+    nombre = re.sub(r'[\\/:*?"<>|]+', "_", nombre).strip() or "HOJA"
+    return f"{indice:02d}_{nombre}.{extension}"
+
+
+class _SalidaZip(io.RawIOBase):
+    """Destino no "seekable" del zip: acumula lo escrito hasta que se envía."""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+# ============================================================
+# 📄 CSV
+# ============================================================
+def _valor_csv(valor):
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    return valor
+
+
+def _escribir_csv(zf, salida, nombre_entrada, filas):
+    """Escribe un CSV dentro del zip, entregando bytes cada FILAS_POR_ENVIO filas."""
+    with zf.open(nombre_entrada, "w", force_zip64=True) as entrada:
+        texto = io.TextIOWrapper(entrada, encoding="utf-8-sig", newline="")
+        escritor = csv.writer(texto)
+
+        for i, fila in enumerate(filas, start=1):
+            escritor.writerow([_valor_csv(v) for v in fila])
+            if i % FILAS_POR_ENVIO == 0:
+                texto.flush()
+                yield salida.vaciar()
+
+        texto.flush()
+        texto.detach()
+
+
+def _filas_dataframe(df):
+    yield list(df.columns)
+    yield from df.itertuples(index=False, name=None)
+
+
+# ============================================================
+# 🧱 PARQUET
+# ============================================================
+def _tipo_arrow(tipo, precision, escala):
+    if tipo is bool:
+        return pa.bool_()
+    if tipo is int:
+        return pa.int64()
+    if tipo is float:
+        return pa.float64()
+    if tipo is decimal.Decimal:
+        if precision and 0 < precision <= 38 and escala is not None:
+            return pa.decimal128(precision, escala)
+        return pa.float64()
+    if tipo is datetime.datetime:
+        return pa.timestamp("us")
+    if tipo is datetime.date:
+        return pa.date32()
+    if tipo is datetime.time:
+        return pa.time64("us")
+    if tipo in (bytes, bytearray):
+        return pa.binary()
+    return pa.string()
+
+
+def _tabla_arrow(esquema, filas):
+    columnas = []
+    for i, campo in enumerate(esquema):
+        valores = [fila[i] for fila in filas]
+        if pa.types.is_string(campo.type):
+            valores = [None if v is None else str(v) for v in valores]
+        elif pa.types.is_floating(campo.type):
+            valores = [None if v is None else float(v) for v in valores]
+        columnas.append(pa.array(valores, type=campo.type))
+    return pa.Table.from_arrays(columnas, schema=esquema)
+
+
+def _parquet_mensaje(columna, mensaje):
+    archivo = tempfile.SpooledTemporaryFile(max_size=exportacion.HOJA_SPOOL_BYTES)
+    pq.write_table(pa.table({columna: [mensaje]}), archivo)
+    archivo.seek(0)
+    return archivo
+
+
+def _parquet_hoja(nombre, bloques, mensaje_vacio, mensaje_error):
+    """Arma el .parquet de una hoja, bloque a bloque, en un archivo temporal."""
+    archivo = tempfile.SpooledTemporaryFile(max_size=exportacion.SPOOL_MAX_BYTES)
+
+    try:
+        columnas = next(bloques)
+        bloque = next(bloques, None)
+
+        if bloque is None:
+            archivo.close()
+            return _parquet_mensaje("Mensaje", mensaje_vacio)
+
+        esquema = pa.schema([
+            pa.field(str(nombre_col), _tipo_arrow(tipo, precision, escala))
+            for nombre_col, tipo, precision, escala in columnas
+        ])
+
+        with pq.ParquetWriter(archivo, esquema) as escritor:
+            while bloque is not None:
+                escritor.write_table(_tabla_arrow(esquema, bloque))
+                bloque = next(bloques, None)
+
+    except Exception as e:
+        print(f"❌ Error en hoja {nombre}: {str(e)}")
+        archivo.close()
+        return _parquet_mensaje("Error", f"{mensaje_error}: {str(e)}")
+
+    finally:
+        bloques.close()
+
+    archivo.seek(0)
+    return archivo
+
+
+def _parquet_dataframe(df):
+    archivo = tempfile.SpooledTemporaryFile(max_size=exportacion.HOJA_SPOOL_BYTES)
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), archivo)
+    archivo.seek(0)
+    return archivo
+
+
+def _agregar_archivo(zf, salida, nombre_entrada, archivo):
+    with archivo, zf.open(nombre_entrada, "w", force_zip64=True) as entrada:
+        while True:
+            datos = archivo.read(1024 * 1024)
+            if not datos:
+                break
+            entrada.write(datos)
+            yield salida.vaciar()
+
+
+# ============================================================
+# 📦 ZIP COMPLETO
+# ============================================================
+def _partes_zip(df_poblacion, descargas, formato):
+    salida = _SalidaZip()
+    compresion = zipfile.ZIP_DEFLATED if formato == "csv" else zipfile.ZIP_STORED
+
+    try:
+        with zipfile.ZipFile(salida, "w", compression=compresion) as zf:
+            if formato == "csv":
+                yield from _escribir_csv(zf, salida, _nombre_archivo(0, "POBLACION", "csv"),
+                                         _filas_dataframe(df_poblacion))
+            else:
+                yield from _agregar_archivo(zf, salida, _nombre_archivo(0, "POBLACION", "parquet"),
+                                            _parquet_dataframe(df_poblacion))
+
+            for i, (h, bloques) in enumerate(descargas, start=1):
+                print(f"📄 Hoja {h['entrada']['clave']}: {h['nombre']} ({formato})")
+                mensaje_vacio = f"Sin registros de {h['etiqueta']} en {descargas.valor}"
+                mensaje_error = f"Error al obtener datos de {h['etiqueta']}"
+
+                if formato == "csv":
+                    filas = exportacion.filas_hoja(h["nombre"], bloques, mensaje_vacio, mensaje_error)
+                    yield from _escribir_csv(zf, salida, _nombre_archivo(i, h["nombre"], "csv"), filas)
+                else:
+                    archivo = _parquet_hoja(h["nombre"], bloques, mensaje_vacio, mensaje_error)
+                    yield from _agregar_archivo(zf, salida, _nombre_archivo(i, h["nombre"], "parquet"), archivo)
+
+        yield salida.vaciar()
+
+    finally:
+        descargas.cancelar()
+
+
+def generar_zip(nivel, valor, diagnosticos, formato):
+    """
+    Empieza la exportación en CSV o Parquet y devuelve el generador de bytes
+    del zip. La población se lee antes, así sus errores se informan con el
+    código HTTP correspondiente y no a mitad de la descarga.
+    """
+    descargas = exportacion.DescargasDiagnosticos(diagnosticos, nivel, valor)
+
+    try:
+        df_poblacion = exportacion.leer_poblacion(nivel, valor)
+    except Exception:
+        descargas.cancelar()
+        raise
+
+    return _partes_zip(df_poblacion, descargas, formato)
+
+
+def respuesta_zip(partes, nombre_archivo):
+    response = Response(partes, mimetype="application/zip")
+    response.headers.set("Content-Disposition", "attachment", filename=nombre_archivo)
+    return response
@@ -0,0 +1,151 @@
+import csv
+import itertools
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+import espacial
+import nombres
+
+# ============================================================
+# 🧭 UBICACIÓN MASIVA DE COORDENADAS (CSV / XLSX)
+# ============================================================
+# El archivo se lee por bloques de GEOCODIFICACION_BLOQUE filas (nunca
+# entero en memoria), cada bloque se ubica con NumPy contra las capas de
+# distritos y EESS y se devuelve como CSV mientras se procesa el siguiente.
+# Se agregan las columnas distrito, establecimiento y zona_utm.
+
+GEOCODIFICACION_BLOQUE = int(os.getenv('GEOCODIFICACION_BLOQUE', '10000'))
+GEOCODIFICACION_SPOOL_BYTES = int(os.getenv('GEOCODIFICACION_SPOOL_BYTES', str(8 * 1024 * 1024)))
+
+COLUMNAS_LAT = ("LAT", "LATITUD", "LATITUDE", "Y")
+COLUMNAS_LNG = ("LNG", "LON", "LONG", "LONGITUD", "LONGITUDE", "X")
+BANDAS_UTM = np.array(list("CDEFGHJKLMNPQRSTUVWXX"))
+
+
+def _columna(columnas, pedida, candidatas):
+    normalizadas = {nombres.normalizar(c): c for c in columnas}
+    if pedida:
+        if nombres.normalizar(pedida) not in normalizadas:
+            raise ValueError(f"No existe la columna '{pedida}'")
+        return normalizadas[nombres.normalizar(pedida)]
+
+    for candidata in candidatas:
+        if candidata in normalizadas:
+            return normalizadas[candidata]
+    raise ValueError(f"No se encontró columna de coordenadas ({', '.join(candidatas)})")
+
+
+def _numeros(serie):
+    """Admite coma decimal; lo que no sea número queda como NaN."""
+    texto = serie.astype(str).str.strip().str.replace(",", ".", regex=False)
+    return pd.to_numeric(texto, errors="coerce").to_numpy(dtype=float)
+
+
+def zonas_utm(lons, lats):
+    """'18L' por punto ("" fuera del rango UTM o sin coordenadas)."""
+    validos = np.isfinite(lons) & np.isfinite(lats) & (lats >= -80) & (lats <= 84) & (np.abs(lons) <= 180)
+    zona = np.clip(np.floor((np.nan_to_num(lons) + 180) / 6).astype(int) + 1, 1, 60)
+    banda = BANDAS_UTM[np.clip(np.floor((np.nan_to_num(lats) + 80) / 8).astype(int), 0, 20)]
+    return np.where(validos, np.char.add(zona.astype(str), banda), "")
+
+
+# --------------------------------------------------------
+# Lectura por bloques
+
+def _bloques_csv(archivo):
+    muestra = archivo.read(4096)
+    archivo.seek(0)
+    try:
+        separador = csv.Sniffer().sniff(muestra.decode("utf-8-sig", errors="replace"), ",;\t|").delimiter
+    except csv.Error:
+        separador = ","
+
+    return pd.read_csv(
+        archivo, sep=separador, dtype=str, keep_default_na=False,
+        encoding="utf-8-sig", encoding_errors="replace", chunksize=GEOCODIFICACION_BLOQUE,
+    )
+
+
+def _bloques_xlsx(archivo):
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezado = next(filas, None)
+        if encabezado is None:
+            return
+        columnas = [str(c) if c is not None else f"columna_{i + 1}" for i, c in enumerate(encabezado)]
+
+        while True:
+            bloque = list(itertools.islice(filas, GEOCODIFICACION_BLOQUE))
+            if not bloque:
+                return
+            yield pd.DataFrame(bloque, columns=columnas)
+    finally:
+        libro.close()
+
+
+def leer_bloques(archivo, nombre_archivo):
+    extension = os.path.splitext(nombre_archivo or "")[1].lower()
+    if extension in (".csv", ".txt"):
+        return iter(_bloques_csv(archivo))
+    if extension in (".xlsx", ".xlsm"):
+        return _bloques_xlsx(archivo)
+    raise ValueError(f"Formato no soportado: '{extension or nombre_archivo}' (use CSV o XLSX)")
+
+
+# --------------------------------------------------------
+# Ubicación y salida
+
+def ubicar_bloque(df, col_lat, col_lng):
+    lats = _numeros(df[col_lat])
+    lons = _numeros(df[col_lng])
+
+    df["distrito"] = espacial.DISTRITOS.nombres_lote(lons, lats)
+    df["establecimiento"] = espacial.EESS.nombres_lote(lons, lats)
+    df["zona_utm"] = zonas_utm(lons, lats)
+    return df
+
+
+def preparar(archivo, nombre_archivo, col_lat=None, col_lng=None):
+    """
+    Lee el primer bloque y valida las columnas antes de responder, así un
+    archivo inválido devuelve 400 y no un CSV cortado. Devuelve el generador
+    de texto CSV (UTF-8 con BOM) del archivo completo.
+
+    Flask cierra los archivos subidos al terminar la vista, antes de que se
+    envíe la respuesta: se copian a un temporal propio (en disco si es grande).
+    """
+    copia = tempfile.SpooledTemporaryFile(max_size=GEOCODIFICACION_SPOOL_BYTES)
+    try:
+        shutil.copyfileobj(archivo, copia)
+        copia.seek(0)
+
+        bloques = leer_bloques(copia, nombre_archivo)
+        primero = next(bloques, None)
+        if primero is None:
+            raise ValueError("El archivo no tiene filas")
+
+        col_lat = _columna(primero.columns, col_lat, COLUMNAS_LAT)
+        col_lng = _columna(primero.columns, col_lng, COLUMNAS_LNG)
+    except Exception:
+        copia.close()
+        raise
+
+    def generar():
+        total = 0
+        try:
+            for i, bloque in enumerate(itertools.chain([primero], bloques)):
+                bloque = ubicar_bloque(bloque, col_lat, col_lng)
+                total += len(bloque)
+                texto = bloque.to_csv(index=False, header=(i == 0), lineterminator="\r\n")
+                yield ("\ufeff" + texto) if i == 0 else texto
+        finally:
+            copia.close()
+        print(f"🧭 Geocodificación: {total} filas de {nombre_archivo}")
+
+    return generar()
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import math
+import os
+import threading
+
+import nombres
+import topologia
+
+# ============================================================
+# 🗺️ CAPAS GEOJSON CARGADAS UNA SOLA VEZ
+# ============================================================
+# Las geometrías no cambian entre pedidos: se leen al arrancar y cada
+# geometría queda ya serializada a JSON. Por pedido solo se arman las
+# propiedades de cada feature.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GEOJSON_DIR = os.getenv('GEOJSON_DIR', os.path.join(BASE_DIR, "public"))
+
+# Niveles simplificados por zoom (Web Mercator). Desde GEO_ZOOM_MAX se
+# sirve la geometría original; por debajo de GEO_ZOOM_MIN, la del mínimo.
+GEO_ZOOM_MIN = int(os.getenv('GEO_ZOOM_MIN', '8'))
+GEO_ZOOM_MAX = int(os.getenv('GEO_ZOOM_MAX', '17'))
+GEO_TOLERANCIA_PX = float(os.getenv('GEO_TOLERANCIA_PX', '0.5'))
+
+# Rejilla de cuantización de la versión TopoJSON (puntos por eje)
+TOPOJSON_CUANTIZACION = int(os.getenv('TOPOJSON_CUANTIZACION', '100000'))
+
+
+def grados_por_pixel(zoom):
+    """Ancho de un píxel en grados de longitud (teselas de 256 px)."""
+    return 360 / 256 / 2 ** zoom
+
+
+class CapaGeo:
+    def __init__(self, nombre, archivo, campo_nombre, vecinos_en_topojson=True):
+        self.nombre = nombre
+        self.archivo = archivo
+        self.campo_nombre = campo_nombre
+        self.vecinos_en_topojson = vecinos_en_topojson
+        self.features = []      # [{"clave", "propiedades", "geometria" (dict), "geometria_json"}]
+        self.nombre_por_clave = {}  # clave normalizada → nombre tal como está en la capa
+        self.cabecera = {}      # type, name, crs
+        self.version = None
+        self.error = None
+        self.topologia = None
+        self.vecinos = []       # por feature, índices de las features vecinas (por arcos compartidos)
+        self.topojson = None    # bytes, armado una vez al cargar
+        self._niveles = {}
+        self._lock = threading.Lock()
+
+        try:
+            self._cargar()
+        except Exception as e:
+            self.error = str(e)
+            print(f"❌ No se pudo cargar {archivo}: {e}")
+
+    def _cargar(self):
+        ruta = os.path.join(GEOJSON_DIR, self.archivo)
+        with open(ruta, "rb") as f:
+            crudo = f.read()
+
+        datos = json.loads(crudo)
+        self.version = hashlib.sha256(crudo).hexdigest()[:16]
+        self.cabecera = {k: v for k, v in datos.items() if k not in ("features",)}
+
+        for feature in datos.get("features", []):
+            propiedades = feature.get("properties") or {}
+            geometria = feature.get("geometry")
+            self.features.append({
+                "clave": nombres.normalizar(propiedades.get(self.campo_nombre)),
+                "nombre": propiedades.get(self.campo_nombre),
+                "propiedades": propiedades,
+                "geometria": geometria,
+                "geometria_json": json.dumps(geometria, separators=(",", ":")),
+            })
+
+        for f in self.features:
+            self.nombre_por_clave.setdefault(f["clave"], f["nombre"])
+
+        self.topologia = topologia.Topologia([f["geometria"] for f in self.features])
+        if self.vecinos_en_topojson:
+            self.vecinos = [sorted(v) for v in topologia.vecinos(self.topologia)]
+        self.topojson = self._armar_topojson()
+        print(f"🗺️ Capa {self.archivo}: {len(self.features)} features, {len(self.topologia.arcos)} arcos")
+
+    def _armar_topojson(self):
+        """Bordes compartidos una sola vez; cada feature lleva sus vecinos (si la capa los tiene)."""
+        if not self.vecinos_en_topojson:
+            propiedades = [f["propiedades"] for f in self.features]
+        else:
+            propiedades = [
+                {**f["propiedades"], "vecinos": [self.features[j]["nombre"] for j in vecinos]}
+                for f, vecinos in zip(self.features, self.vecinos)
+            ]
+        datos = topologia.topojson(self.topologia, self.nombre, propiedades, TOPOJSON_CUANTIZACION)
+        return json.dumps(datos, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+    @property
+    def disponible(self):
+        return self.error is None
+
+    # --------------------------------------------------------
+    # Niveles por zoom
+
+    @staticmethod
+    def zoom_nivel(zoom):
+        """Nivel que corresponde al zoom pedido (None = geometría original)."""
+        if zoom is None or zoom >= GEO_ZOOM_MAX:
+            return None
+        return max(zoom, GEO_ZOOM_MIN)
+
+    def _simplificar(self, zoom):
+        if zoom is None:
+            return [f["geometria_json"] for f in self.features]
+
+        paso = grados_por_pixel(zoom)
+        tolerancia = GEO_TOLERANCIA_PX * paso
+        # Coordenadas con la precisión de un cuarto de píxel
+        decimales = min(topologia.DECIMALES_BASE, max(4, math.ceil(-math.log10(paso / 4))))
+
+        originales = self.topologia.arcos
+        arcos = [
+            topologia.cuantizar_arco(topologia.simplificar_arco(arco, tolerancia), decimales)
+            for arco in originales
+        ]
+        return [
+            json.dumps(self.topologia.geometria(i, arcos, originales), separators=(",", ":"))
+            for i in range(len(self.features))
+        ]
+
+    def nivel(self, zoom):
+        """
+        {"zoom", "etag", "geometrias": [json por feature], "geojson": bytes}
+        Cada nivel se arma una vez y queda en memoria.
+        """
+        zoom = self.zoom_nivel(zoom)
+        with self._lock:
+            if zoom in self._niveles:
+                return self._niveles[zoom]
+
+            geometrias = self._simplificar(zoom)
+            partes = [
+                '{"type":"Feature","properties":'
+                + json.dumps(f["propiedades"], ensure_ascii=False, default=str)
+                + ',"geometry":' + g + "}"
+                for f, g in zip(self.features, geometrias)
+            ]
+            cabecera = json.dumps(self.cabecera, ensure_ascii=False, default=str)
+            cuerpo = cabecera[:-1] + ',"features":[' + ",".join(partes) + "]}"
+
+            nivel = {
+                "zoom": zoom,
+                "etag": f"{self.version}-z{zoom if zoom is not None else 'max'}",
+                "geometrias": geometrias,
+                "geojson": cuerpo.encode("utf-8"),
+            }
+            self._niveles[zoom] = nivel
+            return nivel
+
+    def estado(self):
+        return {
+            "archivo": self.archivo,
+            "features": len(self.features),
+            "version": self.version,
+            "arcos": len(self.topologia.arcos) if self.topologia else None,
+            "topojson": len(self.topojson) if self.topojson else None,
+            "niveles": {
+                str(z if z is not None else "max"): len(n["geojson"]) for z, n in self._niveles.items()
+            },
+            "error": self.error,
+        }
+
+
+DISTRITOS = CapaGeo("distritos", "distrito_solo_lima.geojson", "NM_DIST")
+# Las jurisdicciones EESS no comparten vértices: por arcos no saldría ningún
+# vecino. Su vecindad (con tolerancia) está en /api/vecinos?nivel=establecimiento.
+EESS = CapaGeo("eess", "JURISDICCION_EESS_DLC_update.geojson", "layer", vecinos_en_topojson=False)
+
+CAPAS = {"distritos": DISTRITOS, "eess": EESS}
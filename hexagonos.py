@@ -0,0 +1,214 @@
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+import cache
+import catalogo
+import nombres
+import vuelo_unico
+from database import conexion
+
+# ============================================================
+# ⬡ CASOS NOTIWEB AGRUPADOS EN HEXÁGONOS
+# ============================================================
+# Las coordenadas de los casos (LATITUD/LONGITUD de NOTIWEB_2025) nunca
+# salen del servidor: se agrupan en hexágonos de HEX_RESOLUCIONES metros
+# (radio) y solo se devuelve el centro de cada hexágono con su conteo.
+# Las celdas con menos de HEX_K_MINIMO casos se suprimen (k-anonimato).
+#
+# Las coordenadas de cada diagnóstico se leen una vez y quedan en caché;
+# el agrupamiento es vectorizado (NumPy) y su resultado también se cachea
+# por diagnóstico y resolución.
+
+HEX_RESOLUCIONES = [int(r) for r in os.getenv('HEX_RESOLUCIONES', '250,500,1000,2000').split(",")]
+HEX_K_MINIMO = int(os.getenv('HEX_K_MINIMO', '5'))
+TAM_LECTURA = 50000
+FORMATOS = ("compacto", "geojson")
+
+# Origen fijo de la rejilla (Plaza Mayor de Lima): las celdas no cambian entre consultas
+ORIGEN = (-77.0300, -12.0464)
+METROS_POR_GRADO_LAT = 110574
+METROS_POR_GRADO_LON = 111320 * math.cos(math.radians(ORIGEN[1]))
+RAIZ3 = math.sqrt(3)
+
+_puntos = cache.CacheTTL(max_entradas=20)
+
+
+# --------------------------------------------------------
+# Geometría hexagonal (hexágonos con punta arriba, coordenadas axiales)
+
+def _a_metros(lons, lats):
+    return (lons - ORIGEN[0]) * METROS_POR_GRADO_LON, (lats - ORIGEN[1]) * METROS_POR_GRADO_LAT
+
+
+def _a_grados(x, y):
+    return ORIGEN[0] + x / METROS_POR_GRADO_LON, ORIGEN[1] + y / METROS_POR_GRADO_LAT
+
+
+def celdas(lons, lats, radio):
+    """(q, r) axiales del hexágono de cada punto (redondeo cúbico)."""
+    x, y = _a_metros(lons, lats)
+    q = (RAIZ3 / 3 * x - y / 3) / radio
+    r = (2 / 3 * y) / radio
+    s = -q - r
+
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+
+    corregir_q = (dq > dr) & (dq > ds)
+    corregir_r = ~corregir_q & (dr > ds)
+    rq = np.where(corregir_q, -rr - rs, rq)
+    rr = np.where(corregir_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+def centro(q, r, radio):
+    return _a_grados(radio * RAIZ3 * (q + r / 2), radio * 1.5 * r)
+
+
+def contorno(q, r, radio):
+    """Anillo [lon, lat] cerrado del hexágono."""
+    cx, cy = radio * RAIZ3 * (q + r / 2), radio * 1.5 * r
+    puntos = []
+    for i in range(7):
+        angulo = math.radians(60 * (i % 6) - 30)
+        lon, lat = _a_grados(cx + radio * math.cos(angulo), cy + radio * math.sin(angulo))
+        puntos.append([round(lon, 6), round(lat, 6)])
+    return puntos
+
+
+# --------------------------------------------------------
+# Datos
+
+def _numeros(valores):
+    serie = pd.Series(valores, dtype=object).astype(str).str.strip().str.replace(",", ".", regex=False)
+    return pd.to_numeric(serie, errors="coerce").to_numpy(dtype=float)
+
+
+def _leer_puntos(diagnostico):
+    entrada = catalogo.NOTIWEB
+    fuente = entrada["fuentes"][0]
+    condiciones = ["[LATITUD] IS NOT NULL", "[LONGITUD] IS NOT NULL", fuente["filtro"]]
+    params = []
+
+    if diagnostico:
+        sql, valores = nombres.condicion_igual(
+            entrada["base_datos"], fuente["tabla"], fuente["campo_diagnostico"], diagnostico
+        )
+        condiciones.append(sql)
+        params += valores
+
+    lons, lats = [], []
+    with conexion(entrada["base_datos"]) as conn:
+        if conn is None:
+            raise ConnectionError(f"No se pudo conectar a {entrada['base_datos']}")
+
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT [LONGITUD], [LATITUD] FROM {fuente['tabla']} WHERE {' AND '.join(condiciones)}",
+            params,
+        )
+        while True:
+            filas = cursor.fetchmany(TAM_LECTURA)
+            if not filas:
+                break
+            columnas = list(zip(*filas))
+            lons.append(_numeros(columnas[0]))
+            lats.append(_numeros(columnas[1]))
+        cursor.close()
+
+    lons = np.concatenate(lons) if lons else np.empty(0)
+    lats = np.concatenate(lats) if lats else np.empty(0)
+
+    validos = (
+        np.isfinite(lons) & np.isfinite(lats)
+        & (np.abs(lons) <= 180) & (np.abs(lats) <= 90)
+        & ~((lons == 0) & (lats == 0))
+    )
+    return lons[validos], lats[validos]
+
+
+def puntos(diagnostico):
+    clave = nombres.normalizar(diagnostico)
+    encontrado, valor = _puntos.obtener(clave)
+    if not encontrado:
+        tabla = catalogo.NOTIWEB["fuentes"][0]["tabla"]
+        try:
+            valor = vuelo_unico.consultas.hacer(
+                ("PUNTOS", clave), lambda: _leer_puntos(diagnostico), grupo=catalogo.NOTIWEB["base_datos"]
+            )
+        except Exception as e:
+            return _puntos.respaldo(clave, e)
+        _puntos.guardar(clave, valor, cache.ttl_para_tablas([tabla]), [tabla])
+    return valor
+
+
+def agrupar(enfermedad, radio):
+    """
+    {"total_casos", "casos_suprimidos", "celdas_suprimidas", "celdas": [(q, r, casos)]}
+    para un diagnóstico NOTIWEB (None = todos).
+    """
+    diagnostico = None
+    if enfermedad:
+        entrada, diagnostico = catalogo.resolver(enfermedad)
+        if entrada is not catalogo.NOTIWEB:
+            raise ValueError(f"'{enfermedad}' no es un diagnóstico NOTIWEB (sin coordenadas)")
+
+    tabla = catalogo.NOTIWEB["fuentes"][0]["tabla"]
+    clave = ("HEXAGONOS", nombres.normalizar(diagnostico), radio, HEX_K_MINIMO)
+    encontrado, resultado = cache.agregados.obtener(clave)
+    if encontrado:
+        return resultado
+
+    lons, lats = puntos(diagnostico)
+    q, r = celdas(lons, lats, radio)
+
+    if len(q):
+        pares, conteos = np.unique(np.stack([q, r], axis=1), axis=0, return_counts=True)
+    else:
+        pares, conteos = np.empty((0, 2), dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    visibles = conteos >= HEX_K_MINIMO
+    resultado = {
+        "total_casos": int(len(q)),
+        "casos_suprimidos": int(conteos[~visibles].sum()),
+        "celdas_suprimidas": int((~visibles).sum()),
+        "celdas": [(int(a), int(b), int(c)) for (a, b), c in zip(pares[visibles], conteos[visibles])],
+    }
+    cache.agregados.guardar(clave, resultado, cache.ttl_para_tablas([tabla]), [tabla])
+    return resultado
+
+
+def respuesta(enfermedad, radio, formato="compacto"):
+    agrupado = agrupar(enfermedad, radio)
+    base = {
+        "diagnostico": enfermedad,
+        "resolucion_m": radio,
+        "k_minimo": HEX_K_MINIMO,
+        "total_casos": agrupado["total_casos"],
+        "casos_suprimidos": agrupado["casos_suprimidos"],
+        "celdas_suprimidas": agrupado["celdas_suprimidas"],
+    }
+
+    if formato == "geojson":
+        return {
+            "type": "FeatureCollection",
+            **base,
+            "features": [
+                {
+                    "type": "Feature",
+                    "properties": {"casos": casos},
+                    "geometry": {"type": "Polygon", "coordinates": [contorno(q, r, radio)]},
+                }
+                for q, r, casos in agrupado["celdas"]
+            ],
+        }
+
+    # [lat, lng, casos] del centro de cada hexágono
+    celdas_visibles = []
+    for q, r, casos in agrupado["celdas"]:
+        lon, lat = centro(q, r, radio)
+        celdas_visibles.append([round(lat, 6), round(lon, 6), casos])
+    return {**base, "celdas": celdas_visibles}
@@ -0,0 +1,257 @@
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+import catalogo
+import coropleta
+import espacial
+import nombres
+
+# ============================================================
+# 🔥 PUNTOS CALIENTES: GETIS-ORD Gi* Y MORAN LOCAL
+# ============================================================
+# La vecindad se arma una vez por capa (contigüidad queen con tolerancia):
+# dos polígonos son vecinos si algún vértice de uno queda a menos de
+# VECINOS_TOLERANCIA_M metros de un lado del otro. Hace falta tolerancia
+# porque las jurisdicciones EESS no comparten vértices entre sí.
+#
+# Los pesos se guardan dispersos (filas/columnas, estilo CSR) y las dos
+# estadísticas se calculan con NumPy sobre los conteos ya cacheados, así un
+# recálculo completo del mapa tarda milisegundos.
+
+VECINOS_TOLERANCIA_M = float(os.getenv('VECINOS_TOLERANCIA_M', '25'))
+
+NIVELES = {"distrito": espacial.DISTRITOS, "establecimiento": espacial.EESS}
+CONFIANZA = ((2.576, 99), (1.960, 95), (1.645, 90))
+
+_lock = threading.Lock()
+_pesos = {}
+
+
+# --------------------------------------------------------
+# Vecindad
+
+def _distancia_vertices_lados(vertices, lados):
+    """Mínima distancia de cualquier vértice a cualquier lado (todo en metros)."""
+    px, py = vertices[:, 0, None], vertices[:, 1, None]
+    ax, ay, bx, by = lados.T
+    dx, dy = bx - ax, by - ay
+    largo = dx * dx + dy * dy
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.clip(np.nan_to_num(((px - ax) * dx + (py - ay) * dy) / largo), 0, 1)
+    return float(np.sqrt((px - (ax + t * dx)) ** 2 + (py - (ay + t * dy)) ** 2).min())
+
+
+class Pesos:
+    """Vecinos de cada feature de una capa como arrays (filas, columnas)."""
+
+    def __init__(self, indice, tolerancia=VECINOS_TOLERANCIA_M):
+        self.nombres = [f["nombre"] for f in indice.capa.features]
+        self.n = len(self.nombres)
+
+        lat_media = (indice.bbox[1] + indice.bbox[3]) / 2
+        escala = np.array([111320 * math.cos(math.radians(lat_media)), 110574])
+
+        vertices, lados, cajas = [], [], []
+        for feature in indice.capa.features:
+            anillos = [a for p in espacial.anillos_de(feature["geometria"]) for a in p if a]
+            puntos = np.array([p for a in anillos for p in a], dtype=float).reshape(-1, 2) * escala
+            tramos = [
+                (x1, y1, x2, y2)
+                for a in anillos
+                for (x1, y1), (x2, y2) in zip(a, a[1:] + a[:1])
+            ]
+            tramos = np.array(tramos, dtype=float).reshape(-1, 4) * np.tile(escala, 2)
+            vertices.append(puntos)
+            lados.append(tramos)
+            cajas.append(
+                (puntos[:, 0].min(), puntos[:, 1].min(), puntos[:, 0].max(), puntos[:, 1].max())
+                if len(puntos) else None
+            )
+
+        filas, columnas = [], []
+        for i in range(self.n):
+            for j in range(i + 1, self.n):
+                a, b = cajas[i], cajas[j]
+                if a is None or b is None:
+                    continue
+                if (a[0] > b[2] + tolerancia or b[0] > a[2] + tolerancia
+                        or a[1] > b[3] + tolerancia or b[1] > a[3] + tolerancia):
+                    continue
+                if (_distancia_vertices_lados(vertices[i], lados[j]) <= tolerancia
+                        or _distancia_vertices_lados(vertices[j], lados[i]) <= tolerancia):
+                    filas += [i, j]
+                    columnas += [j, i]
+
+        self.filas = np.array(filas, dtype=np.int64)
+        self.columnas = np.array(columnas, dtype=np.int64)
+        self.vecinos = np.bincount(self.filas, minlength=self.n)
+
+    def lista(self):
+        """{nombre: [vecinos]}"""
+        resultado = {nombre: [] for nombre in self.nombres}
+        for i, j in zip(self.filas, self.columnas):
+            resultado[self.nombres[i]].append(self.nombres[j])
+        return resultado
+
+
+def pesos(nivel):
+    with _lock:
+        if nivel not in _pesos:
+            inicio = time.time()
+            _pesos[nivel] = Pesos(NIVELES[nivel])
+            print(f"🔥 Vecindad {nivel}: {len(_pesos[nivel].filas) // 2} pares en {time.time() - inicio:.2f} s")
+        return _pesos[nivel]
+
+
+# --------------------------------------------------------
+# Estadísticas
+
+def _rezago(w, valores, pesos_arista):
+    """Σ_j w_ij · x_j para cada i."""
+    return np.bincount(w.filas, weights=pesos_arista * valores[w.columnas], minlength=w.n)
+
+
+def getis_ord(w, x):
+    """z de Gi* con pesos binarios que incluyen a la propia unidad."""
+    n = len(x)
+    media = x.mean()
+    s = math.sqrt(max((x ** 2).mean() - media ** 2, 0))
+
+    suma_w = w.vecinos + 1.0
+    suma_wx = _rezago(w, x, np.ones(len(w.filas))) + x
+    denominador = s * np.sqrt((n * suma_w - suma_w ** 2) / (n - 1))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominador > 0, (suma_wx - media * suma_w) / denominador, np.nan)
+
+
+def moran_local(w, x):
+    """(I_i, z_i, rezago) con pesos estandarizados por fila (Anselin 1995, aleatorización)."""
+    n = len(x)
+    z = x - x.mean()
+    m2 = (z ** 2).mean()
+    m4 = (z ** 4).mean()
+
+    k = w.vecinos.astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pesos_arista = 1.0 / k[w.filas]
+    rezago = _rezago(w, z, pesos_arista)
+
+    if m2 == 0 or n < 3:
+        vacio = np.full(n, np.nan)
+        return vacio, vacio, rezago
+
+    I = z / m2 * rezago
+    b2 = m4 / m2 ** 2
+    w_i = np.where(k > 0, 1.0, 0.0)                                  # Σ_j w_ij
+    w_i2 = np.where(k > 0, 1.0 / np.maximum(k, 1), 0.0)              # Σ_j w_ij²
+    w_ikh = w_i ** 2 - w_i2                                          # Σ_{k≠h} w_ik·w_ih
+
+    esperado = -w_i / (n - 1)
+    varianza = (
+        w_i2 * (n - b2) / (n - 1)
+        + w_ikh * (2 * b2 - n) / ((n - 1) * (n - 2))
+        - esperado ** 2
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z_I = np.where((k > 0) & (varianza > 0), (I - esperado) / np.sqrt(varianza), np.nan)
+    return np.where(k > 0, I, np.nan), z_I, rezago
+
+
+def _clasificar(z):
+    if z is None or math.isnan(z):
+        return None
+    for corte, nivel in CONFIANZA:
+        if abs(z) >= corte:
+            return f"{'caliente' if z > 0 else 'frío'} {nivel}%"
+    return "no significativo"
+
+
+def _limpio(valor, decimales=4):
+    return None if valor is None or math.isnan(valor) else round(float(valor), decimales)
+
+
+def calcular(enfermedad, nivel="distrito", variable="tasa"):
+    """
+    Gi* y Moran local de la enfermedad sobre la capa del nivel.
+    variable: 'tasa' (casos por 100 mil hab.) o 'casos'. Las unidades sin
+    población quedan fuera cuando se usa la tasa.
+    """
+    w = pesos(nivel)
+    inicio = time.perf_counter()
+
+    conteos = {nombres.normalizar(k): v.get("total", 0) for k, v in catalogo.contar_todos(enfermedad, nivel).items()}
+    poblacion = coropleta.poblacion_por(nivel)
+
+    claves = [nombres.normalizar(n) for n in w.nombres]
+    casos = np.array([conteos.get(c, 0) or 0 for c in claves], dtype=float)
+    habitantes = np.array([poblacion.get(c) or np.nan for c in claves], dtype=float)
+
+    if variable == "tasa":
+        with np.errstate(divide="ignore", invalid="ignore"):
+            valores = casos / habitantes * 100000
+    else:
+        valores = casos
+
+    # Las unidades sin valor salen de la vecindad y de las medias
+    validos = np.isfinite(valores)
+    if validos.sum() < 3:
+        raise ValueError("Se necesitan al menos 3 unidades con datos para calcular puntos calientes")
+
+    sub = _subpesos(w, validos)
+    x = valores[validos]
+    gi = np.full(w.n, np.nan)
+    I = np.full(w.n, np.nan)
+    z_I = np.full(w.n, np.nan)
+    rezago = np.full(w.n, np.nan)
+
+    gi[validos] = getis_ord(sub, x)
+    I[validos], z_I[validos], rezago[validos] = moran_local(sub, x)
+
+    media = x.mean()
+    unidades = []
+    for i, nombre in enumerate(w.nombres):
+        cuadrante = None
+        if validos[i] and not math.isnan(I[i]):
+            cuadrante = ("A" if valores[i] >= media else "B") + ("A" if rezago[i] >= 0 else "B")
+
+        unidades.append({
+            "nombre": nombre,
+            "casos": int(casos[i]),
+            "poblacion": None if math.isnan(habitantes[i]) else int(habitantes[i]),
+            "valor": _limpio(valores[i], 2),
+            "vecinos": int(w.vecinos[i]),
+            "gi_z": _limpio(gi[i]),
+            "gi": _clasificar(gi[i]),
+            "moran_i": _limpio(I[i]),
+            "moran_z": _limpio(z_I[i]),
+            "cuadrante": cuadrante,         # AA / BB / AB / BA (alto/bajo, vecinos alto/bajo)
+        })
+
+    return {
+        "nivel": nivel,
+        "variable": variable,
+        "unidades": unidades,
+        "tiempo_ms": round((time.perf_counter() - inicio) * 1000, 2),
+    }
+
+
+class _SubPesos:
+    __slots__ = ("n", "filas", "columnas", "vecinos")
+
+
+def _subpesos(w, mascara):
+    """Pesos restringidos a las unidades de la máscara (reindexadas)."""
+    nuevo = np.cumsum(mascara) - 1
+    quedan = mascara[w.filas] & mascara[w.columnas]
+
+    sub = _SubPesos()
+    sub.n = int(mascara.sum())
+    sub.filas = nuevo[w.filas[quedan]]
+    sub.columnas = nuevo[w.columnas[quedan]]
+    sub.vecinos = np.bincount(sub.filas, minlength=sub.n)
+    return sub
@@ -0,0 +1,63 @@
+import catalogo
+import geodatos
+
+# ============================================================
+# 🧮 MATRIZ DIAGNÓSTICO × DISTRITO
+# ============================================================
+# La sala situacional pide ~15 diagnósticos para todos los distritos: en vez
+# de 15 × 40 llamadas a /api/casos_enfermedad, un pedido devuelve la matriz
+# completa. Las filas son los distritos de la capa (los que no tienen casos
+# van con 0); los conteos salen de catalogo.contar_varios.
+
+MATRIZ_MAX_DIAGNOSTICOS = 50
+FORMATOS = ("anidado", "columnar")
+
+
+def filas_distritos(conteos):
+    """[(clave, nombre)] de los distritos de la capa, o los que aparecen en los datos si no hay capa."""
+    if geodatos.DISTRITOS.disponible:
+        return [(f["clave"], f["nombre"]) for f in geodatos.DISTRITOS.features]
+
+    claves = sorted({entidad for por_entidad in conteos.values() for entidad in por_entidad})
+    return [(clave, clave) for clave in claves]
+
+
+def generar(enfermedades, formato="anidado"):
+    """
+    anidado  → {"distritos": {distrito: {diagnóstico: casos}}, ...}
+    columnar → {"distritos": [...], "diagnosticos": [...], "casos": [[casos por distrito] por diagnóstico]}
+    """
+    # Sin repetidos, en el orden pedido
+    enfermedades = list(dict.fromkeys(e.strip() for e in enfermedades if e and e.strip()))
+
+    conteos = catalogo.contar_varios(enfermedades, "distrito")
+    filas = filas_distritos(conteos)
+
+    etiquetas = {}
+    for enfermedad in enfermedades:
+        entrada, diagnostico = catalogo.resolver(enfermedad)
+        etiquetas[enfermedad] = diagnostico or entrada["etiqueta"]
+
+    totales = {e: sum(conteos[e].get(clave, 0) for clave, _ in filas) for e in enfermedades}
+    base = {
+        "nivel": "distrito",
+        "diagnosticos": enfermedades,
+        "etiquetas": etiquetas,
+        "totales": totales,
+    }
+
+    if formato == "columnar":
+        return {
+            **base,
+            "distritos": [nombre for _, nombre in filas],
+            "casos": [[conteos[e].get(clave, 0) for clave, _ in filas] for e in enfermedades],
+        }
+
+    return {
+        **base,
+        "distritos": {
+            nombre: {e: conteos[e].get(clave, 0) for e in enfermedades}
+            for clave, nombre in filas
+        },
+    }
+
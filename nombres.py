@@ -0,0 +1,74 @@
+import re
+import unicodedata
+
+import cache
+from database import consultar
+
+# ============================================================
+# 🔤 RESOLVEDOR DE NOMBRES CANÓNICOS
+# ============================================================
+# Las consultas filtraban con UPPER(col) = UPPER(?), que obliga a SQL Server
+# a recorrer toda la tabla. Aquí se cargan (y se guardan en caché) los
+# valores distintos que realmente existen en cada columna, y lo que escribe
+# el usuario (mayúsculas, tildes, espacios de más) se traduce a esas grafías
+# exactas para filtrar con col IN (?, ?), que sí puede usar un índice.
+
+_valores = cache.CacheTTL(max_entradas=200)
+
+
+def normalizar(texto):
+    """' Breña  ' → 'BRENA' (sin tildes, mayúsculas, espacios simples)."""
+    if texto is None:
+        return ""
+    texto = unicodedata.normalize("NFKD", str(texto))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", texto).strip().upper()
+
+
+def _cargar(base_datos, tabla, columna):
+    """{valor normalizado: [grafías guardadas]} de una columna."""
+    _, filas = consultar(base_datos, f"SELECT DISTINCT {columna} FROM {tabla} WHERE {columna} IS NOT NULL")
+
+    indice = {}
+    for (valor,) in filas:
+        indice.setdefault(normalizar(valor), []).append(valor)
+    return indice
+
+
+def valores(base_datos, tabla, columna):
+    clave = (base_datos, tabla, columna)
+    encontrado, indice = _valores.obtener(clave)
+    if not encontrado:
+        indice = _cargar(base_datos, tabla, columna)
+        _valores.guardar(clave, indice, cache.ttl_para_tablas([tabla]), [tabla])
+    return indice
+
+
+def variantes(base_datos, tabla, columna, valor):
+    """Grafías guardadas en la columna que corresponden a lo escrito (puede ser [])."""
+    return valores(base_datos, tabla, columna).get(normalizar(valor), [])
+
+
+def condicion_igual(base_datos, tabla, columna, valor, respaldo=None):
+    """
+    (sql, params) para filtrar la columna por un valor escrito por el usuario:
+      col IN (?, ?)  con las grafías reales.
+    Si no se pudieron cargar los valores, o el valor no está en el índice
+    (puede haber aparecido después de cargarlo), se usa el filtro de
+    respaldo (por defecto la comparación con UPPER de siempre).
+    """
+    try:
+        encontradas = variantes(base_datos, tabla, columna, valor)
+    except Exception as e:
+        print(f"⚠️ Sin nombres canónicos para {tabla}.{columna}: {e}")
+        encontradas = []
+
+    if not encontradas:
+        return respaldo or f"UPPER({columna}) = UPPER(?)", [valor]
+
+    marcas = ", ".join("?" for _ in encontradas)
+    return f"{columna} IN ({marcas})", list(encontradas)
+
+
+def estado():
+    return _valores.estado()
@@ -0,0 +1,175 @@
+import os
+import signal
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ============================================================
+# 🚀 SERVIDOR DE PRODUCCIÓN
+# ============================================================
+# Reemplaza a app.run() (servidor de desarrollo de Werkzeug) en el servicio:
+#     python servidor.py
+#
+# - Linux: gunicorn pre-fork, SERVIDOR_WORKERS procesos con SERVIDOR_HILOS
+#   hilos cada uno. También se puede lanzar directamente con
+#   `gunicorn -c servidor.py app:app` (toma esta misma configuración).
+# - Windows (o sin gunicorn): waitress, un proceso con SERVIDOR_HILOS hilos.
+#
+# La configuración sale del mismo .env que usa database.py. Cada worker
+# importa la app por su cuenta (sin preload): app.py arranca hilos y abre
+# conexiones al importarse, y eso no sobrevive a un fork. Cada worker tiene
+# su propio pool de conexiones y sus propias cachés en memoria.
+#
+# SIGTERM / Ctrl+C: deja de aceptar conexiones, termina las peticiones en
+# curso (hasta SERVIDOR_APAGADO seg.) y cierra las conexiones a la BD.
+
+SERVIDOR_HOST = os.getenv('SERVIDOR_HOST', '0.0.0.0')
+SERVIDOR_PUERTO = int(os.getenv('SERVIDOR_PUERTO', '5001'))
+SERVIDOR_MOTOR = os.getenv('SERVIDOR_MOTOR', 'auto').lower()                 # auto | gunicorn | waitress
+SERVIDOR_WORKERS = int(os.getenv('SERVIDOR_WORKERS', str(min(os.cpu_count() or 1, 4))))
+SERVIDOR_HILOS = int(os.getenv('SERVIDOR_HILOS', '8'))                       # hilos por worker
+SERVIDOR_KEEPALIVE = int(os.getenv('SERVIDOR_KEEPALIVE', '5'))               # seg. de conexión ociosa abierta
+SERVIDOR_TIMEOUT = int(os.getenv('SERVIDOR_TIMEOUT', '120'))                 # seg. de un worker colgado (gunicorn)
+SERVIDOR_APAGADO = int(os.getenv('SERVIDOR_APAGADO', '30'))                  # seg. para terminar lo que está en curso
+SERVIDOR_MAX_PETICIONES = int(os.getenv('SERVIDOR_MAX_PETICIONES', '0'))     # reciclar worker tras N peticiones (0 = nunca)
+SERVIDOR_BACKLOG = int(os.getenv('SERVIDOR_BACKLOG', '2048'))
+SERVIDOR_CONEXIONES = int(os.getenv('SERVIDOR_CONEXIONES', '1000'))          # conexiones abiertas por worker
+SERVIDOR_LOG_ACCESO = os.getenv('SERVIDOR_LOG_ACCESO', '0') == '1'
+
+
+def _cerrar_conexiones():
+    import database
+    database.cerrar_pools()
+
+
+# --------------------------------------------------------
+# gunicorn (Linux)
+
+def opciones_gunicorn():
+    return {
+        "bind": f"{SERVIDOR_HOST}:{SERVIDOR_PUERTO}",
+        "workers": SERVIDOR_WORKERS,
+        "threads": SERVIDOR_HILOS,
+        "worker_class": "gthread",
+        "worker_connections": SERVIDOR_CONEXIONES,
+        "keepalive": SERVIDOR_KEEPALIVE,
+        "timeout": SERVIDOR_TIMEOUT,
+        "graceful_timeout": SERVIDOR_APAGADO,
+        "max_requests": SERVIDOR_MAX_PETICIONES,
+        "max_requests_jitter": SERVIDOR_MAX_PETICIONES // 10,
+        "backlog": SERVIDOR_BACKLOG,
+        "preload_app": False,
+        "accesslog": "-" if SERVIDOR_LOG_ACCESO else None,
+        "proc_name": "sistema-mapas",
+    }
+
+
+def worker_exit(server, worker):
+    # Hook de gunicorn: el worker ya terminó sus peticiones
+    _cerrar_conexiones()
+
+
+# `gunicorn -c servidor.py app:app` lee la configuración de las variables de este módulo
+globals().update(opciones_gunicorn())
+
+
+def _servir_gunicorn():
+    from gunicorn.app.base import BaseApplication
+
+    class Aplicacion(BaseApplication):
+        def load_config(self):
+            for clave, valor in opciones_gunicorn().items():
+                self.cfg.set(clave, valor)
+            self.cfg.set("worker_exit", worker_exit)
+
+        def load(self):
+            from app import app
+            return app
+
+    print(
+        f"🚀 gunicorn en http://{SERVIDOR_HOST}:{SERVIDOR_PUERTO} "
+        f"({SERVIDOR_WORKERS} workers × {SERVIDOR_HILOS} hilos)"
+    )
+    Aplicacion().run()
+
+
+# --------------------------------------------------------
+# waitress (Windows)
+
+def _servir_waitress():
+    from waitress import create_server, wasyncore
+
+    from app import app
+
+    mapa = {}
+    servidor = create_server(
+        app,
+        map=mapa,
+        host=SERVIDOR_HOST,
+        port=SERVIDOR_PUERTO,
+        threads=SERVIDOR_HILOS,
+        channel_timeout=SERVIDOR_KEEPALIVE,
+        cleanup_interval=max(1, min(30, SERVIDOR_KEEPALIVE)),
+        connection_limit=SERVIDOR_CONEXIONES,
+        backlog=SERVIDOR_BACKLOG,
+        ident="sistema-mapas",
+    )
+
+    deteniendo = []
+
+    def detener(signum, frame):
+        if not deteniendo:
+            print(f"🛑 Señal {signum}: terminando peticiones en curso (máx. {SERVIDOR_APAGADO} s)")
+            deteniendo.append(time.monotonic() + SERVIDOR_APAGADO)
+
+    for nombre in ("SIGINT", "SIGTERM", "SIGBREAK"):
+        if hasattr(signal, nombre):
+            signal.signal(getattr(signal, nombre), detener)
+
+    print(f"🚀 waitress en http://{SERVIDOR_HOST}:{SERVIDOR_PUERTO} ({SERVIDOR_HILOS} hilos)")
+    espera = servidor.adj.asyncore_loop_timeout
+    while not deteniendo:
+        wasyncore.loop(timeout=espera, map=mapa, use_poll=servidor.adj.asyncore_use_poll, count=1)
+
+    # Deja de escuchar y espera a que se vacíen las conexiones con peticiones;
+    # las que están ociosas (keep-alive) se cierran en la siguiente vuelta.
+    servidor.accepting = False
+    servidor.del_channel()
+    servidor.socket.close()
+    while servidor.active_channels and time.monotonic() < deteniendo[0]:
+        for canal in list(servidor.active_channels.values()):
+            if not canal.requests:
+                canal.will_close = True
+        wasyncore.loop(timeout=0.2, map=mapa, use_poll=servidor.adj.asyncore_use_poll, count=1)
+
+    if servidor.active_channels:
+        print(f"⚠️ {len(servidor.active_channels)} conexiones seguían abiertas al apagar")
+    servidor.task_dispatcher.shutdown(cancel_pending=True, timeout=5)
+    servidor.trigger.close()
+    _cerrar_conexiones()
+    print("👋 Servidor detenido")
+
+
+def main():
+    motor = SERVIDOR_MOTOR
+    if motor == "auto":
+        motor = "waitress"
+        if os.name != "nt":
+            try:
+                import gunicorn  # noqa: F401
+                motor = "gunicorn"
+            except ImportError:
+                print("⚠️ gunicorn no está instalado: se usa waitress (un solo proceso)")
+
+    if motor == "gunicorn":
+        _servir_gunicorn()
+    elif motor == "waitress":
+        _servir_waitress()
+    else:
+        raise SystemExit(f"SERVIDOR_MOTOR inválido: '{SERVIDOR_MOTOR}' (auto, gunicorn o waitress)")
+
+
+if __name__ == "__main__":
+    main()
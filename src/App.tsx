@@ -15,6 +15,15 @@ import { createRoot } from "react-dom/client";
 // Detecta automáticamente la IP de tu MV (donde reside el frontend y backend)
 const baseUrl = window.location.hostname;
 
+// Misma normalización que nombres.normalizar() en el backend: "Breña " → "BRENA"
+const normalizarNombre = (texto: string | null | undefined) =>
+  (texto || "")
+    .normalize("NFKD")
+    .replace(/[\u0300-\u036f]/g, "")
+    .replace(/\s+/g, " ")
+    .trim()
+    .toUpperCase();
+
 // --- CONFIGURACIÓN DE MAPAS BASE ---
 const BASE_MAPS: BaseMap[] = [
   {
@@ -537,6 +546,7 @@ function App() {
   const [isSuggestionsOpen, setIsSuggestionsOpen] = useState(false);
   const [isBaseMapSelectorOpen, setBaseMapSelectorOpen] = useState(false);
   const [currentBaseMap, setCurrentBaseMap] = useState<BaseMap>(BASE_MAPS[0]);
+  const [baseMaps, setBaseMaps] = useState<BaseMap[]>(BASE_MAPS);
   const position: [number, number] = [-12.00, -77.02];
   const zoomLevel = 12;
 
@@ -933,6 +943,25 @@ const handleShowLegend = () => {
   }
 };
 
+// Mapas base locales (MBTiles servidos por el backend, funcionan sin internet)
+useEffect(() => {
+  fetch(`http://${baseUrl}:5001/tiles`)
+    .then(res => res.ok ? res.json() : [])
+    .then((capas: any[]) => {
+      const locales: BaseMap[] = capas.map(capa => ({
+        id: `local-${capa.name}`,
+        name: `${capa.name} (local)`,
+        url: capa.tiles[0],
+        attribution: capa.attribution || '',
+        thumbnail: capa.miniatura || '/osm-standard.png',
+      }));
+      if (locales.length > 0) {
+        setBaseMaps([...locales, ...BASE_MAPS]);
+      }
+    })
+    .catch(err => console.warn("Sin mapas base locales:", err));
+}, []);
+
 useEffect(() => {
   if (!diagnosticoSeleccionado || diagnosticoSeleccionado.length === 0) {
     // Limpiar datos si no hay diagnósticos seleccionados
@@ -1055,40 +1084,41 @@ const cargarCasosPorDiagnostico = async (diagnostico: string) => {
   const detalles: Record<string, { total: number; detalle: { tipo_dx: string; cantidad: number }[]; TIA_100k?: number | null }> = {};
   const esTBC = diagnostico.toUpperCase().includes("TBC");
 
-  for (const feature of allDistricts.features) {
-    const distrito = feature.properties.NM_DIST;
-    const url = `http://${baseUrl}:5001/api/casos_enfermedad?distrito=${distrito}&enfermedad=${diagnostico}`;
-
-    console.log(`🌐 Consultando backend para distrito: ${distrito}`);
+  // Una sola petición con los casos de todos los distritos
+  let datosDistritos: Record<string, { total: number; detalle: { tipo_dx: string; cantidad: number }[]; TIA_100k: number | null }> = {};
 
-    try {
-      const res = await fetch(url);
+  try {
+    const res = await fetch(
+      `http://${baseUrl}:5001/api/casos_enfermedad_distritos?enfermedad=${encodeURIComponent(diagnostico)}`
+    );
 
-      if (!res.ok) {
-        console.error(`❌ Error HTTP (${res.status}) en distrito ${distrito}`);
-        resultados[distrito.toUpperCase()] = { total: 0, TIA_100k: null };
-        detalles[distrito.toUpperCase()] = { total: 0, detalle: [] };
-        continue;
+    if (res.ok) {
+      // Las claves vienen con el nombre del mapa ("BREÑA"); se buscan normalizadas
+      const datos = await res.json();
+      for (const [nombre, valor] of Object.entries(datos)) {
+        datosDistritos[normalizarNombre(nombre)] = valor as typeof datosDistritos[string];
       }
+    } else {
+      console.error(`❌ Error HTTP (${res.status}) cargando distritos para ${diagnostico}`);
+    }
+  } catch (err) {
+    console.error(`❌ Error de conexión cargando distritos para ${diagnostico}`, err);
+  }
 
-      const data = await res.json();
-
-      resultados[distrito.toUpperCase()] = {
-        total: data.total || 0,
-        TIA_100k: esTBC ? (data.TIA_100k ?? null) : null
-      };
+  for (const feature of allDistricts.features) {
+    const distrito = feature.properties.NM_DIST.toUpperCase();
+    const data = datosDistritos[normalizarNombre(feature.properties.NM_DIST)];
 
-      detalles[distrito.toUpperCase()] = {
-        total: data.total || 0,
-        detalle: data.detalle || [],
-        TIA_100k: esTBC ? (data.TIA_100k ?? null) : null,
-      };
+    resultados[distrito] = {
+      total: data?.total || 0,
+      TIA_100k: esTBC ? (data?.TIA_100k ?? null) : null
+    };
 
-    } catch (err) {
-      console.error(`❌ Error de conexión en distrito ${distrito}`, err);
-      resultados[distrito.toUpperCase()] = { total: 0, TIA_100k: null };
-      detalles[distrito.toUpperCase()] = { total: 0, detalle: [], TIA_100k: null };
-    }
+    detalles[distrito] = {
+      total: data?.total || 0,
+      detalle: data?.detalle || [],
+      TIA_100k: esTBC ? (data?.TIA_100k ?? null) : null,
+    };
   }
 
   console.log("📊 Datos cargados para distritos");
@@ -1329,13 +1359,13 @@ const handleDiagnosticoSelect = async (diagnostico: string, checked: boolean) =>
 
       const data = await response.json();
       
-      // Asegurarnos de que todos los nombres estén en mayúsculas para consistencia
+      // Claves normalizadas (sin tildes, mayúsculas) para cruzarlas con el mapa
       const casosNormalizados: Record<string, number> = {};
       
       Object.keys(data).forEach(key => {
         if (key && key.trim() !== '') {
-          const nombreNormalizado = key.toUpperCase();
-          casosNormalizados[nombreNormalizado] = data[key] || 0;
+          const nombreNormalizado = normalizarNombre(key);
+          casosNormalizados[nombreNormalizado] = (casosNormalizados[nombreNormalizado] || 0) + (data[key] || 0);
         }
       });
 
@@ -2328,8 +2358,10 @@ const handleDiagnosticoSelect = async (diagnostico: string, checked: boolean) =>
       const min = valores.length ? Math.min(...valores) : 0;
       const max = valores.length ? Math.max(...valores) : 0;
 
+      // Igual que coropleta.py: sin casos → gris; un solo valor con casos → una sola clase
       const escalaDinamica = (valor: number) => {
-        if (max === min) return "#9a9a9aff";
+        if (valor <= 0) return "#9a9a9aff";
+        if (max === min) return "#2eff1bff";
         const p = (valor - min) / (max - min);
         if (p > 0.75) return "#f21a0aff";
         if (p > 0.5) return "#fa9b15ff";
@@ -2363,7 +2395,7 @@ const handleDiagnosticoSelect = async (diagnostico: string, checked: boolean) =>
     // ===============================
     // 🏥 ESTABLECIMIENTOS (CUANTILES)
     // ===============================
-    const valor = casosPorEstablecimiento[establecimiento] || 0;
+    const valor = casosPorEstablecimiento[normalizarNombre(establecimiento)] || 0;
 
     const isSearched = searchedDistrictId === establecimiento;
     const isClicked = clickedEstablecimientoId === establecimiento;
@@ -2476,7 +2508,7 @@ const handleDiagnosticoSelect = async (diagnostico: string, checked: boolean) =>
             tooltipContent = `${name}<br/><small>${diagNombre}: ${casos} casos</small>`;
           }
         } else if (geoJSONType === 'establecimientos') {
-          const casos = casosPorEstablecimiento[name.toUpperCase()] || 0;
+          const casos = casosPorEstablecimiento[normalizarNombre(name)] || 0;
           if (casos > 0) {
             tooltipContent = `${name}<br/><small>${diagNombre}: ${casos} casos</small>`;
           }
@@ -3619,7 +3651,7 @@ const handleDiagnosticoSelect = async (diagnostico: string, checked: boolean) =>
 
       {isBaseMapSelectorOpen && (
         <BaseMapSelector
-          baseMaps={BASE_MAPS}
+          baseMaps={baseMaps}
           onSelect={(baseMap) => {
             setCurrentBaseMap(baseMap);
             setBaseMapSelectorOpen(false);
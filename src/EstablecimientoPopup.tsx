@@ -109,7 +109,10 @@ const EstablecimientoPopup: React.FC<EstablecimientoProps> = ({
             diagnosticos: diagnosticoSeleccionado
         };
 
-        const response = await fetch("http://10.0.20.140:5001/exportar-datos-establecimiento", {
+        // La exportación se arma como trabajo en segundo plano: se consulta
+        // su avance y se descarga el archivo cuando está listo
+        const backend = "http://10.0.20.140:5001";
+        const response = await fetch(`${backend}/api/exportaciones`, {
             method: "POST",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify(payload)
@@ -122,18 +125,32 @@ const EstablecimientoPopup: React.FC<EstablecimientoProps> = ({
             return;
         }
 
-        const contentType = response.headers.get("Content-Type") || "";
-        if (!contentType.includes("application/vnd.openxmlformats-officedocument")) {
-            const text = await response.text();
-            console.error("❌ El backend devolvió HTML o un error:", text);
-            alert("Error en el formato de respuesta del servidor");
+        const trabajo = await response.json();
+        let estado = trabajo;
+
+        // Tope de espera: si el servidor no termina ni marca error, se deja de consultar
+        const limiteEspera = Date.now() + 30 * 60 * 1000;
+
+        while (estado.estado === "en_cola" || estado.estado === "procesando") {
+            if (Date.now() > limiteEspera) {
+                console.error("❌ [FRONT] La exportación no terminó a tiempo:", trabajo.id);
+                alert("La exportación está tardando demasiado. Intente nuevamente más tarde.");
+                return;
+            }
+            await new Promise((resolve) => setTimeout(resolve, 1500));
+            const respEstado = await fetch(`${backend}/api/exportaciones/${trabajo.id}`);
+            estado = await respEstado.json();
+            console.log(`⏳ [FRONT] Exportación: ${estado.hojas_listas}/${estado.hojas_total ?? "?"} hojas`);
+        }
+
+        if (estado.estado !== "terminado") {
+            console.error("❌ [FRONT] La exportación falló:", estado.error);
+            alert(`Error al generar el Excel: ${estado.error ?? "desconocido"}`);
             return;
         }
 
-        const blob = await response.blob();
-        const url = window.URL.createObjectURL(blob);
         const a = document.createElement("a");
-        a.href = url;
+        a.href = `${backend}${trabajo.url_archivo}`;
         a.download = `Datos_${establecimientoName.replace(/[^a-zA-Z0-9]/g, '_')}.xlsx`;
         a.click();
     } catch (error) {
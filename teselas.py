@@ -0,0 +1,187 @@
+import glob
+import hashlib
+import math
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import cache
+
+# ============================================================
+# 🧱 TESELAS XYZ DESDE ARCHIVOS MBTILES LOCALES
+# ============================================================
+# Cada archivo MBTILES_DIR/<nombre>.mbtiles es un mapa base que se sirve
+# en /tiles/<nombre>/{z}/{x}/{y}.<formato> sin salir a internet.
+#   - conexiones SQLite de solo lectura en un pool por archivo
+#   - las teselas más pedidas quedan en memoria (LRU)
+#   - ETag por tesela; con ?v=<versión> la respuesta es inmutable
+# Los archivos se abren como inmutables: si se reemplaza un .mbtiles hay
+# que reiniciar el servicio (la versión cambia y los navegadores lo notan).
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MBTILES_DIR = os.getenv('MBTILES_DIR', os.path.join(BASE_DIR, "tiles"))
+MBTILES_CONEXIONES = int(os.getenv('MBTILES_CONEXIONES', '4'))          # conexiones por archivo
+MBTILES_CACHE_TESELAS = int(os.getenv('MBTILES_CACHE_TESELAS', '5000'))   # teselas en memoria (todas las capas)
+MBTILES_CACHE_BYTES = int(os.getenv('MBTILES_CACHE_BYTES', str(32 * 1024 * 1024)))  # tope por proceso (worker)
+MAX_ZOOM = 30
+MBTILES_CACHE_TTL = float(os.getenv('MBTILES_CACHE_TTL', '86400'))
+
+TIPOS = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "pbf": "application/x-protobuf",
+}
+
+_teselas = cache.CacheTTL(
+    max_entradas=MBTILES_CACHE_TESELAS,
+    max_bytes=MBTILES_CACHE_BYTES,
+    tamano=lambda datos: len(datos) if datos else 0,
+)
+_lock = threading.Lock()
+_capas = {}
+
+
+class Mbtiles:
+    def __init__(self, nombre, ruta, conexiones=MBTILES_CONEXIONES):
+        self.nombre = nombre
+        self.ruta = ruta
+        self._libres = queue.LifoQueue()
+        self._abiertas = 0
+        self._maximo = conexiones
+        self._lock = threading.Lock()
+
+        estado = os.stat(ruta)
+        self.version = hashlib.sha256(
+            f"{nombre}:{estado.st_size}:{estado.st_mtime_ns}".encode()
+        ).hexdigest()[:12]
+
+        with self.conexion() as conn:
+            self.metadatos = dict(conn.execute("SELECT name, value FROM metadata").fetchall())
+        self.formato = self.metadatos.get("format", "png").lower()
+
+    def _abrir(self):
+        uri = "file:" + self.ruta.replace("\\", "/") + "?mode=ro&immutable=1"
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    @contextmanager
+    def conexion(self):
+        try:
+            conn = self._libres.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                abrir = self._abiertas < self._maximo
+                if abrir:
+                    self._abiertas += 1
+            if abrir:
+                try:
+                    conn = self._abrir()
+                except Exception:
+                    with self._lock:
+                        self._abiertas -= 1
+                    raise
+            else:
+                conn = self._libres.get()
+
+        try:
+            yield conn
+        finally:
+            self._libres.put(conn)
+
+    def tesela(self, z, x, y):
+        """Bytes de la tesela XYZ o None (MBTiles guarda las filas en esquema TMS)."""
+        fila_tms = (1 << z) - 1 - y
+        with self.conexion() as conn:
+            fila = conn.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (z, x, fila_tms),
+            ).fetchone()
+        return bytes(fila[0]) if fila else None
+
+    def tilejson(self, url_base):
+        """TileJSON 2.2 con la URL versionada (cacheable como inmutable)."""
+        datos = {
+            "tilejson": "2.2.0",
+            "name": self.metadatos.get("name", self.nombre),
+            "attribution": self.metadatos.get("attribution", ""),
+            "format": self.formato,
+            "version": self.version,
+            "tiles": [f"{url_base}/tiles/{self.nombre}/{{z}}/{{x}}/{{y}}.{self.formato}?v={self.version}"],
+        }
+        for clave in ("minzoom", "maxzoom"):
+            if clave in self.metadatos:
+                datos[clave] = int(self.metadatos[clave])
+        for clave in ("bounds", "center"):
+            if clave in self.metadatos:
+                datos[clave] = [float(v) for v in self.metadatos[clave].split(",")]
+
+        centro = datos.get("center")
+        if centro and len(centro) == 3:
+            z = int(centro[2])
+            x, y = xyz(centro[0], centro[1], z)
+            datos["miniatura"] = f"{url_base}/tiles/{self.nombre}/{z}/{x}/{y}.{self.formato}?v={self.version}"
+        return datos
+
+
+def xyz(lon, lat, z):
+    n = 1 << z
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def capas():
+    """{nombre: Mbtiles} de los archivos presentes (se abren la primera vez)."""
+    with _lock:
+        for ruta in glob.glob(os.path.join(MBTILES_DIR, "*.mbtiles")):
+            nombre = os.path.splitext(os.path.basename(ruta))[0]
+            if nombre in _capas:
+                continue
+            try:
+                _capas[nombre] = Mbtiles(nombre, ruta)
+                print(f"🧱 MBTiles {nombre}: {_capas[nombre].formato}")
+            except Exception as e:
+                print(f"❌ No se pudo abrir {ruta}: {e}")
+        return dict(_capas)
+
+
+def capa(nombre):
+    # Solo se revisa el directorio si la capa todavía no está abierta
+    return _capas.get(nombre) or capas().get(nombre)
+
+
+def coordenadas_validas(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+
+def mismo_formato(extension, formato):
+    """La extensión pedida en la URL corresponde al formato del archivo (jpg = jpeg)."""
+    extension = extension.lower()
+    return extension == formato or TIPOS.get(extension, extension) == TIPOS.get(formato, formato)
+
+
+def obtener(nombre, z, x, y):
+    """(capa, bytes o None). Las teselas leídas quedan en la caché en memoria."""
+    mbtiles = capa(nombre)
+    if mbtiles is None:
+        return None, None
+    if not coordenadas_validas(z, x, y):
+        return mbtiles, None
+
+    clave = (nombre, mbtiles.version, z, x, y)
+    encontrado, datos = _teselas.obtener(clave)
+    if not encontrado:
+        datos = mbtiles.tesela(z, x, y)
+        _teselas.guardar(clave, datos, MBTILES_CACHE_TTL)
+    return mbtiles, datos
+
+
+def estado():
+    return {
+        "directorio": MBTILES_DIR,
+        "capas": {n: {"formato": c.formato, "version": c.version} for n, c in capas().items()},
+        "cache": _teselas.estado(),
+    }
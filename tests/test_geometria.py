@@ -0,0 +1,251 @@
+import math
+
+import numpy as np
+import pytest
+
+import crosswalk
+import espacial
+import geodatos
+import hexagonos
+import hotspots
+import topologia
+
+# ============================================================
+# 🧪 CÁLCULOS GEOMÉTRICOS Y ESTADÍSTICOS (SIN BASE DE DATOS)
+# ============================================================
+# Sobre las capas de public/ y datos sintéticos: topología por arcos,
+# ubicación de puntos, cruce por líneas de barrido, rejilla hexagonal y
+# estadísticas de puntos calientes contra sus fórmulas directas.
+
+CAPAS = [espacial.DISTRITOS, espacial.EESS]
+
+
+def _cuadrado(x0, y0, lado=1.0):
+    return {"type": "Polygon", "coordinates": [[
+        [x0, y0], [x0 + lado, y0], [x0 + lado, y0 + lado], [x0, y0 + lado], [x0, y0],
+    ]]}
+
+
+# --------------------------------------------------------
+# Topología
+
+def test_borde_compartido_se_guarda_una_vez():
+    topo = topologia.Topologia([_cuadrado(0, 0), _cuadrado(1, 0)])
+
+    # El lado x = 1 es el único arco usado por las dos geometrías
+    usos = {}
+    for i, geometria in enumerate(topo.geometrias):
+        for refs in geometria["poligonos"][0]:
+            for ref in refs:
+                usos.setdefault(ref if ref >= 0 else ~ref, set()).add(i)
+    compartidos = [a for a, features in usos.items() if features == {0, 1}]
+    assert len(compartidos) == 1
+    assert {p[0] for p in topo.arcos[compartidos[0]]} == {1.0}
+
+    assert topologia.vecinos(topo) == [{1}, {0}]
+
+
+@pytest.mark.parametrize("capa", [geodatos.DISTRITOS, geodatos.EESS], ids=lambda c: c.nombre)
+def test_reconstruccion_desde_arcos(capa):
+    for i, feature in enumerate(capa.features):
+        originales = [
+            set(topologia._anillo_abierto(anillo))
+            for poligono in topologia._poligonos(feature["geometria"])
+            for anillo in poligono
+            if len(topologia._anillo_abierto(anillo)) >= 3
+        ]
+        geometria = capa.topologia.geometria(i)
+        poligonos = [geometria["coordinates"]] if geometria["type"] == "Polygon" else geometria["coordinates"]
+        reconstruidos = [{tuple(p) for p in anillo} for poligono in poligonos for anillo in poligono]
+        assert reconstruidos == originales
+
+
+def test_vecinos_simetricos():
+    vecinos = topologia.vecinos(geodatos.DISTRITOS.topologia)
+    for i, conjunto in enumerate(vecinos):
+        assert i not in conjunto
+        for j in conjunto:
+            assert i in vecinos[j]
+
+
+def test_simplificar_conserva_extremos():
+    puntos = [(x / 10, math.sin(x / 3) * 0.01) for x in range(60)]
+    simplificado = topologia.simplificar_arco(puntos, 0.005)
+    assert simplificado[0] == puntos[0] and simplificado[-1] == puntos[-1]
+    assert len(simplificado) < len(puntos)
+    # Ningún punto original queda más lejos que la tolerancia del resultado
+    for p in puntos:
+        assert min(
+            topologia._distancia_segmento(p, a, b) for a, b in zip(simplificado, simplificado[1:])
+        ) <= 0.005 + 1e-12
+
+    cerrado = [(0, 0), (1, 0), (2, 0), (2, 1), (1, 1), (0, 1), (0, 0)]
+    resultado = topologia.simplificar_arco(cerrado, 0.1)
+    assert resultado[0] == resultado[-1] == (0, 0)
+    assert set(resultado) == {(0, 0), (2, 0), (2, 1), (0, 1)}
+
+
+# --------------------------------------------------------
+# Ubicación de puntos
+
+@pytest.mark.parametrize("indice", CAPAS, ids=lambda i: i.capa.nombre)
+def test_lote_coincide_con_busqueda_individual(indice):
+    rng = np.random.default_rng(7)
+    x0, y0, x1, y1 = indice.bbox
+    lons = rng.uniform(x0, x1, 20000)
+    lats = rng.uniform(y0, y1, 20000)
+
+    lote = indice.buscar_lote(lons, lats)
+    individual = [indice.buscar(lon, lat) for lon, lat in zip(lons, lats)]
+    assert [None if i < 0 else int(i) for i in lote] == individual
+    assert (lote >= 0).any()
+
+
+def test_par_impar_respeta_huecos():
+    poligono = espacial._Poligono(0, [
+        [(0, 0), (4, 0), (4, 4), (0, 4)],
+        [(1, 1), (3, 1), (3, 3), (1, 3)],
+    ])
+    assert poligono.contiene(0.5, 0.5)
+    assert not poligono.contiene(2, 2)
+    assert list(poligono.contiene_lote(np.array([0.5, 2.0, 5.0]), np.array([0.5, 2.0, 2.0]))) == [True, False, False]
+
+
+# --------------------------------------------------------
+# Cruce distrito ↔ EESS
+
+def test_area_por_barrido():
+    def identidad(x, y):
+        return x, y
+
+    cuadrado = crosswalk._Barrido([[(0, 0), (100, 0), (100, 100), (0, 100)]], identidad, 0.0, 1.0)
+    triangulo = crosswalk._Barrido([[(0, 0), (100, 0), (0, 100)]], identidad, 0.0, 1.0)
+    assert cuadrado.area == pytest.approx(10000, rel=1e-9)
+    assert triangulo.area == pytest.approx(5000, rel=1e-9)
+    assert cuadrado.interseccion(triangulo, 1.0) == pytest.approx(5000, rel=1e-9)
+
+
+@pytest.fixture(scope="module")
+def cruce():
+    return crosswalk.calcular(paso=25)
+
+
+def test_fracciones_eess_suman_uno(cruce):
+    suma = {}
+    for fila in cruce["intersecciones"]:
+        suma[fila["establecimiento"]] = suma.get(fila["establecimiento"], 0) + fila["fraccion_establecimiento"]
+
+    # Alguna jurisdicción asoma fuera de la capa de distritos: nunca pasa de 1
+    # y casi todas quedan cubiertas completas
+    assert suma
+    for establecimiento, total in suma.items():
+        assert total <= 1 + 1e-3, establecimiento
+    cubiertas = [total for total in suma.values() if total == pytest.approx(1, abs=0.02)]
+    assert len(cubiertas) >= 0.9 * len(suma)
+
+
+def test_intersecciones_no_superan_areas(cruce):
+    areas = cruce["areas_m2"]
+    for fila in cruce["intersecciones"]:
+        assert fila["area_m2"] <= areas["distrito"][fila["distrito"]] + 1
+        assert fila["area_m2"] <= areas["establecimiento"][fila["establecimiento"]] + 1
+
+
+# --------------------------------------------------------
+# Rejilla hexagonal
+
+@pytest.mark.parametrize("radio", hexagonos.HEX_RESOLUCIONES)
+def test_hexagono_es_el_centro_mas_cercano(radio):
+    rng = np.random.default_rng(11)
+    lons = hexagonos.ORIGEN[0] + rng.uniform(-0.2, 0.2, 5000)
+    lats = hexagonos.ORIGEN[1] + rng.uniform(-0.2, 0.2, 5000)
+    q, r = hexagonos.celdas(lons, lats, radio)
+
+    x, y = hexagonos._a_metros(lons, lats)
+    for i in range(len(lons)):
+        candidatos = [(q[i] + dq, r[i] + dr) for dq in (-1, 0, 1) for dr in (-1, 0, 1)]
+        distancias = [
+            math.hypot(x[i] - radio * math.sqrt(3) * (cq + cr / 2), y[i] - radio * 1.5 * cr)
+            for cq, cr in candidatos
+        ]
+        assert distancias[4] <= min(distancias) + 1e-6
+
+
+# --------------------------------------------------------
+# Puntos calientes
+
+def _pesos_sinteticos(n, pares):
+    w = hotspots._SubPesos()
+    w.n = n
+    w.filas = np.array([i for a, b in pares for i in (a, b)], dtype=np.int64)
+    w.columnas = np.array([j for a, b in pares for j in (b, a)], dtype=np.int64)
+    w.vecinos = np.bincount(w.filas, minlength=n)
+    return w
+
+
+PARES = [(0, 1), (1, 2), (2, 3), (3, 4), (4, 0), (1, 5), (5, 6), (6, 7), (2, 6)]
+VALORES = np.array([3.0, 8.0, 1.0, 4.0, 9.0, 2.0, 7.0, 5.0, 0.0])
+
+
+def _matriz(w):
+    denso = np.zeros((w.n, w.n))
+    denso[w.filas, w.columnas] = 1
+    return denso
+
+
+def test_getis_ord_contra_formula():
+    w = _pesos_sinteticos(len(VALORES), PARES)
+    x, n = VALORES, len(VALORES)
+    denso = _matriz(w) + np.eye(n)
+    media, s = x.mean(), math.sqrt((x ** 2).mean() - x.mean() ** 2)
+
+    esperado = [
+        (denso[i] @ x - media * denso[i].sum())
+        / (s * math.sqrt((n * (denso[i] ** 2).sum() - denso[i].sum() ** 2) / (n - 1)))
+        for i in range(n)
+    ]
+    assert hotspots.getis_ord(w, x) == pytest.approx(esperado)
+
+
+def test_moran_local_contra_formula():
+    w = _pesos_sinteticos(len(VALORES), PARES)
+    x, n = VALORES, len(VALORES)
+    denso = _matriz(w)
+    k = denso.sum(axis=1)
+    estandarizado = np.divide(denso, k[:, None], out=np.zeros_like(denso), where=k[:, None] > 0)
+
+    z = x - x.mean()
+    m2, m4 = (z ** 2).mean(), (z ** 4).mean()
+    b2 = m4 / m2 ** 2
+
+    I, z_I, rezago = hotspots.moran_local(w, x)
+    assert rezago == pytest.approx(estandarizado @ z)
+
+    for i in range(n):
+        if k[i] == 0:
+            assert math.isnan(I[i]) and math.isnan(z_I[i])
+            continue
+        fila = estandarizado[i]
+        wi, wi2 = fila.sum(), (fila ** 2).sum()
+        wikh = wi ** 2 - wi2
+        esperado = -wi / (n - 1)
+        varianza = wi2 * (n - b2) / (n - 1) + wikh * (2 * b2 - n) / ((n - 1) * (n - 2)) - esperado ** 2
+
+        assert I[i] == pytest.approx(z[i] / m2 * (fila @ z))
+        assert z_I[i] == pytest.approx((I[i] - esperado) / math.sqrt(varianza))
+
+
+def test_subpesos_reindexa():
+    w = _pesos_sinteticos(len(VALORES), PARES)
+    mascara = np.ones(len(VALORES), dtype=bool)
+    mascara[[2, 8]] = False
+    sub = hotspots._subpesos(w, mascara)
+
+    restantes = np.flatnonzero(mascara)
+    esperados = {
+        tuple(sorted((int(np.searchsorted(restantes, a)), int(np.searchsorted(restantes, b)))))
+        for a, b in PARES if mascara[a] and mascara[b]
+    }
+    obtenidos = {(int(i), int(j)) for i, j in zip(sub.filas, sub.columnas) if i < j}
+    assert sub.n == 7
+    assert obtenidos == esperados
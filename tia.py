@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+
+import nombres
+from database import conexion
+
+# ============================================================
+# 🫁 SNAPSHOT EN MEMORIA DE LAS TABLAS TIA (TUBERCULOSIS)
+# ============================================================
+# TIA_TOTAL y TB_TIA_EESS_MINSA son tablas chicas que cambian poco: se
+# cargan completas, se agrupan por distrito normalizado y se refrescan
+# cada TIA_REFRESCO segundos en segundo plano. Si un refresco falla se
+# sigue sirviendo la última copia buena. Los conteos de las entradas
+# "TBC TIA" del catálogo (mapa, coropleta, endpoint masivo) salen de aquí.
+
+TIA_REFRESCO = float(os.getenv('TIA_REFRESCO', '600'))
+
+# nivel → columna de la fila (mismas columnas que usa el catálogo)
+CAMPOS_NIVEL = {"distrito": "Distrito", "establecimiento": "Distrito_EESS"}
+
+# Tasa de una entidad con varias filas: casos y población sumados, no el
+# máximo de las tasas de cada fila. La misma fórmula en SQL (catálogo) y aquí.
+TASA_SQL = "ROUND(SUM(casos) * 100000.0 / NULLIF(SUM(poblacion_total), 0), 2)"
+
+
+def tasa(casos, poblacion):
+    """TIA por 100 000 habitantes, o None sin población."""
+    if not poblacion:
+        return None
+    return round(casos * 100000 / poblacion, 2)
+
+
+class SnapshotTIA:
+    def __init__(self, tabla, base_datos="EPI_BD_TUBERCULOSIS"):
+        self.tabla = tabla
+        self.base_datos = base_datos
+        self._filas = None
+        self._indice = {}
+        self._agrupado = {}
+        self._nombres = {}
+        self._cargado = None
+        self._lock = threading.Lock()
+        self._lock_carga = threading.Lock()
+
+    def _leer(self):
+        with conexion(self.base_datos) as conn:
+            if conn is None:
+                raise ConnectionError("Error en la conexión TB")
+
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT * FROM {self.tabla}")
+            rows = cursor.fetchall()
+            cursor.close()
+
+        return [
+            {
+                "Distrito_EESS": r[0],
+                "casos": r[1],
+                "poblacion_total": r[2],
+                "TIA_100k": float(r[3]) if r[3] is not None else None,
+                "Distrito": r[4]
+            }
+            for r in rows
+        ]
+
+    def refrescar(self):
+        filas = self._leer()
+
+        # Igual que el GROUP BY del catálogo: casos y población sumados por entidad
+        agrupado = {}
+        nombres_nivel = {}
+        for nivel, campo in CAMPOS_NIVEL.items():
+            sumas = {}
+            grafias = nombres_nivel[nivel] = {}
+            for fila in filas:
+                if not fila[campo]:
+                    continue
+                entidad = nombres.normalizar(fila[campo])
+                casos, poblacion = sumas.get(entidad, (0, 0))
+                sumas[entidad] = (casos + (fila["casos"] or 0), poblacion + (fila["poblacion_total"] or 0))
+                grafias.setdefault(entidad, fila[campo])
+            agrupado[nivel] = sumas
+
+        # buscar() devuelve el distrito agrupado: el mismo número que el mapa
+        indice = {
+            entidad: {
+                "Distrito": nombres_nivel["distrito"][entidad],
+                "casos": casos,
+                "poblacion_total": poblacion,
+                "TIA_100k": tasa(casos, poblacion),
+            }
+            for entidad, (casos, poblacion) in agrupado["distrito"].items()
+        }
+        for nivel, sumas in agrupado.items():
+            agrupado[nivel] = {
+                entidad: (casos, tasa(casos, poblacion))
+                for entidad, (casos, poblacion) in sumas.items()
+            }
+
+        with self._lock:
+            self._filas = filas
+            self._indice = indice
+            self._agrupado = agrupado
+            self._nombres = nombres_nivel
+            self._cargado = time.time()
+
+    def _asegurar(self):
+        if self._filas is not None:
+            return
+        # Primera carga: los pedidos simultáneos esperan a una sola lectura
+        with self._lock_carga:
+            if self._filas is None:
+                self.refrescar()
+
+    def filas(self):
+        self._asegurar()
+        return self._filas
+
+    def buscar(self, distrito):
+        """Casos, población y TIA agrupados del distrito (O(1)) o None."""
+        self._asegurar()
+        return self._indice.get(nombres.normalizar(distrito))
+
+    def agrupado(self, nivel):
+        """{ENTIDAD normalizada: (casos, TIA_100k)} por distrito o establecimiento."""
+        self._asegurar()
+        return self._agrupado[nivel]
+
+    def grafias(self, nivel):
+        """{ENTIDAD normalizada: grafía guardada en la tabla}."""
+        self._asegurar()
+        return self._nombres[nivel]
+
+    def estado(self):
+        return {
+            "tabla": self.tabla,
+            "filas": len(self._filas) if self._filas is not None else None,
+            "distritos": len(self._indice),
+            "cargado": self._cargado,
+        }
+
+
+TIA_TOTAL = SnapshotTIA("TIA_TOTAL")
+TIA_EESS = SnapshotTIA("TB_TIA_EESS_MINSA")
+SNAPSHOTS = {s.tabla: s for s in (TIA_TOTAL, TIA_EESS)}
+
+
+def _bucle_refresco():
+    while True:
+        time.sleep(TIA_REFRESCO)
+        for snapshot in (TIA_TOTAL, TIA_EESS):
+            try:
+                snapshot.refrescar()
+            except Exception as e:
+                print(f"❌ Error refrescando {snapshot.tabla}: {e}")
+
+
+threading.Thread(target=_bucle_refresco, name="refresco_tia", daemon=True).start()
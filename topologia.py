@@ -0,0 +1,294 @@
+import math
+
+# ============================================================
+# 🧩 TOPOLOGÍA DE POLÍGONOS (ARCOS COMPARTIDOS)
+# ============================================================
+# Los distritos y jurisdicciones vecinas guardan su borde común dos veces.
+# Aquí cada anillo se corta en sus uniones (puntos donde cambia el vecino)
+# y cada tramo se guarda una sola vez como "arco". Las geometrías quedan
+# como listas de índices de arco (~i = arco i recorrido al revés).
+#
+# Simplificar arcos en lugar de anillos mantiene la topología: el borde
+# entre dos distritos se simplifica una vez y ambos lo comparten, así no
+# aparecen huecos ni solapes entre vecinos.
+
+DECIMALES_BASE = 7
+
+
+def _punto(coordenada):
+    return (round(coordenada[0], DECIMALES_BASE), round(coordenada[1], DECIMALES_BASE))
+
+
+def _poligonos(geometria):
+    if not geometria:
+        return []
+    if geometria["type"] == "Polygon":
+        return [geometria["coordinates"]]
+    if geometria["type"] == "MultiPolygon":
+        return geometria["coordinates"]
+    raise ValueError(f"Geometría no soportada: {geometria['type']}")
+
+
+def _anillo_abierto(anillo):
+    """Puntos del anillo sin el cierre y sin repetidos consecutivos."""
+    puntos = []
+    for coordenada in anillo:
+        p = _punto(coordenada)
+        if not puntos or puntos[-1] != p:
+            puntos.append(p)
+    if len(puntos) > 1 and puntos[0] == puntos[-1]:
+        puntos.pop()
+    return puntos
+
+
+def _uniones(anillos):
+    """Puntos donde el anillo deja de compartir borde con el mismo vecino."""
+    vecinos = {}
+    uniones = set()
+
+    for puntos in anillos:
+        n = len(puntos)
+        for i, p in enumerate(puntos):
+            anterior, siguiente = puntos[i - 1], puntos[(i + 1) % n]
+            visto = vecinos.get(p)
+            if visto is None:
+                vecinos[p] = (anterior, siguiente)
+            elif visto != (anterior, siguiente) and visto != (siguiente, anterior):
+                uniones.add(p)
+
+    return uniones
+
+
+def _rotar_minimo(puntos):
+    i = puntos.index(min(puntos))
+    return puntos[i:] + puntos[:i]
+
+
+class Topologia:
+    def __init__(self, geometrias):
+        self.arcos = []             # [[(x, y), ...]]
+        self.geometrias = []        # por feature: {"type", "poligonos": [[[refs de arco]]]}
+        self._indice = {}
+
+        anillos = [
+            [_anillo_abierto(anillo) for anillo in poligono]
+            for geometria in geometrias
+            for poligono in _poligonos(geometria)
+        ]
+        uniones = _uniones([a for poligono in anillos for a in poligono if len(a) >= 3])
+
+        for geometria in geometrias:
+            poligonos = []
+            for poligono in _poligonos(geometria):
+                refs_poligono = []
+                for anillo in poligono:
+                    puntos = _anillo_abierto(anillo)
+                    if len(puntos) >= 3:
+                        refs_poligono.append(self._cortar(puntos, uniones))
+                if refs_poligono:
+                    poligonos.append(refs_poligono)
+            self.geometrias.append({"type": geometria["type"] if geometria else None, "poligonos": poligonos})
+
+    def _registrar(self, arco):
+        clave = tuple(arco)
+        if clave in self._indice:
+            return self._indice[clave]
+        invertida = tuple(reversed(arco))
+        if invertida in self._indice:
+            return ~self._indice[invertida]
+
+        self.arcos.append(arco)
+        self._indice[clave] = len(self.arcos) - 1
+        return len(self.arcos) - 1
+
+    def _cortar(self, puntos, uniones):
+        cortes = [i for i, p in enumerate(puntos) if p in uniones]
+
+        if not cortes:
+            # Anillo aislado o compartido completo: se guarda entero con un
+            # inicio canónico para que el vecino lo encuentre (en cualquier sentido)
+            directo = _rotar_minimo(puntos)
+            inverso = _rotar_minimo(list(reversed(puntos)))
+            directo.append(directo[0])
+            inverso.append(inverso[0])
+            if tuple(inverso) in self._indice:
+                return [~self._indice[tuple(inverso)]]
+            return [self._registrar(directo)]
+
+        inicio = cortes[0]
+        rotado = puntos[inicio:] + puntos[:inicio]
+        cortes = [i - inicio for i in cortes] + [len(puntos)]
+        rotado.append(rotado[0])
+
+        return [self._registrar(rotado[a:b + 1]) for a, b in zip(cortes, cortes[1:])]
+
+    # --------------------------------------------------------
+    # Reconstrucción
+
+    def anillo(self, refs, arcos=None):
+        arcos = arcos if arcos is not None else self.arcos
+        puntos = []
+        for ref in refs:
+            arco = arcos[ref] if ref >= 0 else list(reversed(arcos[~ref]))
+            puntos.extend(arco if not puntos else arco[1:])
+        return puntos
+
+    def geometria(self, indice, arcos=None, originales=None):
+        """
+        GeoJSON de la feature con los arcos dados. Si un anillo queda
+        degenerado (< 4 puntos) se usa el de `originales`.
+        """
+        datos = self.geometrias[indice]
+        poligonos = []
+        for poligono in datos["poligonos"]:
+            anillos = []
+            for refs in poligono:
+                puntos = self.anillo(refs, arcos)
+                if len(set(puntos)) < 3 and originales is not None:
+                    puntos = self.anillo(refs, originales)
+                anillos.append([list(p) for p in puntos])
+            poligonos.append(anillos)
+
+        if datos["type"] == "Polygon":
+            return {"type": "Polygon", "coordinates": poligonos[0] if poligonos else []}
+        return {"type": "MultiPolygon", "coordinates": poligonos}
+
+
+# ============================================================
+# ✂️ SIMPLIFICACIÓN (DOUGLAS-PEUCKER POR ARCO) Y CUANTIZACIÓN
+# ============================================================
+
+def _distancia_segmento(p, a, b):
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    if dx == 0 and dy == 0:
+        return math.hypot(p[0] - a[0], p[1] - a[1])
+    t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(p[0] - (a[0] + t * dx), p[1] - (a[1] + t * dy))
+
+
+def _douglas_peucker(puntos, tolerancia):
+    conservar = [False] * len(puntos)
+    conservar[0] = conservar[-1] = True
+    pendientes = [(0, len(puntos) - 1)]
+
+    while pendientes:
+        a, b = pendientes.pop()
+        maxima, indice = 0.0, None
+        for i in range(a + 1, b):
+            d = _distancia_segmento(puntos[i], puntos[a], puntos[b])
+            if d > maxima:
+                maxima, indice = d, i
+        if indice is not None and maxima > tolerancia:
+            conservar[indice] = True
+            pendientes.append((a, indice))
+            pendientes.append((indice, b))
+
+    return [p for p, c in zip(puntos, conservar) if c]
+
+
+def simplificar_arco(puntos, tolerancia):
+    """Simplifica el arco sin mover sus extremos (las uniones con los vecinos)."""
+    if len(puntos) <= 2 or tolerancia <= 0:
+        return list(puntos)
+
+    if puntos[0] == puntos[-1]:
+        # Arco cerrado: se parte en el punto más lejano al inicio
+        lejano = max(range(len(puntos)), key=lambda i: math.hypot(
+            puntos[i][0] - puntos[0][0], puntos[i][1] - puntos[0][1]))
+        primera = _douglas_peucker(puntos[:lejano + 1], tolerancia)
+        segunda = _douglas_peucker(puntos[lejano:], tolerancia)
+        return primera + segunda[1:]
+
+    return _douglas_peucker(puntos, tolerancia)
+
+
+def cuantizar_arco(puntos, decimales):
+    """Redondea a `decimales` y quita los puntos repetidos que resulten."""
+    salida = []
+    for x, y in puntos:
+        p = (round(x, decimales), round(y, decimales))
+        if not salida or salida[-1] != p:
+            salida.append(p)
+    if len(salida) == 1:
+        salida.append(salida[0])
+    return salida
+
+
+# ============================================================
+# 🔗 VECINOS Y SALIDA TOPOJSON
+# ============================================================
+
+def _indices_arco(ref):
+    return ref if ref >= 0 else ~ref
+
+
+class _Cuantizador:
+    def __init__(self, arcos, cuantizacion):
+        xs = [x for arco in arcos for x, _ in arco]
+        ys = [y for arco in arcos for _, y in arco]
+        self.x0, self.y0 = min(xs), min(ys)
+        self.x1, self.y1 = max(xs), max(ys)
+        self.kx = (cuantizacion - 1) / (self.x1 - self.x0) if self.x1 > self.x0 else 1
+        self.ky = (cuantizacion - 1) / (self.y1 - self.y0) if self.y1 > self.y0 else 1
+
+    def arco(self, puntos):
+        """Arco cuantizado y codificado en deltas (el primer punto es absoluto)."""
+        salida, anterior = [], None
+        for x, y in puntos:
+            p = (round((x - self.x0) * self.kx), round((y - self.y0) * self.ky))
+            if p == anterior:
+                continue
+            if anterior is None:
+                salida.append(list(p))
+            else:
+                salida.append([p[0] - anterior[0], p[1] - anterior[1]])
+            anterior = p
+        if len(salida) == 1:
+            salida.append([0, 0])
+        return salida
+
+    def transform(self):
+        return {"scale": [1 / self.kx, 1 / self.ky], "translate": [self.x0, self.y0]}
+
+
+def vecinos(topo):
+    """Por feature, el conjunto de features con las que comparte algún arco."""
+    usos = {}
+    for i, geometria in enumerate(topo.geometrias):
+        for poligono in geometria["poligonos"]:
+            for refs in poligono:
+                for ref in refs:
+                    usos.setdefault(_indices_arco(ref), set()).add(i)
+
+    resultado = [set() for _ in topo.geometrias]
+    for features in usos.values():
+        for i in features:
+            resultado[i] |= features - {i}
+    return resultado
+
+
+def topojson(topo, nombre_objeto, propiedades, cuantizacion=100000):
+    """
+    Topology (TopoJSON 1.0) con un GeometryCollection `nombre_objeto`.
+    `propiedades` va alineado con las geometrías.
+    """
+    cuantizador = _Cuantizador(topo.arcos, cuantizacion)
+
+    geometrias = []
+    for datos, props in zip(topo.geometrias, propiedades):
+        if datos["type"] == "Polygon":
+            geometria = {"type": "Polygon", "arcs": datos["poligonos"][0] if datos["poligonos"] else []}
+        elif datos["type"] is None:
+            geometria = {"type": None}
+        else:
+            geometria = {"type": "MultiPolygon", "arcs": datos["poligonos"]}
+        geometria["properties"] = props
+        geometrias.append(geometria)
+
+    return {
+        "type": "Topology",
+        "bbox": [cuantizador.x0, cuantizador.y0, cuantizador.x1, cuantizador.y1],
+        "transform": cuantizador.transform(),
+        "objects": {nombre_objeto: {"type": "GeometryCollection", "geometries": geometrias}},
+        "arcs": [cuantizador.arco(arco) for arco in topo.arcos],
+    }
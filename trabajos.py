@@ -0,0 +1,266 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import exportacion
+
+# ============================================================
+# 🗂️ TRABAJOS DE EXPORTACIÓN EN SEGUNDO PLANO
+# ============================================================
+# POST crea el trabajo y responde al instante con su id; el libro se arma
+# en un executor con pocos hilos (las exportaciones no compiten con los
+# endpoints del mapa) y queda en disco hasta que vence su retención.
+#
+# El estado de cada trabajo también se guarda en JOBS_DIR/<id>.json: con
+# varios procesos (servidor.py) la consulta de estado o la descarga puede
+# llegar a un worker distinto del que creó el trabajo.
+#
+# Mientras un trabajo está en cola o en curso, su proceso actualiza el
+# archivo cada JOBS_LATIDO seg. Si el worker se recicla o muere a mitad de
+# camino, el archivo deja de actualizarse y pasados JOBS_ABANDONO seg. el
+# trabajo se marca como error (y luego se limpia como cualquier otro).
+
+JOBS_MAX_CONCURRENTES = int(os.getenv('EXPORT_JOBS_MAX', '2'))
+JOBS_RETENCION = float(os.getenv('EXPORT_JOBS_RETENCION', '3600'))       # seg. que se guarda un archivo terminado
+JOBS_LIMPIEZA_CADA = float(os.getenv('EXPORT_JOBS_LIMPIEZA', '300'))
+JOBS_DIR = os.getenv('EXPORT_JOBS_DIR', os.path.join(tempfile.gettempdir(), "sistema_mapas_exportaciones"))
+JOBS_LATIDO = float(os.getenv('EXPORT_JOBS_LATIDO', '30'))               # seg. entre latidos de un trabajo en curso
+JOBS_ABANDONO = float(os.getenv('EXPORT_JOBS_ABANDONO', '300'))          # seg. sin latido → el proceso murió
+
+EN_COLA = "en_cola"
+PROCESANDO = "procesando"
+TERMINADO = "terminado"
+ERROR = "error"
+
+_executor = ThreadPoolExecutor(max_workers=JOBS_MAX_CONCURRENTES, thread_name_prefix="trabajo_export")
+_trabajos = {}
+_lock = threading.Lock()
+_lock_disco = threading.Lock()      # un latido no debe pisar un estado más nuevo
+
+
+class TrabajoExportacion:
+    def __init__(self, nivel, valor, diagnosticos):
+        self.id = uuid.uuid4().hex
+        self.nivel = nivel
+        self.valor = valor
+        self.diagnosticos = list(diagnosticos)
+        self.estado = EN_COLA
+        self.hojas_total = None
+        self.hojas_listas = 0
+        self.error = None
+        self.ruta = None
+        self.creado = time.time()
+        self.actualizado = self.creado
+        self.terminado = None
+
+    @property
+    def nombre_archivo(self):
+        return f"Datos_{self.valor.replace(' ', '_')}.xlsx"
+
+    @classmethod
+    def desde_dict(cls, datos):
+        trabajo = cls(datos["nivel"], datos["valor"], datos["diagnosticos"])
+        for campo in ("id", "estado", "hojas_listas", "hojas_total", "error", "creado", "terminado"):
+            setattr(trabajo, campo, datos[campo])
+        trabajo.actualizado = datos.get("actualizado", trabajo.creado)
+        if trabajo.estado == TERMINADO:
+            trabajo.ruta = os.path.join(JOBS_DIR, f"{trabajo.id}.xlsx")
+        return trabajo
+
+    def avanzar(self):
+        with _lock:
+            self.hojas_listas += 1
+        _persistir(self)
+
+    def a_dict(self):
+        with _lock:
+            return {
+                "id": self.id,
+                "nivel": self.nivel,
+                "valor": self.valor,
+                "diagnosticos": self.diagnosticos,
+                "estado": self.estado,
+                "hojas_listas": self.hojas_listas,
+                "hojas_total": self.hojas_total,
+                "error": self.error,
+                "creado": self.creado,
+                "actualizado": self.actualizado,
+                "terminado": self.terminado,
+                "expira": self.terminado + JOBS_RETENCION if self.terminado else None,
+            }
+
+
+def _ruta_estado(id_trabajo):
+    return os.path.join(JOBS_DIR, f"{id_trabajo}.json")
+
+
+def _persistir(trabajo):
+    with _lock_disco:
+        with _lock:
+            trabajo.actualizado = time.time()
+        datos = trabajo.a_dict()
+        try:
+            os.makedirs(JOBS_DIR, exist_ok=True)
+            temporal = f"{_ruta_estado(trabajo.id)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(datos, f, ensure_ascii=False)
+            os.replace(temporal, _ruta_estado(trabajo.id))
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el estado del trabajo {trabajo.id}: {e}")
+
+
+def _leer_estado(id_trabajo):
+    # El id viene en la URL: solo se aceptan ids generados aquí (hex de uuid4)
+    if len(id_trabajo) != 32 or any(c not in "0123456789abcdef" for c in id_trabajo):
+        return None
+    try:
+        with open(_ruta_estado(id_trabajo), encoding="utf-8") as f:
+            trabajo = TrabajoExportacion.desde_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return None
+    return _revisar_abandono(trabajo)
+
+
+def _revisar_abandono(trabajo):
+    """Trabajo sin latido (su proceso murió o se recicló): pasa a error para que el cliente deje de esperar."""
+    if trabajo.estado in (EN_COLA, PROCESANDO) and time.time() - trabajo.actualizado > JOBS_ABANDONO:
+        print(f"⚠️ Trabajo {trabajo.id} abandonado (sin latido desde hace {time.time() - trabajo.actualizado:.0f} s)")
+        trabajo.estado = ERROR
+        trabajo.error = "El proceso que armaba la exportación se detuvo. Vuelva a solicitarla."
+        trabajo.terminado = time.time()
+        _persistir(trabajo)
+    return trabajo
+
+
+def _ejecutar(trabajo):
+    with _lock:
+        trabajo.estado = PROCESANDO
+    _persistir(trabajo)
+
+    try:
+        total = exportacion.contar_hojas(trabajo.diagnosticos, trabajo.nivel, trabajo.valor)
+        with _lock:
+            trabajo.hojas_total = total
+        _persistir(trabajo)
+
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        ruta = os.path.join(JOBS_DIR, f"{trabajo.id}.xlsx")
+
+        clave_cache = exportacion.clave_cache(trabajo.nivel, trabajo.valor, trabajo.diagnosticos)
+        armado = None
+        if clave_cache:
+            # Si otro pedido ya está armando el mismo libro, se espera a ese
+            armado = exportacion.armar_en_cache(
+                trabajo.nivel, trabajo.valor, trabajo.diagnosticos, clave_cache, progreso=trabajo.avanzar
+            )
+
+        if isinstance(armado, str):
+            # Copia propia: la caché puede desalojar su archivo antes de la descarga
+            shutil.copyfile(armado, ruta)
+            with _lock:
+                trabajo.hojas_listas = total
+        elif armado:
+            # La caché no aceptó el libro: se guarda el temporal ya armado
+            with armado, open(ruta, "wb") as f:
+                shutil.copyfileobj(armado, f)
+            with _lock:
+                trabajo.hojas_listas = total
+        else:
+            libro = exportacion.construir_libro(
+                trabajo.nivel, trabajo.valor, trabajo.diagnosticos, progreso=trabajo.avanzar
+            )
+            libro.guardar_en(ruta)
+
+        with _lock:
+            trabajo.ruta = ruta
+            trabajo.estado = TERMINADO
+            trabajo.terminado = time.time()
+        _persistir(trabajo)
+        print(f"✅ Trabajo {trabajo.id} terminado: {trabajo.valor}")
+
+    except Exception as e:
+        print(f"❌ Trabajo {trabajo.id} falló: {str(e)}")
+        with _lock:
+            trabajo.estado = ERROR
+            trabajo.error = str(e)
+            trabajo.terminado = time.time()
+        _persistir(trabajo)
+
+
+def crear(nivel, valor, diagnosticos):
+    trabajo = TrabajoExportacion(nivel, valor, diagnosticos)
+    with _lock:
+        _trabajos[trabajo.id] = trabajo
+    _persistir(trabajo)
+    _executor.submit(_ejecutar, trabajo)
+    return trabajo
+
+
+def obtener(id_trabajo):
+    with _lock:
+        trabajo = _trabajos.get(id_trabajo)
+    # Trabajo de otro proceso: se lee su último estado guardado
+    return trabajo or _leer_estado(id_trabajo)
+
+
+def limpiar_vencidos():
+    """Borra los trabajos (y sus archivos) que superaron la retención."""
+    ahora = time.time()
+    with _lock:
+        vencidos = [
+            t for t in _trabajos.values()
+            if t.terminado is not None and ahora - t.terminado > JOBS_RETENCION
+        ]
+        for t in vencidos:
+            del _trabajos[t.id]
+        propios = set(_trabajos)
+
+    # También los que dejó en disco otro proceso (o uno que ya terminó)
+    ids = {t.id for t in vencidos}
+    if os.path.isdir(JOBS_DIR):
+        for archivo in os.listdir(JOBS_DIR):
+            id_trabajo, extension = os.path.splitext(archivo)
+            if extension != ".json" or id_trabajo in ids or id_trabajo in propios:
+                continue
+            trabajo = _leer_estado(id_trabajo)
+            if trabajo and trabajo.terminado is not None and ahora - trabajo.terminado > JOBS_RETENCION:
+                vencidos.append(trabajo)
+
+    for t in vencidos:
+        for ruta in (t.ruta, _ruta_estado(t.id)):
+            if ruta and os.path.exists(ruta):
+                try:
+                    os.remove(ruta)
+                except OSError as e:
+                    print(f"⚠️ No se pudo borrar {ruta}: {e}")
+
+    return len(vencidos)
+
+
+def _bucle_limpieza():
+    while True:
+        time.sleep(JOBS_LIMPIEZA_CADA)
+        try:
+            eliminados = limpiar_vencidos()
+            if eliminados:
+                print(f"🧹 Trabajos de exportación vencidos eliminados: {eliminados}")
+        except Exception as e:
+            print(f"❌ Error limpiando trabajos: {e}")
+
+
+def _bucle_latido():
+    while True:
+        time.sleep(JOBS_LATIDO)
+        with _lock:
+            activos = [t for t in _trabajos.values() if t.estado in (EN_COLA, PROCESANDO)]
+        for trabajo in activos:
+            _persistir(trabajo)
+
+
+threading.Thread(target=_bucle_limpieza, name="limpieza_exportaciones", daemon=True).start()
+threading.Thread(target=_bucle_latido, name="latido_exportaciones", daemon=True).start()
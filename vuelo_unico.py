@@ -0,0 +1,100 @@
+import re
+import threading
+
+# ============================================================
+# 🛬 VUELO ÚNICO: LLAMADAS IDÉNTICAS SIMULTÁNEAS SE EJECUTAN UNA VEZ
+# ============================================================
+# Al empezar la reunión de epidemiología una docena de personas abre el
+# mismo mapa a la vez y dispara las mismas consultas. La primera llamada
+# con una clave la ejecuta (líder); las que llegan mientras está en curso
+# esperan y reciben el mismo resultado (o la misma excepción). No es una
+# caché: apenas termina, la siguiente llamada vuelve a ejecutar.
+
+
+class _Vuelo:
+    __slots__ = ("listo", "valor", "error", "esperando")
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.valor = None
+        self.error = None
+        self.esperando = 0
+
+
+class VueloUnico:
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self._vuelos = {}
+        self._lock = threading.Lock()
+        self.ejecutadas = 0
+        self.coalescidas = 0
+        self.por_grupo = {}         # grupo -> [ejecutadas, coalescidas]
+
+    def hacer(self, clave, funcion, grupo=None, al_repartir=None):
+        """
+        Resultado de funcion(); si ya hay una ejecución con la misma clave, espera la suya.
+        al_repartir(valor, receptores), si se da, lo llama el líder antes de
+        despertar a los demás, con cuántas llamadas (él incluido) recibirán el valor.
+        """
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+                self.ejecutadas += 1
+            else:
+                vuelo.esperando += 1
+                self.coalescidas += 1
+            contadores = self.por_grupo.setdefault(grupo, [0, 0])
+            contadores[0 if lider else 1] += 1
+
+        if not lider:
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.valor
+
+        try:
+            vuelo.valor = funcion()
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._vuelos[clave]
+            # Fuera del diccionario ya no se suman esperas: el conteo es final
+            if al_repartir is not None and vuelo.error is None:
+                al_repartir(vuelo.valor, vuelo.esperando + 1)
+            vuelo.listo.set()
+        return vuelo.valor
+
+    def estado(self):
+        with self._lock:
+            total = self.ejecutadas + self.coalescidas
+            return {
+                "ejecutadas": self.ejecutadas,
+                "coalescidas": self.coalescidas,
+                "tasa_coalescencia": round(self.coalescidas / total, 4) if total else 0,
+                "en_vuelo": len(self._vuelos),
+                "esperando": sum(v.esperando for v in self._vuelos.values()),
+                "por_grupo": {
+                    str(grupo): {"ejecutadas": e, "coalescidas": c}
+                    for grupo, (e, c) in self.por_grupo.items()
+                },
+            }
+
+
+_LITERAL = re.compile(r"('(?:''|[^'])*'|\[[^\]]*\])")
+
+
+def normalizar_sql(sql):
+    """Espacios colapsados fuera de literales y [identificadores]: misma consulta, misma clave."""
+    partes = _LITERAL.split(sql)
+    for i in range(0, len(partes), 2):
+        partes[i] = re.sub(r"\s+", " ", partes[i])
+    return "".join(partes).strip()
+
+
+# Consultas de lectura (database.consultar) y libros Excel (exportacion)
+consultas = VueloUnico("consultas")
+libros = VueloUnico("libros")